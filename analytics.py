@@ -0,0 +1,207 @@
+# analytics.py
+
+"""
+Vectorized analytics over the Arrow snapshots written by snapshots.py.
+
+Every metric works on whole columns with numpy (no per-row Python) and reads
+only the memory-mapped snapshot files, never the OLTP database. Results are
+memoised per snapshot version and arguments, so sessions share them until the
+next refresh. Metrics that depend on the current time take it as an argument
+(`today` or `now`) rather than reading the clock, which would freeze at the
+first call; left out, they are measured as of the snapshot's watermark.
+All functions return None when no snapshot has been taken yet.
+
+Requires pyarrow, numpy and pandas.
+"""
+
+import functools
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import snapshots
+
+OPEN_GOAL_STATUSES = ['Draft', 'In Progress']
+MICROS_PER_HOUR = 3_600_000_000
+MICROS_PER_DAY = 24 * MICROS_PER_HOUR
+
+# --- Column helpers ---
+def _float(column):
+    """Numeric, date (days) or timestamp (microseconds) column as float64 with NaN for nulls."""
+    if pa.types.is_timestamp(column.type):
+        column = pc.cast(column, pa.int64())
+    elif pa.types.is_date32(column.type):
+        column = pc.cast(column, pa.int32())
+    return pc.fill_null(pc.cast(column, pa.float64()), float("nan")).to_numpy()
+
+def _strings(column):
+    return np.asarray(column.to_numpy(zero_copy_only=False), dtype=object)
+
+def _months(micros):
+    """Months since 1970-01 for microsecond timestamps (NaN-free input)."""
+    return micros.astype("int64").astype("datetime64[us]").astype("datetime64[M]").astype("int64")
+
+def _scoped_goals(manager_id):
+    goals = snapshots.load("goals")
+    if goals is not None and manager_id is not None:
+        goals = goals.filter(pc.equal(goals["manager_id"], int(manager_id)))
+    return goals
+
+def _manager_names():
+    users = snapshots.load("users")
+    if users is None:
+        return {}
+    return dict(zip(users["user_id"].to_pylist(), users["name"].to_pylist()))
+
+def _as_of(table, now):
+    """`now` (default: the snapshot's watermark) as a UTC datetime."""
+    now = now or snapshots.watermark(table) or datetime.now(timezone.utc)
+    return now.astimezone(timezone.utc) if now.tzinfo else now.replace(tzinfo=timezone.utc)
+
+def _memoised(func):
+    """Caches a metric per (snapshot version, arguments)."""
+    cached = functools.lru_cache(maxsize=64)(lambda version, *args, **kwargs: func(*args, **kwargs))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return cached(snapshots.version(), *args, **kwargs)
+    return wrapper
+
+# --- Metrics ---
+@_memoised
+def overdue_goals(manager_id: int = None, today: date = None):
+    """
+    Open goals past their due date, per manager: open and overdue counts, the
+    overdue rate and median/max days overdue. Sorted by overdue count.
+    """
+    goals = _scoped_goals(manager_id)
+    if goals is None:
+        return None
+    today_days = ((today or _as_of(goals, None).date()) - date(1970, 1, 1)).days
+    open_mask = pc.is_in(goals["status"], value_set=pa.array(OPEN_GOAL_STATUSES)).to_numpy(zero_copy_only=False)
+    days_overdue = today_days - _float(goals["due_date"])
+    managers = _float(goals["manager_id"])
+    frame = pd.DataFrame({
+        "manager_id": managers[open_mask],
+        "days_overdue": days_overdue[open_mask],
+    })
+    frame["overdue"] = frame["days_overdue"] > 0
+    overdue_days = frame["days_overdue"].where(frame["overdue"])
+    result = frame.assign(overdue_days=overdue_days).groupby("manager_id", dropna=True).agg(
+        open_goals=("overdue", "size"),
+        overdue_goals=("overdue", "sum"),
+        median_days_overdue=("overdue_days", "median"),
+        max_days_overdue=("overdue_days", "max"),
+    ).reset_index()
+    result["manager_id"] = result["manager_id"].astype("int64")
+    result["overdue_rate"] = (100.0 * result["overdue_goals"] / result["open_goals"]).round(1)
+    names = _manager_names()
+    result.insert(1, "manager_name", result["manager_id"].map(names))
+    return result.sort_values(["overdue_goals", "manager_id"], ascending=[False, True], ignore_index=True)
+
+@_memoised
+def completion_times(manager_id: int = None):
+    """
+    Days from creation to completion for every completed goal (column "days"),
+    with quantiles in the frame's attrs["summary"] (count, p50, p75, p90, mean).
+    """
+    goals = _scoped_goals(manager_id)
+    if goals is None:
+        return None
+    days = (_float(goals["completed_at"]) - _float(goals["created_at"])) / MICROS_PER_DAY
+    days = days[~np.isnan(days)]
+    frame = pd.DataFrame({"days": days})
+    frame.attrs["summary"] = {
+        "count": int(days.size),
+        "p50": float(np.percentile(days, 50)) if days.size else None,
+        "p75": float(np.percentile(days, 75)) if days.size else None,
+        "p90": float(np.percentile(days, 90)) if days.size else None,
+        "mean": float(days.mean()) if days.size else None,
+    }
+    return frame
+
+@_memoised
+def approval_latency(manager_id: int = None, now: datetime = None):
+    """
+    Per manager: tasks reviewed, median and p90 hours from logging to review,
+    tasks still pending and the median age in hours of those pending tasks at
+    `now`.
+    """
+    goals = _scoped_goals(manager_id)
+    tasks = snapshots.load("tasks")
+    if goals is None or tasks is None:
+        return None
+    columns = ["manager_id", "manager_name", "reviewed", "median_hours", "p90_hours", "pending", "median_pending_age_hours"]
+    if goals.num_rows == 0 or tasks.num_rows == 0:
+        return pd.DataFrame(columns=columns)
+    # Map each task to its goal's manager with a sorted lookup instead of a row-wise join
+    goal_ids = _float(goals["goal_id"])
+    goal_managers = _float(goals["manager_id"])
+    order = np.argsort(goal_ids)
+    goal_ids, goal_managers = goal_ids[order], goal_managers[order]
+    task_goal_ids = _float(tasks["goal_id"])
+    position = np.minimum(np.searchsorted(goal_ids, task_goal_ids), goal_ids.size - 1)
+    matched = goal_ids[position] == task_goal_ids
+
+    created = _float(tasks["created_at"])
+    reviewed = _float(tasks["reviewed_at"])
+    now_micros = float(np.datetime64(_as_of(tasks, now).replace(tzinfo=None), "us").astype("int64"))
+    pending = _strings(tasks["status"]) == 'Pending Approval'
+    frame = pd.DataFrame({
+        "manager_id": goal_managers[position][matched],
+        "latency_hours": ((reviewed - created) / MICROS_PER_HOUR)[matched],
+        "pending_age_hours": np.where(pending, (now_micros - created) / MICROS_PER_HOUR, np.nan)[matched],
+    })
+    grouped = frame.groupby("manager_id", dropna=True)
+    result = pd.DataFrame({
+        "reviewed": grouped["latency_hours"].count(),
+        "median_hours": grouped["latency_hours"].median(),
+        "p90_hours": grouped["latency_hours"].quantile(0.9),
+        "pending": grouped["pending_age_hours"].count(),
+        "median_pending_age_hours": grouped["pending_age_hours"].median(),
+    }).reset_index()
+    result["manager_id"] = result["manager_id"].astype("int64")
+    result.insert(1, "manager_name", result["manager_id"].map(_manager_names()))
+    return result.round(1)[columns].sort_values(["median_hours", "manager_id"], ascending=[False, True], na_position="last", ignore_index=True)
+
+@_memoised
+def cohort_completion(manager_id: int = None, months: int = 12, today: date = None):
+    """
+    Goals grouped by the month they were created. Row per cohort with its size
+    and, in columns "m0".."m{months}", the cumulative percentage completed
+    within that many months of the cohort month (months after `today` are NaN).
+    """
+    goals = _scoped_goals(manager_id)
+    if goals is None:
+        return None
+    created = _float(goals["created_at"])
+    completed = _float(goals["completed_at"])
+    has_created = ~np.isnan(created)
+    created, completed = created[has_created], completed[has_created]
+    if created.size == 0:
+        return pd.DataFrame(columns=["cohort", "goals"] + [f"m{m}" for m in range(months + 1)])
+
+    cohort = _months(created)
+    first = cohort.min()
+    cohort_index = cohort - first
+    sizes = np.bincount(cohort_index)
+
+    done = ~np.isnan(completed)
+    offset = _months(completed[done]) - cohort[done]
+    in_window = (offset >= 0) & (offset <= months)
+    counts = np.zeros((sizes.size, months + 1), dtype=np.int64)
+    np.add.at(counts, (cohort_index[done][in_window], offset[in_window]), 1)
+    rates = 100.0 * np.cumsum(counts, axis=1) / np.maximum(sizes, 1)[:, None]
+
+    # Offsets that lie in the future for young cohorts are unknown, not zero
+    current = np.datetime64(today or _as_of(goals, None).date(), "M").astype("int64")
+    age = current - (first + np.arange(sizes.size))
+    rates[np.arange(months + 1)[None, :] > age[:, None]] = np.nan
+
+    result = pd.DataFrame(rates.round(1), columns=[f"m{m}" for m in range(months + 1)])
+    result.insert(0, "goals", sizes)
+    result.insert(0, "cohort", (first + np.arange(sizes.size)).astype("datetime64[M]").astype(str))
+    return result[result["goals"] > 0].reset_index(drop=True)
@@ -1,95 +1,594 @@
 # backend.py
+#
+# Headless data layer: no Streamlit dependency, and pandas is only imported the
+# first time a DataFrame is actually needed, so batch jobs, worker processes and
+# the CLI can import this module cheaply.
 
+import atexit
+import contextvars
+import functools
+import importlib
+import inspect
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 import psycopg2
-import pandas as pd
+import psycopg2.extensions
+import psycopg2.pool
 from datetime import date
 from typing import List, Dict, Any
-import streamlit as st
+import migrations
+import query_trace
 
-# Database credentials (replace with your PostgreSQL details)
-DB_HOST = "localhost"
-DB_NAME = "pms"
-DB_USER = "postgres"
-DB_PASSWORD = "KaliNew"
+class _LazyModule:
+    """Stands in for a heavy module and imports it on first attribute access."""
 
-def get_db_connection():
-    """Establishes and returns a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return conn
-    except psycopg2.OperationalError as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
 
-def create_tables():
-    """Creates all necessary tables for the application."""
-    conn = get_db_connection()
-    if not conn: return
-    cur = conn.cursor()
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = _LazyModule("pandas")
+
+# Database credentials (replace with your PostgreSQL details, or set the PMS_DB_* environment variables)
+DB_HOST = os.environ.get("PMS_DB_HOST", "localhost")
+DB_NAME = os.environ.get("PMS_DB_NAME", "pms")
+DB_USER = os.environ.get("PMS_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("PMS_DB_PASSWORD", "KaliNew")
+
+# Connection pool settings. A single pool is shared by every session in the process.
+# psycopg2 keeps at most DB_POOL_MIN connections open while idle; up to DB_POOL_MAX
+# may be checked out at once.
+DB_POOL_MIN = 4
+DB_POOL_MAX = 20
+DB_POOL_TIMEOUT = 10  # seconds to wait for a free connection before giving up
+DB_POOL_HEALTHCHECK_INTERVAL = 30  # ping connections that sat idle longer than this
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = None
+_last_used = {}
+
+# Message of the most recent failed attempt to open the pool, for the UI to show.
+connection_error = None
+
+def query_count():
+    """Total statements executed through pooled connections since the process started."""
+    return query_trace.tracer.total
+
+def explain_query(sql, params=None):
+    """EXPLAIN (ANALYZE, BUFFERS) output for a statement, or None on error. Writes are rolled back."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+        try:
+            return query_trace.explain(conn, sql, params)
+        except psycopg2.Error as e:
+            print(f"Error explaining query: {e}")
+            return None
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_slots, connection_error
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = psycopg2.pool.ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=DB_HOST,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    connection_factory=query_trace.TracedConnection,
+                    cursor_factory=query_trace.TracedCursor
+                )
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                connection_error = None
+            except psycopg2.OperationalError as e:
+                connection_error = str(e)
+                print(f"Error connecting to database: {e}")
+                return None
+    return _pool
+
+def close_pool():
+    """Closes every pooled connection. Safe to call more than once."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _pool_slots = None
+        _last_used.clear()
+
+atexit.register(close_pool)
+
+def _is_healthy(conn):
+    """Cheap liveness check; only round-trips for connections idle past the interval."""
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_HEALTHCHECK_INTERVAL:
+        return True
     try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (user_id SERIAL PRIMARY KEY, name VARCHAR(255) NOT NULL, role VARCHAR(50) NOT NULL, manager_id INTEGER REFERENCES users(user_id));
-            CREATE TABLE IF NOT EXISTS goals (goal_id SERIAL PRIMARY KEY, employee_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, manager_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, description TEXT NOT NULL, due_date DATE NOT NULL, status VARCHAR(50) NOT NULL DEFAULT 'Draft', created_at TIMESTAMPTZ DEFAULT NOW());
-            CREATE TABLE IF NOT EXISTS tasks (task_id SERIAL PRIMARY KEY, goal_id INTEGER REFERENCES goals(goal_id) ON DELETE CASCADE, description TEXT NOT NULL, status VARCHAR(50) NOT NULL DEFAULT 'Pending Approval', created_at TIMESTAMPTZ DEFAULT NOW());
-            CREATE TABLE IF NOT EXISTS feedback (feedback_id SERIAL PRIMARY KEY, goal_id INTEGER REFERENCES goals(goal_id) ON DELETE CASCADE, manager_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, feedback_text TEXT NOT NULL, created_at TIMESTAMPTZ DEFAULT NOW());
-        """)
-        conn.commit()
-    except (Exception, psycopg2.Error) as error:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
         conn.rollback()
-        print(f"Error creating tables: {error}")
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout(pool):
+    """Takes a connection from the pool, replacing broken ones with fresh connections."""
+    for _ in range(DB_POOL_MAX + 1):
+        conn = pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("could not obtain a healthy database connection")
+
+@contextmanager
+def db_connection():
+    """
+    Checks a connection out of the pool for the duration of a `with` block.
+    Yields None if the database is unreachable. Open transactions are rolled
+    back on return and broken connections are discarded instead of reused.
+    """
+    started = time.perf_counter()
+    pool = get_pool()
+    slots = _pool_slots
+    if pool is None or not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        if pool is not None:
+            print("Error connecting to database: connection pool exhausted")
+        _read_cache.discard_in_flight()
+        yield None
+        return
+    try:
+        try:
+            conn = _checkout(pool)
+        except psycopg2.Error as e:
+            print(f"Error connecting to database: {e}")
+            _read_cache.discard_in_flight()
+            yield None
+            return
+        # Reported with the first statement of this checkout (pool wait + health check).
+        conn.acquire_ms = (time.perf_counter() - started) * 1000
+        try:
+            yield conn
+        finally:
+            broken = bool(conn.closed) or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            try:
+                pool.putconn(conn, close=broken)
+            except psycopg2.Error:
+                # putconn rolls back open transactions; a failure there means the link died
+                # (or the pool was closed underneath us).
+                _last_used.pop(id(conn), None)
+                try:
+                    pool.putconn(conn, close=True)
+                except psycopg2.pool.PoolError:
+                    conn.close()
     finally:
-        if conn: cur.close(); conn.close()
+        slots.release()
+
+# --- Read Cache ---
+# Process-wide read-through cache shared by every Streamlit session. Each entry
+# is tagged with the entities it was read for ("manager:7", "employee:3",
+# "goal:42", ...) and the write functions below invalidate exactly those tags.
+READ_CACHE_MAX_ENTRIES = 2048
+
+class ReadCache:
+    """Thread-safe LRU of query results with tag-based invalidation."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, tags)
+        self._keys_by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; a read that started before a bump must
+        # not store its (possibly stale) result.
+        self._generation = 0
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, tags, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(key)
+            self._entries[key] = (value, tags)
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._keys_by_tag.pop(tag, ())):
+                    self._remove(key)
+
+    def discard_in_flight(self):
+        """Prevents reads currently in progress from being cached (e.g. after a connection failure)."""
+        with self._lock:
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+_read_cache = ReadCache(READ_CACHE_MAX_ENTRIES)
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value.item() if hasattr(value, "item") else value
+
+def _copy_result(value):
+    # Shallow copies let callers add or reassign columns without touching the cached frame.
+    if pd.loaded and isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, tuple) and not hasattr(value, "_fields"):
+        return tuple(_copy_result(v) for v in value)
+    return value
+
+def cached_read(tags):
+    """
+    Caches a read function's result per argument set. `tags` receives the bound
+    arguments as a dict and returns the cache tags the result depends on.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__,) + tuple((name, _freeze(value)) for name, value in bound.arguments.items())
+            hit, value = _read_cache.get(key)
+            if hit:
+                return _copy_result(value)
+            generation = _read_cache.generation()
+            value = func(*args, **kwargs)
+            _read_cache.put(key, value, frozenset(tags(bound.arguments)), generation)
+            return _copy_result(value)
+        return wrapper
+    return decorator
+
+def invalidate(goal_id: int = None, manager_id: int = None, employee_id: int = None):
+    """Drops cached reads for the given entities, plus the global analytics aggregates."""
+    tags = ["analytics"]
+    if goal_id is not None: tags.append(f"goal:{int(goal_id)}")
+    if manager_id is not None: tags.append(f"manager:{int(manager_id)}")
+    if employee_id is not None: tags.append(f"employee:{int(employee_id)}")
+    _read_cache.invalidate(*tags)
+
+def invalidate_tags(*tags):
+    """Drops cached reads carrying any of these tags, e.g. "campaigns" after an ingest."""
+    _read_cache.invalidate(*tags)
+
+def clear_read_cache():
+    """Drops every cached read, e.g. after a bulk import."""
+    _read_cache.clear()
+
+def _tag(prefix, argument):
+    return lambda args: [f"{prefix}:{int(args[argument])}"]
+
+# --- Change Notifications ---
+# Migration 4 makes every write to users, goals, tasks and feedback send a NOTIFY
+# on CHANGE_CHANNEL naming the goal and its owners. A background listener turns
+# those into cache invalidations, so reads stay cached until something they
+# depend on changes, whichever process (app server, CLI, import job) wrote it.
+# Migrations 8 and 9 add one statement-level NOTIFY per write to the campaign
+# and segment tables, which invalidates the cache tag in TABLE_TAGS.
+CHANGE_CHANNEL = "pms_changes"
+CHANGE_LISTENER_RETRY_SECONDS = 5
+
+# Tables outside the goal hierarchy -> the cache tag their reads carry
+TABLE_TAGS = {
+    "campaigns": "campaigns", "channels": "campaigns", "campaign_performance": "campaigns",
+    "segments": "segments", "segment_rules": "segments", "customer_segments": "segments",
+}
+
+_listener = None
+_listener_lock = threading.Lock()
+_listener_stop = threading.Event()
+_change_generation = 0
+
+def change_generation():
+    """Increases whenever the listener applies a notification; cheap to poll from the UI."""
+    return _change_generation
+
+def change_listener_running():
+    return _listener is not None and _listener.is_alive()
+
+def _apply_notification(payload: str):
+    global _change_generation
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        return
+    if change.get("bulk"):
+        _read_cache.clear()
+    elif change.get("table") == "users":
+        _read_cache.invalidate("users", "analytics")
+    elif change.get("table") in TABLE_TAGS:
+        invalidate_tags(TABLE_TAGS[change["table"]])
+    else:
+        invalidate(goal_id=change.get("goal_id"), manager_id=change.get("manager_id"), employee_id=change.get("employee_id"))
+    _change_generation += 1
+
+def _listen():
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            # LISTEN needs a dedicated autocommit connection, so this one is not pooled
+            conn = psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANGE_CHANNEL};")
+            # Notifications sent while we were not listening are lost
+            _read_cache.clear()
+            while not _listener_stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _apply_notification(conn.notifies.pop(0).payload)
+        except psycopg2.Error as e:
+            print(f"Change listener error: {e}")
+            _listener_stop.wait(CHANGE_LISTENER_RETRY_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def start_change_listener():
+    """Starts the process-wide change listener thread if it is not already running."""
+    global _listener
+    with _listener_lock:
+        if not change_listener_running():
+            _listener_stop.clear()
+            _listener = threading.Thread(target=_listen, name="pms-change-listener", daemon=True)
+            _listener.start()
+
+def stop_change_listener():
+    global _listener
+    with _listener_lock:
+        _listener_stop.set()
+        if _listener is not None:
+            _listener.join(timeout=2)
+        _listener = None
+
+atexit.register(stop_change_listener)
+
+# --- Concurrent Reads ---
+# Independent dashboard reads are fanned out over a small thread pool so a page
+# waits for its slowest query rather than the sum of all of them. Each read
+# checks out its own pooled connection, so keep this below DB_POOL_MAX.
+DB_FANOUT_WORKERS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_FANOUT_WORKERS, thread_name_prefix="pms-db")
+        return _executor
+
+def _shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+
+atexit.register(_shutdown_executor)
+
+def fetch_concurrently(**calls):
+    """
+    Runs independent backend reads in parallel and returns their results by name:
+
+        fetch_concurrently(goals=(get_manager_goals, 7), employees=(get_users_by_role, 'Employee'))
+
+    Each value is a (function, *args) tuple or a zero-argument callable. If any
+    call raises, the exception is re-raised here after the others have finished.
+    """
+    # Create the pool on the calling thread so connection errors are reported there.
+    get_pool()
+    executor = _get_executor()
+    # Each call runs in a copy of the caller's context so query traces keep the caller's scope.
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, call) if callable(call)
+        else executor.submit(contextvars.copy_context().run, *call)
+        for name, call in calls.items()
+    }
+    wait(futures.values())
+    return {name: future.result() for name, future in futures.items()}
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+def run_migrations():
+    """
+    Brings the schema up to date. Only the first call in a process touches the
+    database; later calls (e.g. on every Streamlit rerun) return immediately.
+    """
+    global _migrated
+    if _migrated:
+        return True
+    with _migrate_lock:
+        if _migrated:
+            return True
+        with db_connection() as conn:
+            if not conn: return False
+            try:
+                applied = migrations.apply_migrations(conn)
+                if applied:
+                    print(f"Applied schema migrations: {applied}")
+                _migrated = True
+            except (Exception, psycopg2.Error) as error:
+                print(f"Error applying schema migrations: {error}")
+    return _migrated
+
+def create_tables():
+    """Creates all necessary tables for the application."""
+    return run_migrations()
+
+# --- Query Helpers ---
+# Reads return DataFrames by default. Passing as_records=True returns a list of
+# named-tuple rows instead, which is far cheaper to build and iterate for the
+# small result sets the dashboards loop over.
+
+@functools.lru_cache(maxsize=None)
+def _record_type(fields: tuple):
+    return namedtuple("Record", fields)
+
+def _read_query(query: str, conn, params: tuple = None, as_records: bool = False):
+    """Runs a SELECT on `conn` as a DataFrame or, with as_records, a list of named tuples."""
+    if not as_records:
+        return pd.read_sql_query(query, conn, params=params)
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        make = _record_type(tuple(col.name for col in cur.description))._make
+        return [make(row) for row in cur.fetchall()]
+
+def _empty(as_records: bool):
+    return [] if as_records else pd.DataFrame()
+
+def index_by(records, key: str, value: str = None):
+    """Builds a dict from records keyed on one field, e.g. index_by(users, 'name', 'user_id')."""
+    if value is None:
+        return {getattr(r, key): r for r in records}
+    return {getattr(r, key): getattr(r, value) for r in records}
+
+
+def _keyset_page(query: str, params: tuple, keyset_columns: str, cursor_fields: List[str], after: tuple = None, page_size: int = 25, as_records: bool = False):
+    """
+    Runs a query template with {keyset} and {limit} placeholders as one keyset page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    params = list(params)
+    keyset = ""
+    if after is not None:
+        keyset = f"AND ({keyset_columns}) > ({', '.join(['%s'] * len(after))})"
+        params += list(after)
+    params.append(int(page_size) + 1)
+    with db_connection() as conn:
+        if not conn: return _empty(as_records), None
+        rows = _read_query(query.format(keyset=keyset, limit="LIMIT %s"), conn, tuple(params), as_records)
+    if len(rows) <= page_size:
+        return rows, None
+    if as_records:
+        rows = rows[:page_size]
+        return rows, tuple(getattr(rows[-1], f) for f in cursor_fields)
+    df = rows.iloc[:page_size]
+    last = df.iloc[-1]
+    # numpy scalars are not adaptable by psycopg2, so hand back plain Python values
+    return df, tuple(last[f].item() if hasattr(last[f], "item") else last[f] for f in cursor_fields)
+
+def _scalar(query: str, params: tuple, default=0):
+    with db_connection() as conn:
+        if not conn: return default
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            row = cur.fetchone()
+    return row[0] if row else default
 
 # --- CRUD Operations ---
 
 # Users
-def get_users_by_role(role: str):
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    df = pd.read_sql_query("SELECT user_id, name FROM users WHERE role = %s ORDER BY name;", conn, params=(role,))
-    conn.close()
-    return df
+@cached_read(lambda args: ["users"])
+def get_users_by_role(role: str, as_records: bool = False):
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query("SELECT user_id, name FROM users WHERE role = %s ORDER BY name;", conn, (role,), as_records)
 
 # Goals
 def create_goal(employee_id: int, manager_id: int, description: str, due_date: date):
-    conn = get_db_connection()
-    if not conn: return None
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO goals (employee_id, manager_id, description, due_date) VALUES (%s, %s, %s, %s) RETURNING goal_id;", (employee_id, manager_id, description, due_date))
-        goal_id = cur.fetchone()[0]
-        conn.commit()
-        return goal_id
-    except (Exception, psycopg2.Error) as error:
-        conn.rollback()
-        print(f"Error creating goal: {error}")
-        return None
-    finally:
-        if conn: cur.close(); conn.close()
+    with db_connection() as conn:
+        if not conn: return None
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO goals (employee_id, manager_id, description, due_date) VALUES (%s, %s, %s, %s) RETURNING goal_id;", (employee_id, manager_id, description, due_date))
+            goal_id = cur.fetchone()[0]
+            conn.commit()
+            invalidate(goal_id=goal_id, manager_id=manager_id, employee_id=employee_id)
+            return goal_id
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error creating goal: {error}")
+            return None
+        finally:
+            cur.close()
 
 def update_goal_status(goal_id: int, status: str):
-    conn = get_db_connection()
-    if not conn: return False
-    cur = conn.cursor()
-    try:
-        cur.execute("UPDATE goals SET status = %s WHERE goal_id = %s;", (status, goal_id))
-        conn.commit()
-        return True
-    except (Exception, psycopg2.Error) as error:
-        conn.rollback()
-        print(f"Error updating goal status: {error}")
-        return False
-    finally:
-        if conn: cur.close(); conn.close()
+    with db_connection() as conn:
+        if not conn: return False
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE goals SET status = %s WHERE goal_id = %s RETURNING manager_id, employee_id;", (status, goal_id))
+            owners = cur.fetchone()
+            conn.commit()
+            if owners:
+                invalidate(goal_id=goal_id, manager_id=owners[0], employee_id=owners[1])
+            return True
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error updating goal status: {error}")
+            return False
+        finally:
+            cur.close()
 
-def get_employee_goals(employee_id: int):
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
+@cached_read(_tag("employee", "employee_id"))
+def get_employee_goals(employee_id: int, as_records: bool = False):
     query = """
     SELECT
         g.goal_id,
@@ -102,133 +601,250 @@ def get_employee_goals(employee_id: int):
     WHERE g.employee_id = %s
     ORDER BY g.due_date;
     """
-    df = pd.read_sql_query(query, conn, params=(int(employee_id),))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, (int(employee_id),), as_records)
 
-def get_manager_goals(manager_id: int):
+_MANAGER_GOALS_QUERY = """
+SELECT
+    g.goal_id,
+    g.description AS goal_description,
+    g.due_date,
+    g.status,
+    e.name AS employee_name
+FROM goals g
+JOIN users e ON g.employee_id = e.user_id
+WHERE g.manager_id = %s {keyset}
+ORDER BY g.due_date, g.goal_id
+{limit};
+"""
+
+@cached_read(_tag("manager", "manager_id"))
+def get_manager_goals(manager_id: int, as_records: bool = False):
     """
     Retrieves all goals assigned by a specific manager.
     Includes employee name for context.
     """
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    query = """
-    SELECT
-        g.goal_id,
-        g.description AS goal_description,
-        g.due_date,
-        g.status,
-        e.name AS employee_name
-    FROM goals g
-    JOIN users e ON g.employee_id = e.user_id
-    WHERE g.manager_id = %s
-    ORDER BY g.due_date;
-    """
-    df = pd.read_sql_query(query, conn, params=(int(manager_id),))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(_MANAGER_GOALS_QUERY.format(keyset="", limit=""), conn, (int(manager_id),), as_records)
+
+@cached_read(_tag("manager", "manager_id"))
+def get_manager_goals_page(manager_id: int, after: tuple = None, page_size: int = 25, as_records: bool = False):
+    """Keyset-paginated get_manager_goals ordered by (due_date, goal_id). Returns (rows, next_cursor)."""
+    return _keyset_page(_MANAGER_GOALS_QUERY, (int(manager_id),), "g.due_date, g.goal_id", ["due_date", "goal_id"], after, page_size, as_records)
+
+@cached_read(_tag("manager", "manager_id"))
+def count_manager_goals(manager_id: int):
+    return _scalar("SELECT count(*) FROM goals WHERE manager_id = %s;", (int(manager_id),))
 
 # NEW ANALYTICS FUNCTION
 def get_all_goals():
     """Retrieves all goals from the database."""
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    query = "SELECT * FROM goals;"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame()
+        return pd.read_sql_query("SELECT goal_id, employee_id, manager_id, description, due_date, status, created_at, updated_at FROM goals;", conn)
 
 # Tasks
 def create_task(goal_id: int, description: str):
-    conn = get_db_connection()
-    if not conn: return None
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO tasks (goal_id, description) VALUES (%s, %s) RETURNING task_id;", (goal_id, description))
-        task_id = cur.fetchone()[0]
-        conn.commit()
-        return task_id
-    except (Exception, psycopg2.Error) as error:
-        conn.rollback()
-        print(f"Error creating task: {error}")
-        return None
-    finally:
-        if conn: cur.close(); conn.close()
+    with db_connection() as conn:
+        if not conn: return None
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                WITH t AS (INSERT INTO tasks (goal_id, description) VALUES (%s, %s) RETURNING task_id, goal_id)
+                SELECT t.task_id, g.manager_id, g.employee_id FROM t JOIN goals g ON g.goal_id = t.goal_id;
+            """, (goal_id, description))
+            task_id, manager_id, employee_id = cur.fetchone()
+            conn.commit()
+            invalidate(goal_id=goal_id, manager_id=manager_id, employee_id=employee_id)
+            return task_id
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error creating task: {error}")
+            return None
+        finally:
+            cur.close()
+
+@cached_read(_tag("goal", "goal_id"))
+def get_tasks_for_goal(goal_id: int, as_records: bool = False):
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query("SELECT task_id, description, status FROM tasks WHERE goal_id = %s ORDER BY created_at;", conn, (int(goal_id),), as_records)
 
-def get_tasks_for_goal(goal_id: int):
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    df = pd.read_sql_query("SELECT task_id, description, status FROM tasks WHERE goal_id = %s ORDER BY created_at;", conn, params=(goal_id,))
-    conn.close()
-    return df
+_PENDING_TASKS_QUERY = """
+SELECT
+    t.task_id,
+    t.description AS task_description,
+    g.goal_id,
+    g.description AS goal_description,
+    g.due_date,
+    e.name AS employee_name
+FROM tasks t
+JOIN goals g ON t.goal_id = g.goal_id
+JOIN users e ON g.employee_id = e.user_id
+WHERE t.status = 'Pending Approval' AND g.manager_id = %s {keyset}
+ORDER BY g.due_date, t.task_id
+{limit};
+"""
 
-def get_pending_tasks_for_manager(manager_id: int):
+@cached_read(_tag("manager", "manager_id"))
+def get_pending_tasks_for_manager(manager_id: int, as_records: bool = False):
     """
     Retrieves all tasks for a manager's team that are 'Pending Approval'.
     """
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(_PENDING_TASKS_QUERY.format(keyset="", limit=""), conn, (int(manager_id),), as_records)
+
+@cached_read(_tag("manager", "manager_id"))
+def get_pending_tasks_for_manager_page(manager_id: int, after: tuple = None, page_size: int = 25, as_records: bool = False):
+    """Keyset-paginated get_pending_tasks_for_manager ordered by (due_date, task_id). Returns (rows, next_cursor)."""
+    return _keyset_page(_PENDING_TASKS_QUERY, (int(manager_id),), "g.due_date, t.task_id", ["due_date", "task_id"], after, page_size, as_records)
+
+@cached_read(_tag("manager", "manager_id"))
+def count_pending_tasks_for_manager(manager_id: int):
+    query = """
+    SELECT count(*)
+    FROM tasks t
+    JOIN goals g ON t.goal_id = g.goal_id
+    WHERE t.status = 'Pending Approval' AND g.manager_id = %s;
+    """
+    return _scalar(query, (int(manager_id),))
+
+@cached_read(_tag("manager", "manager_id"))
+def get_pending_task_summary(manager_id: int, as_records: bool = False):
+    """Pending-approval task counts per goal for a manager's team (one row per goal, not per task)."""
     query = """
     SELECT
-        t.task_id,
-        t.description AS task_description,
+        g.goal_id,
         g.description AS goal_description,
-        e.name AS employee_name
+        g.employee_id,
+        e.name AS employee_name,
+        count(*) AS pending_count
     FROM tasks t
     JOIN goals g ON t.goal_id = g.goal_id
     JOIN users e ON g.employee_id = e.user_id
     WHERE t.status = 'Pending Approval' AND g.manager_id = %s
-    ORDER BY g.due_date;
+    GROUP BY g.goal_id, e.user_id
+    ORDER BY e.name, g.goal_id;
     """
-    df = pd.read_sql_query(query, conn, params=(int(manager_id),))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, (int(manager_id),), as_records)
+
+def get_pending_task_ids(manager_id: int, employee_id: int = None, goal_id: int = None):
+    """Ids of the pending-approval tasks on a manager's goals, optionally for one employee or goal."""
+    query = """
+    SELECT t.task_id
+    FROM tasks t
+    JOIN goals g ON t.goal_id = g.goal_id
+    WHERE t.status = 'Pending Approval' AND g.manager_id = %s
+    """
+    params = [int(manager_id)]
+    if employee_id is not None:
+        query += " AND g.employee_id = %s"
+        params.append(int(employee_id))
+    if goal_id is not None:
+        query += " AND g.goal_id = %s"
+        params.append(int(goal_id))
+    with db_connection() as conn:
+        if not conn: return []
+        with conn.cursor() as cur:
+            cur.execute(query, tuple(params))
+            return [row[0] for row in cur.fetchall()]
 
 def update_task_status(task_id: int, status: str):
-    conn = get_db_connection()
-    if not conn: return False
-    cur = conn.cursor()
-    try:
-        cur.execute("UPDATE tasks SET status = %s WHERE task_id = %s;", (status, task_id))
-        conn.commit()
-        return True
-    except (Exception, psycopg2.Error) as error:
-        conn.rollback()
-        print(f"Error updating task status: {error}")
-        return False
-    finally:
-        if conn: cur.close(); conn.close()
+    with db_connection() as conn:
+        if not conn: return False
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE tasks t SET status = %s
+                FROM goals g
+                WHERE t.task_id = %s AND g.goal_id = t.goal_id
+                RETURNING g.goal_id, g.manager_id, g.employee_id;
+            """, (status, task_id))
+            owners = cur.fetchone()
+            conn.commit()
+            if owners:
+                invalidate(*owners)
+            return True
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error updating task status: {error}")
+            return False
+        finally:
+            cur.close()
+
+def update_task_statuses(task_ids: List[int], status: str, manager_id: int = None, expected_status: str = None):
+    """
+    Sets the status of many tasks with a single UPDATE and a single commit.
+    Optionally restricts the update to tasks on a manager's goals and/or tasks
+    currently in `expected_status`. Returns {task_id: bool}; False means the task
+    was not updated (unknown id, filtered out, or the statement failed).
+    """
+    task_ids = [int(t) for t in task_ids]
+    results = {task_id: False for task_id in task_ids}
+    if not task_ids: return results
+    query = "UPDATE tasks t SET status = %s FROM goals g WHERE g.goal_id = t.goal_id AND t.task_id = ANY(%s)"
+    params = [status, task_ids]
+    if manager_id is not None:
+        query += " AND g.manager_id = %s"
+        params.append(int(manager_id))
+    if expected_status is not None:
+        query += " AND t.status = %s"
+        params.append(expected_status)
+    query += " RETURNING t.task_id, g.goal_id, g.manager_id, g.employee_id;"
+    with db_connection() as conn:
+        if not conn: return results
+        cur = conn.cursor()
+        try:
+            cur.execute(query, tuple(params))
+            updated = cur.fetchall()
+            conn.commit()
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error updating task statuses: {error}")
+            return results
+        finally:
+            cur.close()
+    for row in updated:
+        results[row[0]] = True
+    for goal_id, owner_id, employee_id in {row[1:] for row in updated}:
+        invalidate(goal_id=goal_id, manager_id=owner_id, employee_id=employee_id)
+    return results
 
 # NEW ANALYTICS FUNCTION
 def get_all_tasks():
     """Retrieves all tasks from the database."""
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    query = "SELECT * FROM tasks;"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame()
+        return pd.read_sql_query("SELECT task_id, goal_id, description, status, created_at, updated_at FROM tasks;", conn)
 
 # Feedback
 def create_feedback(goal_id: int, manager_id: int, feedback_text: str):
-    conn = get_db_connection()
-    if not conn: return False
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO feedback (goal_id, manager_id, feedback_text) VALUES (%s, %s, %s);", (goal_id, manager_id, feedback_text))
-        conn.commit()
-        return True
-    except (Exception, psycopg2.Error) as error:
-        conn.rollback()
-        print(f"Error creating feedback: {error}")
-        return False
-    finally:
-        if conn: cur.close(); conn.close()
+    with db_connection() as conn:
+        if not conn: return False
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                WITH f AS (INSERT INTO feedback (goal_id, manager_id, feedback_text) VALUES (%s, %s, %s) RETURNING goal_id)
+                SELECT g.manager_id, g.employee_id FROM f JOIN goals g ON g.goal_id = f.goal_id;
+            """, (goal_id, manager_id, feedback_text))
+            owners = cur.fetchone()
+            conn.commit()
+            invalidate(goal_id=goal_id, manager_id=owners[0], employee_id=owners[1])
+            return True
+        except (Exception, psycopg2.Error) as error:
+            conn.rollback()
+            print(f"Error creating feedback: {error}")
+            return False
+        finally:
+            cur.close()
 
-def get_feedback_for_goal(goal_id: int):
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
+@cached_read(_tag("goal", "goal_id"))
+def get_feedback_for_goal(goal_id: int, as_records: bool = False):
     query = """
     SELECT
         f.feedback_text,
@@ -239,29 +855,558 @@ def get_feedback_for_goal(goal_id: int):
     WHERE f.goal_id = %s
     ORDER BY f.created_at DESC;
     """
-    df = pd.read_sql_query(query, conn, params=(goal_id,))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, (int(goal_id),), as_records)
+
+# Bulk goal details
+class GoalDetails(dict):
+    """Maps goal_id to {"tasks": DataFrame, "feedback": DataFrame}; unknown goals map to empty frames."""
+
+    def __init__(self, tasks_df, feedback_df):
+        super().__init__()
+        self._empty = {"tasks": tasks_df.drop(columns="goal_id").iloc[0:0],
+                       "feedback": feedback_df.drop(columns="goal_id").iloc[0:0]}
+        for key, df in (("tasks", tasks_df), ("feedback", feedback_df)):
+            for goal_id, group in df.groupby("goal_id", sort=False):
+                self.setdefault(int(goal_id), dict(self._empty))[key] = group.drop(columns="goal_id").reset_index(drop=True)
+
+    def __missing__(self, goal_id):
+        return dict(self._empty)
+
+def _goal_details_tags(args):
+    if args["goal_ids"] is not None:
+        return [f"goal:{int(g)}" for g in args["goal_ids"]]
+    if args["manager_id"] is not None:
+        return [f"manager:{int(args['manager_id'])}"]
+    return [f"employee:{int(args['employee_id'])}"]
+
+@cached_read(_goal_details_tags)
+def get_goal_details(goal_ids: List[int] = None, manager_id: int = None, employee_id: int = None):
+    """
+    Loads the tasks and feedback for many goals in two queries on one connection.
+    Scope it with an explicit list of goal ids, or with a manager or employee id to
+    cover all of their goals. Frames have the same columns as get_tasks_for_goal
+    and get_feedback_for_goal.
+    """
+    if goal_ids is not None:
+        scope, params = "goal_id = ANY(%s)", ([int(g) for g in goal_ids],)
+    elif manager_id is not None:
+        scope, params = "goal_id IN (SELECT goal_id FROM goals WHERE manager_id = %s)", (int(manager_id),)
+    elif employee_id is not None:
+        scope, params = "goal_id IN (SELECT goal_id FROM goals WHERE employee_id = %s)", (int(employee_id),)
+    else:
+        raise ValueError("get_goal_details needs goal_ids, manager_id or employee_id")
+    tasks_query = f"""
+    SELECT goal_id, task_id, description, status
+    FROM tasks
+    WHERE {scope}
+    ORDER BY goal_id, created_at;
+    """
+    feedback_query = f"""
+    SELECT
+        f.goal_id,
+        f.feedback_text,
+        u.name AS manager_name,
+        f.created_at
+    FROM feedback f
+    JOIN users u ON f.manager_id = u.user_id
+    WHERE f.{scope}
+    ORDER BY f.goal_id, f.created_at DESC;
+    """
+    with db_connection() as conn:
+        if not conn:
+            return GoalDetails(pd.DataFrame(columns=["goal_id", "task_id", "description", "status"]),
+                               pd.DataFrame(columns=["goal_id", "feedback_text", "manager_name", "created_at"]))
+        tasks_df = pd.read_sql_query(tasks_query, conn, params=params)
+        feedback_df = pd.read_sql_query(feedback_query, conn, params=params)
+    return GoalDetails(tasks_df, feedback_df)
+
+# Search
+# Matches goals, tasks and feedback through the GIN-indexed search_vector columns
+# from migration 5. Only the rows of the requested page get a ts_headline
+# snippet, since building one means re-parsing the text.
+# sort_key is float8 because ts_rank_cd returns float4, which does not round-trip
+# exactly through a keyset cursor: rows tied with a page's last rank would be
+# skipped or repeated.
+SEARCH_HEADLINE_OPTIONS = 'StartSel="**", StopSel="**", MaxWords=20, MinWords=6, MaxFragments=2'
+
+_SEARCH_QUERY = """
+WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+hits AS (
+    SELECT 'goal' AS kind, g.goal_id AS item_id, g.goal_id, g.employee_id, g.manager_id,
+           g.description AS body, (-ts_rank_cd(g.search_vector, q.query))::float8 AS sort_key
+    FROM goals g, q
+    WHERE g.search_vector @@ q.query {scope}
+    UNION ALL
+    SELECT 'task', t.task_id, t.goal_id, g.employee_id, g.manager_id,
+           t.description, (-ts_rank_cd(t.search_vector, q.query))::float8
+    FROM tasks t JOIN goals g ON g.goal_id = t.goal_id, q
+    WHERE t.search_vector @@ q.query {scope}
+    UNION ALL
+    SELECT 'feedback', f.feedback_id, f.goal_id, g.employee_id, g.manager_id,
+           f.feedback_text, (-ts_rank_cd(f.search_vector, q.query))::float8
+    FROM feedback f JOIN goals g ON g.goal_id = f.goal_id, q
+    WHERE f.search_vector @@ q.query {scope}
+)
+SELECT
+    h.kind,
+    h.item_id,
+    h.goal_id,
+    g.description AS goal_description,
+    e.name AS employee_name,
+    -h.sort_key AS rank,
+    h.sort_key,
+    ts_headline('english', h.body, q.query, %s) AS snippet
+FROM (
+    SELECT * FROM hits
+    WHERE TRUE {keyset}
+    ORDER BY sort_key, kind, item_id
+    {limit}
+) h
+CROSS JOIN q
+JOIN goals g ON g.goal_id = h.goal_id
+JOIN users e ON e.user_id = h.employee_id
+ORDER BY h.sort_key, h.kind, h.item_id;
+"""
+
+def search(text: str, manager_id: int = None, employee_id: int = None, after: tuple = None, page_size: int = 20, as_records: bool = False):
+    """
+    Full-text search over goal descriptions, task descriptions and feedback, best
+    match first. `text` uses web-search syntax ("quoted phrases", -exclusions, or).
+    Results are limited to goals the manager assigned or the employee owns; with
+    neither, every goal is searched. Returns (rows, next_cursor) like the other
+    paginated reads; each row has kind, item_id, goal_id, goal_description,
+    employee_name, rank and a snippet with matches wrapped in ** (Markdown bold).
+    """
+    if not text or not text.strip():
+        return _empty(as_records), None
+    scope, scope_params = "", ()
+    if manager_id is not None:
+        scope, scope_params = "AND g.manager_id = %s", (int(manager_id),)
+    elif employee_id is not None:
+        scope, scope_params = "AND g.employee_id = %s", (int(employee_id),)
+    # ts_headline's options are bound ahead of the keyset and LIMIT parameters, which come last
+    query = _SEARCH_QUERY.format(scope=scope, keyset="{keyset}", limit="{limit}")
+    params = (text, *scope_params * 3, SEARCH_HEADLINE_OPTIONS)
+    return _keyset_page(query, params, "sort_key, kind, item_id", ["sort_key", "kind", "item_id"], after, page_size, as_records)
+
+# Org hierarchy (skip-level views)
+# user_hierarchy (migration 6) lists every (ancestor, descendant) pair, so a whole
+# subtree is one index range on ancestor_id. Subtree metrics sum the trigger-kept
+# per-manager counters in manager_rollups. Any write can change a director's
+# numbers, so these reads use the global "analytics" tag, as the other aggregates do.
+_ROLLUP_COLUMNS = """
+    COALESCE(sum(r.goals_total), 0) AS goals_total,
+    COALESCE(sum(r.goals_completed), 0) AS goals_completed,
+    COALESCE(sum(r.goals_in_progress), 0) AS goals_in_progress,
+    COALESCE(sum(r.tasks_total), 0) AS tasks_total,
+    COALESCE(sum(r.tasks_pending), 0) AS tasks_pending,
+    COALESCE(sum(r.tasks_approved), 0) AS tasks_approved,
+    round(100.0 * sum(r.goals_completed) / NULLIF(sum(r.goals_total), 0), 1) AS completion_rate
+"""
+
+@cached_read(lambda args: ["analytics", "users"])
+def get_subtree_size(manager_id: int):
+    """Number of people below a user in the org chart (any depth)."""
+    return _scalar("SELECT count(*) FROM user_hierarchy WHERE ancestor_id = %s AND depth > 0;", (int(manager_id),))
+
+@cached_read(lambda args: ["analytics"])
+def get_subtree_rollup(manager_id: int, as_records: bool = False):
+    """Goal and task totals plus completion rate for everything a manager's subtree manages (one row)."""
+    query = f"""
+    SELECT {_ROLLUP_COLUMNS}
+    FROM user_hierarchy h
+    JOIN manager_rollups r ON r.manager_id = h.descendant_id
+    WHERE h.ancestor_id = %s;
+    """
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, (int(manager_id),), as_records)
+
+@cached_read(lambda args: ["analytics"])
+def get_direct_report_rollups(manager_id: int, as_records: bool = False):
+    """The same totals per direct report, each covering that report's whole subtree."""
+    query = f"""
+    SELECT
+        d.user_id AS report_id,
+        d.name AS report_name,
+        count(DISTINCT h.descendant_id) FILTER (WHERE h.depth > 0) AS managers_below,
+        {_ROLLUP_COLUMNS}
+    FROM users d
+    JOIN user_hierarchy h ON h.ancestor_id = d.user_id
+    JOIN manager_rollups r ON r.manager_id = h.descendant_id
+    WHERE d.manager_id = %s
+    GROUP BY d.user_id, d.name
+    ORDER BY d.name;
+    """
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, (int(manager_id),), as_records)
+
+_SUBTREE_GOALS_QUERY = """
+SELECT
+    g.goal_id,
+    g.description AS goal_description,
+    g.due_date,
+    g.status,
+    e.name AS employee_name,
+    m.name AS manager_name
+FROM user_hierarchy h
+JOIN goals g ON g.manager_id = h.descendant_id
+JOIN users e ON g.employee_id = e.user_id
+JOIN users m ON g.manager_id = m.user_id
+WHERE h.ancestor_id = %s {keyset}
+ORDER BY g.due_date, g.goal_id
+{limit};
+"""
+
+@cached_read(lambda args: ["analytics"])
+def get_subtree_goals_page(manager_id: int, after: tuple = None, page_size: int = 25, as_records: bool = False):
+    """Goals set by the manager or anyone below them, ordered by (due_date, goal_id). Returns (rows, next_cursor)."""
+    return _keyset_page(_SUBTREE_GOALS_QUERY, (int(manager_id),), "g.due_date, g.goal_id", ["due_date", "goal_id"], after, page_size, as_records)
+
+_SUBTREE_PENDING_TASKS_QUERY = """
+SELECT
+    t.task_id,
+    t.description AS task_description,
+    g.goal_id,
+    g.description AS goal_description,
+    g.due_date,
+    e.name AS employee_name,
+    m.name AS manager_name
+FROM user_hierarchy h
+JOIN goals g ON g.manager_id = h.descendant_id
+JOIN tasks t ON t.goal_id = g.goal_id AND t.status = 'Pending Approval'
+JOIN users e ON g.employee_id = e.user_id
+JOIN users m ON g.manager_id = m.user_id
+WHERE h.ancestor_id = %s {keyset}
+ORDER BY g.due_date, t.task_id
+{limit};
+"""
+
+@cached_read(lambda args: ["analytics"])
+def get_subtree_pending_tasks_page(manager_id: int, after: tuple = None, page_size: int = 25, as_records: bool = False):
+    """Tasks awaiting approval anywhere in the manager's subtree, with the approving manager. Returns (rows, next_cursor)."""
+    return _keyset_page(_SUBTREE_PENDING_TASKS_QUERY, (int(manager_id),), "g.due_date, t.task_id", ["due_date", "task_id"], after, page_size, as_records)
+
+def rebuild_org_rollups():
+    """Recomputes user_hierarchy and manager_rollups from scratch (repair after bulk edits that bypass triggers)."""
+    with db_connection() as conn:
+        if not conn: return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pms_rebuild_user_hierarchy();")
+                cur.execute("SELECT pms_rebuild_manager_rollups();")
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Error rebuilding org rollups: {e}")
+            return False
+    clear_read_cache()
+    return True
 
 # Reporting
+# Tasks and feedback are aggregated in separate per-goal subqueries so a goal's
+# tasks are never multiplied by its feedback rows (and vice versa).
+_HISTORY_QUERY = """
+SELECT
+    g.goal_id,
+    g.description AS goal_description,
+    g.due_date,
+    g.status AS goal_status,
+    t.task_descriptions,
+    f.feedback_history
+FROM goals g
+LEFT JOIN LATERAL (
+    SELECT string_agg(description, ' | ' ORDER BY created_at, task_id) AS task_descriptions
+    FROM tasks
+    WHERE goal_id = g.goal_id
+) t ON TRUE
+LEFT JOIN LATERAL (
+    SELECT string_agg(feedback_text, ' | ' ORDER BY created_at, feedback_id) AS feedback_history
+    FROM feedback
+    WHERE goal_id = g.goal_id
+) f ON TRUE
+WHERE g.employee_id = %s {keyset}
+ORDER BY g.due_date, g.goal_id
+{limit};
+"""
+
+@cached_read(_tag("employee", "employee_id"))
 def get_employee_performance_history(employee_id: int):
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    query = """
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame()
+        return pd.read_sql_query(_HISTORY_QUERY.format(keyset="", limit=""), conn, params=(int(employee_id),))
+
+@cached_read(_tag("employee", "employee_id"))
+def get_employee_performance_history_page(employee_id: int, after: tuple = None, page_size: int = 50):
+    """
+    Keyset-paginated performance history ordered by (due_date, goal_id).
+    Pass the returned cursor as `after` to fetch the next page; the cursor is
+    None once the last page has been returned.
+    """
+    return _keyset_page(_HISTORY_QUERY, (int(employee_id),), "g.due_date, g.goal_id", ["due_date", "goal_id"], after, page_size)
+
+# Analytics aggregates
+# These return a handful of rows computed in Postgres so the Analytics tab never
+# has to pull whole tables (and their free-text columns) into pandas.
+def _analytics_scope(created_column: str, manager_id: int = None, start_date: date = None, end_date: date = None):
+    """Builds the shared WHERE clause for the analytics queries (goals aliased as g)."""
+    clauses, params = ["TRUE"], []
+    if manager_id is not None:
+        clauses.append("g.manager_id = %s")
+        params.append(int(manager_id))
+    if start_date is not None:
+        clauses.append(f"{created_column} >= %s")
+        params.append(start_date)
+    if end_date is not None:
+        clauses.append(f"{created_column} < %s::date + 1")
+        params.append(end_date)
+    return " AND ".join(clauses), tuple(params)
+
+@cached_read(lambda args: ["analytics"])
+def get_goal_status_counts(manager_id: int = None, start_date: date = None, end_date: date = None):
+    """Number of goals per status, optionally scoped to a manager and a created_at date range."""
+    where, params = _analytics_scope("g.created_at", manager_id, start_date, end_date)
+    query = f"""
+    SELECT g.status, count(*) AS count
+    FROM goals g
+    WHERE {where}
+    GROUP BY g.status
+    ORDER BY count DESC;
+    """
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame(columns=["status", "count"])
+        return pd.read_sql_query(query, conn, params=params)
+
+@cached_read(lambda args: ["analytics"])
+def get_task_status_counts(manager_id: int = None, start_date: date = None, end_date: date = None):
+    """Number of tasks per status, optionally scoped to a manager's goals and a created_at date range."""
+    where, params = _analytics_scope("t.created_at", manager_id, start_date, end_date)
+    join = "JOIN goals g ON t.goal_id = g.goal_id" if manager_id is not None else ""
+    query = f"""
+    SELECT t.status, count(*) AS count
+    FROM tasks t
+    {join}
+    WHERE {where}
+    GROUP BY t.status
+    ORDER BY count DESC;
+    """
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame(columns=["status", "count"])
+        return pd.read_sql_query(query, conn, params=params)
+
+@cached_read(lambda args: ["analytics"])
+def get_monthly_goal_trends(manager_id: int = None, start_date: date = None, end_date: date = None):
+    """Goals created per month and how many of them are completed, bucketed by date_trunc('month', created_at)."""
+    where, params = _analytics_scope("g.created_at", manager_id, start_date, end_date)
+    query = f"""
     SELECT
-        g.goal_id,
-        g.description AS goal_description,
-        g.due_date,
-        g.status AS goal_status,
-        string_agg(t.description, ' | ') AS task_descriptions,
-        string_agg(f.feedback_text, ' | ') AS feedback_history
+        to_char(date_trunc('month', g.created_at), 'YYYY-MM') AS month_year,
+        count(*) AS total_goals,
+        count(*) FILTER (WHERE g.status = 'Completed') AS completed_goals
     FROM goals g
-    LEFT JOIN tasks t ON g.goal_id = t.goal_id
-    LEFT JOIN feedback f ON g.goal_id = f.goal_id
-    WHERE g.employee_id = %s
-    GROUP BY g.goal_id
-    ORDER BY g.due_date;
+    WHERE {where}
+    GROUP BY 1
+    ORDER BY 1;
+    """
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame(columns=["month_year", "total_goals", "completed_goals"])
+        return pd.read_sql_query(query, conn, params=params)
+
+# Campaigns
+# Campaign reads use only the hourly and daily rollups from migration 8, which the
+# campaign_performance insert trigger keeps current. The raw events table (written
+# by campaign_ingest.py) grows by millions of rows per campaign and is never read
+# here. Rates are percentages of emails sent (click-to-open: of emails opened).
+# Date ranges up to this many days are charted per hour, longer ones per day
+CAMPAIGN_HOURLY_MAX_DAYS = 7
+
+_CAMPAIGN_TOTALS = """
+    sum(r.events) AS events,
+    sum(r.emails_sent) AS emails_sent,
+    sum(r.emails_opened) AS emails_opened,
+    sum(r.clicks) AS clicks,
+    round(100.0 * sum(r.emails_opened) / NULLIF(sum(r.emails_sent), 0), 2) AS open_rate,
+    round(100.0 * sum(r.clicks) / NULLIF(sum(r.emails_sent), 0), 2) AS click_rate,
+    round(100.0 * sum(r.clicks) / NULLIF(sum(r.emails_opened), 0), 2) AS click_to_open_rate
+"""
+
+def _campaign_scope(granularity: str, campaign_id: int = None, start_date: date = None, end_date: date = None):
+    """WHERE clause over a rollup aliased as r; dates are UTC days, both ends inclusive."""
+    clauses, params = ["TRUE"], []
+    if campaign_id is not None:
+        clauses.append("r.campaign_id = %s")
+        params.append(int(campaign_id))
+    if granularity == "hour":
+        if start_date is not None:
+            clauses.append("r.bucket >= %s::timestamp AT TIME ZONE 'UTC'")
+            params.append(start_date)
+        if end_date is not None:
+            clauses.append("r.bucket < (%s::date + 1)::timestamp AT TIME ZONE 'UTC'")
+            params.append(end_date)
+    else:
+        if start_date is not None:
+            clauses.append("r.bucket >= %s")
+            params.append(start_date)
+        if end_date is not None:
+            clauses.append("r.bucket <= %s")
+            params.append(end_date)
+    return " AND ".join(clauses), tuple(params)
+
+@cached_read(lambda args: ["campaigns"])
+def get_campaigns(as_records: bool = False):
+    query = "SELECT campaign_id, campaign_name, budget, start_date, end_date FROM campaigns ORDER BY start_date DESC NULLS LAST, campaign_id;"
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, None, as_records)
+
+@cached_read(lambda args: ["campaigns"])
+def get_campaign_summary(start_date: date = None, end_date: date = None, as_records: bool = False):
+    """Totals and open/click rates per campaign over a date range, from the daily rollup."""
+    where, params = _campaign_scope("day", None, start_date, end_date)
+    query = f"""
+    SELECT c.campaign_id, c.campaign_name, {_CAMPAIGN_TOTALS}
+    FROM campaign_performance_daily r
+    JOIN campaigns c ON c.campaign_id = r.campaign_id
+    WHERE {where}
+    GROUP BY c.campaign_id, c.campaign_name
+    ORDER BY emails_sent DESC, c.campaign_id;
+    """
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, params, as_records)
+
+@cached_read(lambda args: ["campaigns"])
+def get_channel_performance(campaign_id: int, start_date: date = None, end_date: date = None, as_records: bool = False):
+    """Totals and rates per channel of one campaign, from the daily rollup."""
+    where, params = _campaign_scope("day", campaign_id, start_date, end_date)
+    query = f"""
+    SELECT ch.channel_id, ch.channel_name, {_CAMPAIGN_TOTALS}
+    FROM campaign_performance_daily r
+    JOIN channels ch ON ch.channel_id = r.channel_id
+    WHERE {where}
+    GROUP BY ch.channel_id, ch.channel_name
+    ORDER BY ch.channel_name;
+    """
+    with db_connection() as conn:
+        if not conn: return _empty(as_records)
+        return _read_query(query, conn, params, as_records)
+
+@cached_read(lambda args: ["campaigns"])
+def get_campaign_timeseries(campaign_id: int, start_date: date = None, end_date: date = None, granularity: str = None):
+    """
+    Totals and rates per (bucket, channel) for one campaign as a DataFrame.
+    granularity is 'hour' or 'day'; by default hourly for explicit ranges of up
+    to CAMPAIGN_HOURLY_MAX_DAYS days, otherwise daily.
+    """
+    if granularity is None:
+        short = start_date is not None and end_date is not None and (end_date - start_date).days < CAMPAIGN_HOURLY_MAX_DAYS
+        granularity = "hour" if short else "day"
+    table = {"hour": "campaign_performance_hourly", "day": "campaign_performance_daily"}[granularity]
+    where, params = _campaign_scope(granularity, campaign_id, start_date, end_date)
+    query = f"""
+    SELECT r.bucket, ch.channel_name, {_CAMPAIGN_TOTALS}
+    FROM {table} r
+    JOIN channels ch ON ch.channel_id = r.channel_id
+    WHERE {where}
+    GROUP BY r.bucket, ch.channel_name
+    ORDER BY r.bucket, ch.channel_name;
     """
-    df = pd.read_sql_query(query, conn, params=(int(employee_id),))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        if not conn: return pd.DataFrame(columns=["bucket", "channel_name", "events", "emails_sent", "emails_opened", "clicks", "open_rate", "click_rate", "click_to_open_rate"])
+        return pd.read_sql_query(query, conn, params=params)
+
+# Change Feed
+# Rows are matched on updated_at, which is the writing transaction's start time,
+# so a transaction that commits late can carry an older timestamp. Watermarks
+# therefore trail the database clock by CHANGE_FEED_LAG_SECONDS and consecutive
+# polls overlap; callers should treat rows as upserts keyed on their id.
+CHANGE_FEED_LAG_SECONDS = 5
+CHANGE_FEED_MAX_ROWS = 500
+
+_CHANGED_GOALS_QUERY = """
+    SELECT g.goal_id, g.employee_id, g.manager_id, g.description, g.due_date, g.status, g.created_at, g.updated_at
+    FROM goals g
+    WHERE g.updated_at > %s {scope}
+    ORDER BY g.updated_at, g.goal_id
+    LIMIT %s;
+"""
+_CHANGED_TASKS_QUERY = """
+    SELECT t.task_id, t.goal_id, g.employee_id, g.manager_id, t.description AS task_description, t.status, t.created_at, t.updated_at
+    FROM tasks t
+    JOIN goals g ON g.goal_id = t.goal_id
+    WHERE t.updated_at > %s {scope}
+    ORDER BY t.updated_at, t.task_id
+    LIMIT %s;
+"""
+_CHANGED_FEEDBACK_QUERY = """
+    SELECT f.feedback_id, f.goal_id, g.employee_id, f.manager_id, u.name AS manager_name, f.feedback_text, f.created_at, f.updated_at
+    FROM feedback f
+    JOIN goals g ON g.goal_id = f.goal_id
+    JOIN users u ON u.user_id = f.manager_id
+    WHERE f.updated_at > %s {scope}
+    ORDER BY f.updated_at, f.feedback_id
+    LIMIT %s;
+"""
+
+def get_changes_since(watermark=None, manager_id: int = None, employee_id: int = None):
+    """
+    Goals, tasks and feedback changed after `watermark`, optionally limited to one
+    manager's or employee's goals. Returns a dict with "goals", "tasks" and
+    "feedback" record lists, the "watermark" to pass next time, and "complete",
+    which is False when a table had more than CHANGE_FEED_MAX_ROWS changes (the
+    caller should then reload in full). A None watermark only starts the feed.
+    Returns None if the database is unreachable.
+    """
+    scope, scope_params = "", ()
+    if manager_id is not None:
+        scope, scope_params = "AND g.manager_id = %s", (manager_id,)
+    elif employee_id is not None:
+        scope, scope_params = "AND g.employee_id = %s", (employee_id,)
+    changes = {"goals": [], "tasks": [], "feedback": [], "complete": True}
+    with db_connection() as conn:
+        if not conn: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT NOW() - make_interval(secs => %s);", (CHANGE_FEED_LAG_SECONDS,))
+                changes["watermark"] = cur.fetchone()[0]
+            if watermark is None:
+                return changes
+            for table, query in (("goals", _CHANGED_GOALS_QUERY), ("tasks", _CHANGED_TASKS_QUERY), ("feedback", _CHANGED_FEEDBACK_QUERY)):
+                rows = _read_query(query.format(scope=scope), conn, (watermark, *scope_params, CHANGE_FEED_MAX_ROWS + 1), as_records=True)
+                if len(rows) > CHANGE_FEED_MAX_ROWS:
+                    changes["complete"] = False
+                    rows = rows[:CHANGE_FEED_MAX_ROWS]
+                changes[table] = rows
+        except psycopg2.Error as e:
+            print(f"Error reading change feed: {e}")
+            return None
+    return changes
+
+# Warmup
+def warm_cache(manager_ids: List[int] = None, employee_ids: List[int] = None):
+    """
+    Runs the first-page dashboard reads for the given managers and employees (all
+    of them when both are omitted). This fills this process's read cache and
+    Postgres' buffer cache. Returns the number of users warmed.
+    """
+    if manager_ids is None and employee_ids is None:
+        manager_ids = [u.user_id for u in get_users_by_role('Manager', as_records=True)]
+        employee_ids = [u.user_id for u in get_users_by_role('Employee', as_records=True)]
+    for manager_id in manager_ids or []:
+        fetch_concurrently(
+            pending_count=(count_pending_tasks_for_manager, manager_id),
+            pending_page=functools.partial(get_pending_tasks_for_manager_page, manager_id, as_records=True),
+            goals_total=(count_manager_goals, manager_id),
+            goals_page=functools.partial(get_manager_goals_page, manager_id, as_records=True),
+            history_page=(get_employee_performance_history_page, manager_id),
+        )
+    for employee_id in employee_ids or []:
+        fetch_concurrently(
+            goals=functools.partial(get_employee_goals, employee_id, as_records=True),
+            goal_details=functools.partial(get_goal_details, employee_id=employee_id),
+            history_page=(get_employee_performance_history_page, employee_id),
+        )
+    return len(manager_ids or []) + len(employee_ids or [])
@@ -0,0 +1,179 @@
+# bench_data.py
+
+"""
+Deterministic synthetic organisation for benchmarks.
+
+Seeds users (a CEO -> directors -> managers -> employees hierarchy through
+users.manager_id), goals, tasks and feedback at a named scale. The same seed
+and scale always produce the same rows. Rows are generated lazily and
+streamed into Postgres with COPY, so even the 10M scale never holds a table
+in memory.
+
+This TRUNCATES the application tables. Only point it at a throwaway database.
+"""
+
+import io
+import random
+from datetime import datetime, timedelta, timezone
+
+import backend
+
+# Approximate total row counts: 1k, 100k and 10M rows across all four tables.
+SCALES = {
+    "1k": {"directors": 2, "managers_per_director": 3, "employees_per_manager": 10, "goals": 400, "tasks_per_goal": 1.0, "feedback_per_goal": 0.3},
+    "100k": {"directors": 10, "managers_per_director": 10, "employees_per_manager": 15, "goals": 30_000, "tasks_per_goal": 1.6, "feedback_per_goal": 0.6},
+    "10m": {"directors": 50, "managers_per_director": 40, "employees_per_manager": 40, "goals": 2_500_000, "tasks_per_goal": 2.0, "feedback_per_goal": 0.9},
+}
+
+GOAL_STATUSES = ['Draft', 'In Progress', 'Completed', 'Cancelled']
+GOAL_STATUS_WEIGHTS = [15, 45, 30, 10]
+TASK_STATUSES = ['Pending Approval', 'Approved', 'Rejected']
+TASK_STATUS_WEIGHTS = [30, 60, 10]
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HISTORY_DAYS = 3 * 365
+
+WORDS = ("improve deliver reduce customer onboarding latency quality review pipeline revenue coverage "
+         "mentor automate document migrate release forecast audit training security support").split()
+
+class _CopyStream(io.TextIOBase):
+    """Read-only text stream over a generator of lines, as consumed by cursor.copy_expert."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+def _tsv(*values):
+    return "\t".join("\\N" if v is None else str(v) for v in values) + "\n"
+
+def _sentence(rng, words=6):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def _users(spec):
+    # Ids are contiguous per level: CEO 1, then directors, then line managers, then employees.
+    yield _tsv(1, "CEO 0001", "Manager", None)
+    directors = range(2, 2 + spec["directors"])
+    for director_id in directors:
+        yield _tsv(director_id, f"Director {director_id:05d}", "Manager", 1)
+    line_managers = _line_managers(spec)
+    for i, manager_id in enumerate(line_managers):
+        yield _tsv(manager_id, f"Manager {manager_id:06d}", "Manager", directors[i // spec["managers_per_director"]])
+    next_id = line_managers[-1] + 1
+    for manager_id in line_managers:
+        for _ in range(spec["employees_per_manager"]):
+            yield _tsv(next_id, f"Employee {next_id:07d}", "Employee", manager_id)
+            next_id += 1
+
+def _line_managers(spec):
+    first = 2 + spec["directors"]
+    return list(range(first, first + spec["directors"] * spec["managers_per_director"]))
+
+def _goal_owners(spec):
+    """Returns owner(goal_index) -> (employee_id, manager_id), spreading goals round-robin over employees."""
+    line_managers = _line_managers(spec)
+    first_employee = line_managers[-1] + 1
+    per_manager = spec["employees_per_manager"]
+    employees = len(line_managers) * per_manager
+
+    def owner(goal_index):
+        offset = goal_index % employees
+        return first_employee + offset, line_managers[offset // per_manager]
+    return owner
+
+def sample_users(scale: str, count: int, seed: int = 42):
+    """Picks `count` line managers and `count` employees (who own goals) deterministically."""
+    spec = SCALES[scale]
+    line_managers = _line_managers(spec)
+    first_employee = line_managers[-1] + 1
+    employees = range(first_employee, first_employee + len(line_managers) * spec["employees_per_manager"])
+    rng = random.Random(f"{seed}:sample")
+    return (rng.sample(line_managers, min(count, len(line_managers))),
+            rng.sample(employees, min(count, len(employees))))
+
+def manager_of(scale: str, employee_id: int):
+    """Line manager of a generated employee."""
+    spec = SCALES[scale]
+    line_managers = _line_managers(spec)
+    return line_managers[(employee_id - line_managers[-1] - 1) // spec["employees_per_manager"]]
+
+def _goals(spec, seed):
+    rng = random.Random(f"{seed}:goals")
+    owner = _goal_owners(spec)
+    for goal_id in range(1, spec["goals"] + 1):
+        employee_id, manager_id = owner(goal_id - 1)
+        created = EPOCH + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        due = (created + timedelta(days=rng.randrange(14, 365))).date()
+        status = rng.choices(GOAL_STATUSES, GOAL_STATUS_WEIGHTS)[0]
+        completed = created + timedelta(hours=rng.randrange(24, 24 * 300)) if status == 'Completed' else None
+        updated = completed or created
+        yield _tsv(goal_id, employee_id, manager_id, _sentence(rng, 8), due, status, created.isoformat(), updated.isoformat(), completed and completed.isoformat())
+
+def _tasks(spec, seed):
+    rng = random.Random(f"{seed}:tasks")
+    total = int(spec["goals"] * spec["tasks_per_goal"])
+    for task_id in range(1, total + 1):
+        goal_id = rng.randrange(1, spec["goals"] + 1)
+        created = EPOCH + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        status = rng.choices(TASK_STATUSES, TASK_STATUS_WEIGHTS)[0]
+        reviewed = created + timedelta(minutes=rng.randrange(10, 60 * 24 * 14)) if status != 'Pending Approval' else None
+        updated = reviewed or created
+        yield _tsv(task_id, goal_id, _sentence(rng), status, created.isoformat(), updated.isoformat(), reviewed and reviewed.isoformat())
+
+def _feedback(spec, seed):
+    rng = random.Random(f"{seed}:feedback")
+    owner = _goal_owners(spec)
+    total = int(spec["goals"] * spec["feedback_per_goal"])
+    for feedback_id in range(1, total + 1):
+        goal_id = rng.randrange(1, spec["goals"] + 1)
+        _, manager_id = owner(goal_id - 1)
+        created = EPOCH + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        yield _tsv(feedback_id, goal_id, manager_id, _sentence(rng, 12), created.isoformat(), created.isoformat())
+
+TABLES = [
+    ("users", "user_id, name, role, manager_id", _users),
+    ("goals", "goal_id, employee_id, manager_id, description, due_date, status, created_at, updated_at, completed_at", _goals),
+    ("tasks", "task_id, goal_id, description, status, created_at, updated_at, reviewed_at", _tasks),
+    ("feedback", "feedback_id, goal_id, manager_id, feedback_text, created_at, updated_at", _feedback),
+]
+
+def seed_database(scale: str, seed: int = 42, progress=print):
+    """Truncates the application tables and loads the synthetic org. Returns row counts per table."""
+    spec = SCALES[scale]
+    counts = {}
+    backend.run_migrations()
+    with backend.db_connection() as conn:
+        if not conn:
+            raise RuntimeError(f"could not connect to the database: {backend.connection_error}")
+        with conn.cursor() as cur:
+            # user_hierarchy goes with users (CASCADE); manager_rollups has no foreign key
+            cur.execute("TRUNCATE feedback, tasks, goals, users, manager_rollups RESTART IDENTITY CASCADE;")
+            for table, columns, rows in TABLES:
+                generator = rows(spec) if table == "users" else rows(spec, seed)
+                cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", _CopyStream(generator))
+                cur.execute(f"SELECT count(*) FROM {table};")
+                counts[table] = cur.fetchone()[0]
+                id_column = columns.split(",")[0]
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{id_column}'), GREATEST((SELECT max({id_column}) FROM {table}), 1));")
+                progress(f"  {table}: {counts[table]:,} rows")
+            cur.execute("ANALYZE users, goals, tasks, feedback, user_hierarchy, manager_rollups;")
+        conn.commit()
+    backend.clear_read_cache()
+    return counts
@@ -0,0 +1,237 @@
+# benchmark.py
+
+"""
+Reproducible performance benchmarks for the backend.
+
+Seeds a throwaway database with bench_data at the chosen scale, then times
+every backend read and write and a full simulated manager and employee
+dashboard rerun. For each case it records p50/p95/mean latency, statements
+issued per call and peak Python memory, writes the results as JSON and
+optionally compares them with a stored baseline.
+
+    PMS_DB_NAME=pms_bench python benchmark.py --scale 1k --out bench_results.json
+    PMS_DB_NAME=pms_bench python benchmark.py --scale 1k --skip-seed --baseline bench_baseline.json
+
+Exits with status 1 when a case regresses against the baseline.
+"""
+
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+
+import backend
+import bench_data
+import write_behind
+
+# Latency regressions smaller than this are treated as noise regardless of tolerance.
+MIN_REGRESSION_MS = 0.5
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def _goal_ids_for(employees):
+    goal_ids = []
+    for employee_id in employees:
+        goal_ids += [g.goal_id for g in backend.get_employee_goals(employee_id, as_records=True)]
+    return goal_ids or [0]
+
+def _pending_task_ids_for(managers):
+    task_ids = []
+    for manager_id in managers:
+        task_ids += backend.get_pending_task_ids(manager_id)
+    return task_ids or [0]
+
+def manager_dashboard(manager_id):
+    """Issues the same reads as one rerun of the manager dashboard in frontend.py."""
+    dashboard = backend.fetch_concurrently(
+        pending_count=(backend.count_pending_tasks_for_manager, manager_id),
+        pending_page=partial(backend.get_pending_tasks_for_manager_page, manager_id, None, 25, as_records=True),
+        employees=partial(backend.get_users_by_role, 'Employee', as_records=True),
+        goals_total=(backend.count_manager_goals, manager_id),
+        goals_page=partial(backend.get_manager_goals_page, manager_id, None, 25, as_records=True),
+        history_page=(backend.get_employee_performance_history_page, manager_id),
+    )
+    # A few goals with their task list expanded
+    goals, _ = dashboard['goals_page']
+    open_goal_ids = [g.goal_id for g in goals[:3]]
+    if open_goal_ids:
+        backend.get_goal_details(goal_ids=open_goal_ids)
+    return dashboard
+
+def employee_dashboard(employee_id):
+    """Issues the same reads as one rerun of the employee dashboard in frontend.py."""
+    return backend.fetch_concurrently(
+        goals=partial(backend.get_employee_goals, employee_id, as_records=True),
+        goal_details=partial(backend.get_goal_details, employee_id=employee_id),
+        history_page=(backend.get_employee_performance_history_page, employee_id),
+    )
+
+def build_cases(scale, managers, employees):
+    """Returns {name: fn(i)}; each call rotates through the sampled users, goals and tasks."""
+    goal_ids = _goal_ids_for(employees)
+    task_ids = _pending_task_ids_for(managers)
+    m = lambda i: managers[i % len(managers)]
+    e = lambda i: employees[i % len(employees)]
+    g = lambda i: goal_ids[i % len(goal_ids)]
+    t = lambda i: task_ids[i % len(task_ids)]
+    last_year = date.today() - timedelta(days=365)
+
+    cases = {
+        "get_users_by_role": lambda i: backend.get_users_by_role('Employee'),
+        "get_users_by_role[records]": lambda i: backend.get_users_by_role('Employee', as_records=True),
+        "get_employee_goals": lambda i: backend.get_employee_goals(e(i)),
+        "get_manager_goals": lambda i: backend.get_manager_goals(m(i)),
+        "get_manager_goals_page": lambda i: backend.get_manager_goals_page(m(i)),
+        "count_manager_goals": lambda i: backend.count_manager_goals(m(i)),
+        "get_tasks_for_goal": lambda i: backend.get_tasks_for_goal(g(i)),
+        "get_feedback_for_goal": lambda i: backend.get_feedback_for_goal(g(i)),
+        "get_pending_tasks_for_manager": lambda i: backend.get_pending_tasks_for_manager(m(i)),
+        "get_pending_tasks_for_manager_page": lambda i: backend.get_pending_tasks_for_manager_page(m(i)),
+        "count_pending_tasks_for_manager": lambda i: backend.count_pending_tasks_for_manager(m(i)),
+        "get_pending_task_summary": lambda i: backend.get_pending_task_summary(m(i)),
+        "get_goal_details[manager]": lambda i: backend.get_goal_details(manager_id=m(i)),
+        "get_goal_details[employee]": lambda i: backend.get_goal_details(employee_id=e(i)),
+        "get_employee_performance_history": lambda i: backend.get_employee_performance_history(e(i)),
+        "get_employee_performance_history_page": lambda i: backend.get_employee_performance_history_page(e(i)),
+        "get_goal_status_counts": lambda i: backend.get_goal_status_counts(),
+        "get_goal_status_counts[manager]": lambda i: backend.get_goal_status_counts(m(i), last_year),
+        "get_task_status_counts": lambda i: backend.get_task_status_counts(),
+        "get_monthly_goal_trends": lambda i: backend.get_monthly_goal_trends(),
+        "search[manager]": lambda i: backend.search(bench_data.WORDS[i % len(bench_data.WORDS)], manager_id=m(i)),
+        "search[all]": lambda i: backend.search(bench_data.WORDS[i % len(bench_data.WORDS)]),
+        "get_subtree_rollup[ceo]": lambda i: backend.get_subtree_rollup(1),
+        "get_direct_report_rollups[ceo]": lambda i: backend.get_direct_report_rollups(1),
+        "get_subtree_pending_tasks_page[ceo]": lambda i: backend.get_subtree_pending_tasks_page(1),
+        "get_subtree_goals_page[manager]": lambda i: backend.get_subtree_goals_page(m(i)),
+        "manager_dashboard": lambda i: manager_dashboard(m(i)),
+        "employee_dashboard": lambda i: employee_dashboard(e(i)),
+        # Writes last, so they do not shift the data the reads above see
+        "create_goal": lambda i: backend.create_goal(e(i), bench_data.manager_of(scale, e(i)), f"Benchmark goal {i}", date.today()),
+        "create_task": lambda i: backend.create_task(g(i), f"Benchmark task {i}"),
+        "update_task_status": lambda i: backend.update_task_status(t(i), 'Approved'),
+        "update_task_statuses": lambda i: backend.update_task_statuses(task_ids[i * 10 % len(task_ids):][:10], 'Approved'),
+        "create_feedback": lambda i: backend.create_feedback(g(i), m(i), f"Benchmark feedback {i}"),
+        # A burst of 100 task logs: one synchronous commit each vs. group-committed
+        "create_task[x100]": lambda i: [backend.create_task(g(i + k), f"Benchmark burst {i}.{k}") for k in range(100)],
+        "write_behind.create_task[x100]": lambda i: [f.result() for f in [write_behind.submit_task(g(i + k), f"Benchmark burst {i}.{k}") for k in range(100)]],
+    }
+    if scale != "10m":
+        # Whole-table reads are only meaningful at the smaller scales
+        cases["get_all_goals"] = lambda i: backend.get_all_goals()
+        cases["get_all_tasks"] = lambda i: backend.get_all_tasks()
+    return cases
+
+def run_case(fn, iterations, use_cache):
+    """Times `iterations` calls of fn, then makes one more call under tracemalloc for peak memory."""
+    fn(0)  # warm connections and Postgres buffers
+    latencies = []
+    queries_before = backend.query_count()
+    for i in range(iterations):
+        if not use_cache:
+            backend.clear_read_cache()
+        started = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    queries = (backend.query_count() - queries_before) / iterations
+
+    if not use_cache:
+        backend.clear_read_cache()
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": round(queries, 2),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for name, base in baseline["results"].items():
+        current = results["results"].get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and current["p95_ms"] - base["p95_ms"] > MIN_REGRESSION_MS:
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["queries"] > base["queries"]:
+            regressions.append(f"{name}: queries per call {base['queries']} -> {current['queries']}")
+        if current["peak_kb"] > base["peak_kb"] * (1 + tolerance) and current["peak_kb"] - base["peak_kb"] > 64:
+            regressions.append(f"{name}: peak memory {base['peak_kb']}KB -> {current['peak_kb']}KB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(bench_data.SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--users", type=int, default=10, help="managers and employees to rotate through")
+    parser.add_argument("--cases", nargs="+", help="only run these case names")
+    parser.add_argument("--use-cache", action="store_true", help="keep the read cache between calls instead of clearing it")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data from a previous run with the same scale and seed")
+    parser.add_argument("--force", action="store_true", help=f"allow seeding the default database {backend.DB_NAME!r}")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before a case counts as a regression")
+    args = parser.parse_args(argv)
+
+    if not args.skip_seed:
+        if backend.DB_NAME == "pms" and not args.force:
+            parser.error("refusing to truncate the default 'pms' database; set PMS_DB_NAME to a throwaway database or pass --force")
+        print(f"Seeding {args.scale} org (seed {args.seed}) into {backend.DB_HOST}/{backend.DB_NAME}...")
+        bench_data.seed_database(args.scale, args.seed)
+    else:
+        backend.run_migrations()
+
+    managers, employees = bench_data.sample_users(args.scale, args.users, args.seed)
+    cases = build_cases(args.scale, managers, employees)
+    if args.cases:
+        cases = {name: fn for name, fn in cases.items() if name in args.cases}
+
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "use_cache": args.use_cache,
+            "python": platform.python_version(),
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": {},
+    }
+    print(f"{'case':45} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KB':>9}")
+    for name, fn in cases.items():
+        stats = run_case(fn, args.iterations, args.use_cache)
+        results["results"][name] = stats
+        print(f"{name:45} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['queries']:8.2f} {stats['peak_kb']:9.1f}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("scale") != args.scale:
+            print(f"Warning: baseline was recorded at scale {baseline['meta'].get('scale')}, not {args.scale}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+# bulk_io.py
+
+"""
+Bulk import and export built on Postgres COPY.
+
+Imports validate every row in Python, COPY the valid rows into a temporary
+staging table one chunk at a time and resolve manager/employee names to user
+ids in SQL before inserting into the real table. Each chunk is its own
+transaction, so a failing chunk does not undo the ones before it.
+
+Exports stream COPY ... TO STDOUT straight into a file object, so the result
+set is never held in memory.
+"""
+
+import csv
+import io
+import os
+from contextlib import contextmanager
+from datetime import date
+
+import psycopg2
+
+import backend
+
+CHUNK_ROWS = 50_000
+
+DELIMITERS = {"csv": ",", "tsv": "\t"}
+
+USER_ROLES = ['Manager', 'Employee']
+GOAL_STATUSES = ['Draft', 'In Progress', 'Completed', 'Cancelled']
+TASK_STATUSES = ['Pending Approval', 'Approved', 'Rejected']
+
+# --- Helpers ---
+
+def _format_for(source, fmt):
+    if fmt is None:
+        fmt = "tsv" if isinstance(source, str) and source.lower().endswith((".tsv", ".tab")) else "csv"
+    if fmt not in DELIMITERS:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {sorted(DELIMITERS)}")
+    return fmt
+
+@contextmanager
+def _open(target, mode):
+    """Yields a text file for a path, or the object itself if it is already file-like."""
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, mode, newline="", encoding="utf-8") as f:
+            yield f
+    else:
+        yield target
+
+def _text(raw, field, required=True):
+    value = (raw.get(field) or "").strip()
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    return value or None
+
+def _int(raw, field):
+    value = _text(raw, field)
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{field} must be an integer, got {value!r}")
+
+def _date(raw, field):
+    value = _text(raw, field)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO date (YYYY-MM-DD), got {value!r}")
+
+def _choice(raw, field, choices, default):
+    value = _text(raw, field, required=default is None) or default
+    if value not in choices:
+        raise ValueError(f"{field} must be one of {choices}, got {value!r}")
+    return value
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Names are resolved once per chunk into a temp table; ambiguous names (shared by
+# several users) are left out so they surface as errors instead of a wrong match.
+_RESOLVE_NAMES = """
+CREATE TEMP TABLE import_names ON COMMIT DROP AS
+SELECT name, min(user_id) AS user_id
+FROM users
+WHERE name IN ({name_columns})
+GROUP BY name
+HAVING count(*) = 1;
+"""
+
+def _resolve_names(*columns):
+    selects = " UNION ".join(f"SELECT {c} FROM import_staging" for c in columns)
+    return _RESOLVE_NAMES.format(name_columns=selects)
+
+# --- Import ---
+
+# Each spec lists the header columns a file must have, a row converter that
+# raises ValueError on invalid input, the staging table layout (line_no first),
+# and the statements run per chunk. Statements tagged "errors" return
+# (line_no, message) rows; statements tagged "inserted" count toward the total.
+IMPORT_SPECS = {
+    "users": {
+        "required": ["name", "role"],
+        "convert": lambda raw: (_text(raw, "name"), _choice(raw, "role", USER_ROLES, None), _text(raw, "manager_name", required=False)),
+        "staging": "line_no INTEGER, name VARCHAR(255), role VARCHAR(50), manager_name VARCHAR(255), user_id INTEGER",
+        "steps": [
+            ("UPDATE import_staging SET user_id = nextval(pg_get_serial_sequence('users', 'user_id'));", None),
+            ("INSERT INTO users (user_id, name, role) SELECT user_id, name, role FROM import_staging ORDER BY line_no;", "inserted"),
+            (_resolve_names("manager_name"), None),
+            ("""
+             SELECT s.line_no, 'user inserted without a manager: unknown or ambiguous manager_name ' || quote_literal(s.manager_name)
+             FROM import_staging s
+             LEFT JOIN import_names m ON m.name = s.manager_name
+             WHERE s.manager_name IS NOT NULL AND m.user_id IS NULL;
+             """, "errors"),
+            ("""
+             UPDATE users u SET manager_id = m.user_id
+             FROM import_staging s
+             JOIN import_names m ON m.name = s.manager_name
+             WHERE u.user_id = s.user_id;
+             """, None),
+        ],
+    },
+    "goals": {
+        "required": ["employee_name", "manager_name", "description", "due_date"],
+        "convert": lambda raw: (_text(raw, "employee_name"), _text(raw, "manager_name"), _text(raw, "description"),
+                                _date(raw, "due_date"), _choice(raw, "status", GOAL_STATUSES, "Draft")),
+        "staging": "line_no INTEGER, employee_name VARCHAR(255), manager_name VARCHAR(255), description TEXT, due_date DATE, status VARCHAR(50)",
+        "steps": [
+            (_resolve_names("employee_name", "manager_name"), None),
+            ("""
+             SELECT s.line_no, 'unknown or ambiguous ' || CASE WHEN e.user_id IS NULL
+                 THEN 'employee_name ' || quote_literal(s.employee_name)
+                 ELSE 'manager_name ' || quote_literal(s.manager_name) END
+             FROM import_staging s
+             LEFT JOIN import_names e ON e.name = s.employee_name
+             LEFT JOIN import_names m ON m.name = s.manager_name
+             WHERE e.user_id IS NULL OR m.user_id IS NULL;
+             """, "errors"),
+            ("""
+             INSERT INTO goals (employee_id, manager_id, description, due_date, status)
+             SELECT e.user_id, m.user_id, s.description, s.due_date, s.status
+             FROM import_staging s
+             JOIN import_names e ON e.name = s.employee_name
+             JOIN import_names m ON m.name = s.manager_name
+             ORDER BY s.line_no;
+             """, "inserted"),
+        ],
+    },
+    "tasks": {
+        "required": ["goal_id", "description"],
+        "convert": lambda raw: (_int(raw, "goal_id"), _text(raw, "description"), _choice(raw, "status", TASK_STATUSES, "Pending Approval")),
+        "staging": "line_no INTEGER, goal_id INTEGER, description TEXT, status VARCHAR(50)",
+        "steps": [
+            ("""
+             SELECT s.line_no, 'unknown goal_id ' || s.goal_id
+             FROM import_staging s
+             WHERE NOT EXISTS (SELECT 1 FROM goals g WHERE g.goal_id = s.goal_id);
+             """, "errors"),
+            ("""
+             INSERT INTO tasks (goal_id, description, status)
+             SELECT s.goal_id, s.description, s.status
+             FROM import_staging s
+             JOIN goals g ON g.goal_id = s.goal_id
+             ORDER BY s.line_no;
+             """, "inserted"),
+        ],
+    },
+    "feedback": {
+        "required": ["goal_id", "manager_name", "feedback_text"],
+        "convert": lambda raw: (_int(raw, "goal_id"), _text(raw, "manager_name"), _text(raw, "feedback_text")),
+        "staging": "line_no INTEGER, goal_id INTEGER, manager_name VARCHAR(255), feedback_text TEXT",
+        "steps": [
+            (_resolve_names("manager_name"), None),
+            ("""
+             SELECT s.line_no, CASE WHEN g.goal_id IS NULL
+                 THEN 'unknown goal_id ' || s.goal_id
+                 ELSE 'unknown or ambiguous manager_name ' || quote_literal(s.manager_name) END
+             FROM import_staging s
+             LEFT JOIN goals g ON g.goal_id = s.goal_id
+             LEFT JOIN import_names m ON m.name = s.manager_name
+             WHERE g.goal_id IS NULL OR m.user_id IS NULL;
+             """, "errors"),
+            ("""
+             INSERT INTO feedback (goal_id, manager_id, feedback_text)
+             SELECT s.goal_id, m.user_id, s.feedback_text
+             FROM import_staging s
+             JOIN goals g ON g.goal_id = s.goal_id
+             JOIN import_names m ON m.name = s.manager_name
+             ORDER BY s.line_no;
+             """, "inserted"),
+        ],
+    },
+}
+
+def import_rows(table: str, source, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Bulk-loads `table` ('users', 'goals', 'tasks' or 'feedback') from a CSV/TSV
+    path or open text file with a header row. Returns
+    {"inserted": int, "errors": [(line_no, message), ...]}; rows listed in
+    errors were skipped (or, for users, inserted without a manager).
+    """
+    spec = IMPORT_SPECS[table]
+    delimiter = DELIMITERS[_format_for(source, fmt)]
+    result = {"inserted": 0, "errors": []}
+
+    def valid_rows(reader):
+        for raw in reader:
+            line_no = reader.line_num
+            try:
+                yield (line_no,) + spec["convert"](raw)
+            except ValueError as e:
+                result["errors"].append((line_no, str(e)))
+
+    with _open(source, "r") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        missing = [c for c in spec["required"] if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{table} import is missing columns: {', '.join(missing)}")
+        with backend.db_connection() as conn:
+            if not conn:
+                result["errors"].append((None, "could not connect to the database"))
+                return result
+            for chunk in _chunks(valid_rows(reader), chunk_rows):
+                buf = io.StringIO()
+                csv.writer(buf).writerows(chunk)
+                buf.seek(0)
+                cur = conn.cursor()
+                try:
+                    cur.execute(f"CREATE TEMP TABLE import_staging ({spec['staging']}) ON COMMIT DROP;")
+                    cur.copy_expert("COPY import_staging FROM STDIN WITH (FORMAT csv)", buf)
+                    inserted, errors = 0, []
+                    for sql, kind in spec["steps"]:
+                        cur.execute(sql)
+                        if kind == "errors":
+                            errors.extend(cur.fetchall())
+                        elif kind == "inserted":
+                            inserted += cur.rowcount
+                    conn.commit()
+                    backend.clear_read_cache()
+                    result["inserted"] += inserted
+                    result["errors"].extend(errors)
+                except (Exception, psycopg2.Error) as error:
+                    conn.rollback()
+                    first, last = chunk[0][0], chunk[-1][0]
+                    result["errors"].append((first, f"lines {first}-{last} rolled back: {error}"))
+                finally:
+                    cur.close()
+    result["errors"].sort(key=lambda e: (e[0] is None, e[0] or 0))
+    return result
+
+def import_users(source, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """Columns: name, role, manager_name (optional; must appear earlier in the file or already exist)."""
+    return import_rows("users", source, fmt, chunk_rows)
+
+def import_goals(source, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """Columns: employee_name, manager_name, description, due_date, status (optional)."""
+    return import_rows("goals", source, fmt, chunk_rows)
+
+def import_tasks(source, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """Columns: goal_id, description, status (optional)."""
+    return import_rows("tasks", source, fmt, chunk_rows)
+
+def import_feedback(source, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """Columns: goal_id, manager_name, feedback_text."""
+    return import_rows("feedback", source, fmt, chunk_rows)
+
+# --- Export ---
+
+EXPORT_QUERIES = {
+    "goals": """
+        SELECT g.goal_id, e.name AS employee_name, m.name AS manager_name, g.description, g.due_date, g.status, g.created_at
+        FROM goals g
+        JOIN users e ON g.employee_id = e.user_id
+        JOIN users m ON g.manager_id = m.user_id
+        WHERE {scope}
+        ORDER BY g.goal_id
+    """,
+    "tasks": """
+        SELECT t.task_id, t.goal_id, t.description, t.status, t.created_at
+        FROM tasks t
+        JOIN goals g ON t.goal_id = g.goal_id
+        WHERE {scope}
+        ORDER BY t.task_id
+    """,
+    "feedback": """
+        SELECT f.feedback_id, f.goal_id, m.name AS manager_name, f.feedback_text, f.created_at
+        FROM feedback f
+        JOIN goals g ON f.goal_id = g.goal_id
+        JOIN users m ON f.manager_id = m.user_id
+        WHERE {scope}
+        ORDER BY f.feedback_id
+    """,
+}
+
+def _copy_out(query: str, params: tuple, out, fmt: str):
+    delimiter = "E'\\t'" if fmt == "tsv" else "','"
+    with backend.db_connection() as conn:
+        if not conn: return False
+        cur = conn.cursor()
+        try:
+            bound = cur.mogrify(query.strip().rstrip(";"), params).decode()
+            with _open(out, "w") as f:
+                cur.copy_expert(f"COPY ({bound}) TO STDOUT WITH (FORMAT csv, HEADER, DELIMITER {delimiter})", f)
+            return True
+        except (Exception, psycopg2.Error) as error:
+            print(f"Error exporting data: {error}")
+            return False
+        finally:
+            cur.close()
+
+def export_table(table: str, out, fmt: str = None, manager_id: int = None, employee_id: int = None):
+    """
+    Streams 'goals', 'tasks' or 'feedback' to a CSV/TSV path or writable text
+    file, optionally limited to one manager's or employee's goals.
+    """
+    clauses, params = ["TRUE"], []
+    if manager_id is not None:
+        clauses.append("g.manager_id = %s")
+        params.append(int(manager_id))
+    if employee_id is not None:
+        clauses.append("g.employee_id = %s")
+        params.append(int(employee_id))
+    query = EXPORT_QUERIES[table].format(scope=" AND ".join(clauses))
+    return _copy_out(query, tuple(params), out, _format_for(out, fmt))
+
+def export_performance_history(employee_id: int, out, fmt: str = None):
+    """Streams the performance history report for one employee to CSV/TSV."""
+    query = backend._HISTORY_QUERY.format(keyset="", limit="")
+    return _copy_out(query, (int(employee_id),), out, _format_for(out, fmt))
@@ -0,0 +1,212 @@
+# campaign_ingest.py
+
+"""
+High-throughput ingestion of campaign performance events.
+
+    result = campaign_ingest.ingest_events(events)
+
+Events are (campaign_id, channel_id, emails_sent, emails_opened, clicks,
+timestamp) tuples or dicts with those keys; naive timestamps are taken as UTC.
+They are validated in Python and loaded INGEST_BATCH_ROWS at a time: each
+batch is COPYed into a temporary staging table, events whose channel does not
+belong to their campaign are reported, and the rest go into the partitioned
+campaign_performance table with one INSERT ... SELECT. That single statement
+fires the rollup trigger from migration 8 once, so the hourly and daily
+rollups get one upsert per (campaign, channel, bucket) per batch rather than
+per event. Each batch is its own transaction.
+
+Monthly partitions are created on demand before a batch is loaded; old months
+can be dropped whole with drop_partitions_before() while the rollups keep
+their history.
+"""
+
+import csv
+import io
+import re
+import threading
+from datetime import date, datetime, timezone
+
+import psycopg2
+
+import backend
+
+INGEST_BATCH_ROWS = 50_000
+
+FIELDS = ("campaign_id", "channel_id", "emails_sent", "emails_opened", "clicks", "timestamp")
+
+_PARTITION_NAME = re.compile(r"^campaign_performance_(\d{4})_(\d{2})$")
+
+# Months whose partition this process has already ensured
+_known_months = set()
+_known_months_lock = threading.Lock()
+
+# --- Validation ---
+def _count(value, field):
+    try:
+        count = int(value if value not in (None, "") else 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer, got {value!r}")
+    if count < 0:
+        raise ValueError(f"{field} must not be negative, got {count}")
+    return count
+
+def _timestamp(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"timestamp must be ISO 8601, got {value!r}")
+    if not isinstance(value, datetime):
+        raise ValueError(f"timestamp must be a datetime, got {value!r}")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _event(raw):
+    """Normalises one event to a tuple in FIELDS order with a UTC timestamp."""
+    if isinstance(raw, dict):
+        raw = tuple(raw.get(field) for field in FIELDS)
+    if len(raw) != len(FIELDS):
+        raise ValueError(f"expected {len(FIELDS)} fields ({', '.join(FIELDS)}), got {len(raw)}")
+    campaign_id, channel_id, sent, opened, clicks, timestamp = raw
+    try:
+        campaign_id, channel_id = int(campaign_id), int(channel_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"campaign_id and channel_id must be integers, got {campaign_id!r}, {channel_id!r}")
+    return (campaign_id, channel_id, _count(sent, "emails_sent"), _count(opened, "emails_opened"),
+            _count(clicks, "clicks"), _timestamp(timestamp))
+
+def _batches(events, size, errors):
+    """Yields lists of (position, *event) tuples; invalid events are recorded in `errors` instead."""
+    batch = []
+    for position, raw in enumerate(events, start=1):
+        try:
+            batch.append((position,) + _event(raw))
+        except ValueError as e:
+            errors.append((position, str(e)))
+            continue
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# --- Partitions ---
+def _ensure_partitions(cur, batch):
+    months = {date(row[6].year, row[6].month, 1) for row in batch}
+    with _known_months_lock:
+        missing = sorted(months - _known_months)
+    for month in missing:
+        cur.execute("SELECT pms_ensure_campaign_partition(%s);", (month,))
+    return missing
+
+def drop_partitions_before(month: date):
+    """
+    Drops the raw event partitions of every month before `month` (rollups are
+    kept). Returns the names of the dropped partitions, or None on error.
+    """
+    cutoff = (month.year, month.month)
+    dropped = []
+    with backend.db_connection() as conn:
+        if not conn: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'campaign_performance'::regclass
+                    ORDER BY c.relname;
+                """)
+                for (name,) in cur.fetchall():
+                    match = _PARTITION_NAME.match(name)
+                    if match and (int(match.group(1)), int(match.group(2))) < cutoff:
+                        cur.execute(f'ALTER TABLE campaign_performance DETACH PARTITION "{name}";')
+                        cur.execute(f'DROP TABLE "{name}";')
+                        dropped.append(name)
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Error dropping campaign partitions: {e}")
+            return None
+    with _known_months_lock:
+        _known_months.difference_update(m for m in list(_known_months) if (m.year, m.month) < cutoff)
+    return dropped
+
+# --- Ingestion ---
+_STAGE_SQL = """
+    CREATE TEMP TABLE campaign_staging (
+        event_no BIGINT, campaign_id INTEGER, channel_id INTEGER,
+        emails_sent INTEGER, emails_opened INTEGER, clicks INTEGER, "timestamp" TIMESTAMPTZ
+    ) ON COMMIT DROP;
+"""
+_REJECTED_SQL = """
+    SELECT s.event_no, 'channel ' || s.channel_id || ' does not belong to campaign ' || s.campaign_id
+    FROM campaign_staging s
+    WHERE NOT EXISTS (SELECT 1 FROM channels ch WHERE ch.channel_id = s.channel_id AND ch.campaign_id = s.campaign_id)
+    ORDER BY s.event_no;
+"""
+_INSERT_SQL = """
+    INSERT INTO campaign_performance (campaign_id, channel_id, emails_sent, emails_opened, clicks, "timestamp")
+    SELECT s.campaign_id, s.channel_id, s.emails_sent, s.emails_opened, s.clicks, s."timestamp"
+    FROM campaign_staging s
+    JOIN channels ch ON ch.channel_id = s.channel_id AND ch.campaign_id = s.campaign_id;
+"""
+
+def ingest_events(events, batch_rows: int = INGEST_BATCH_ROWS):
+    """
+    Loads an iterable of events (see the module docstring) in batches. Returns
+    {"inserted": int, "errors": [(position, message), ...]} where position is
+    the event's 1-based place in `events`; events listed in errors were skipped.
+    """
+    result = {"inserted": 0, "errors": []}
+    with backend.db_connection() as conn:
+        if not conn:
+            result["errors"].append((None, "could not connect to the database"))
+            return result
+        for batch in _batches(events, batch_rows, result["errors"]):
+            buf = io.StringIO()
+            csv.writer(buf).writerows((*row[:6], row[6].isoformat()) for row in batch)
+            buf.seek(0)
+            cur = conn.cursor()
+            try:
+                # Committed on its own so the parent table's lock is not held for the whole batch
+                created = _ensure_partitions(cur, batch)
+                conn.commit()
+                with _known_months_lock:
+                    _known_months.update(created)
+                cur.execute(_STAGE_SQL)
+                cur.copy_expert("COPY campaign_staging FROM STDIN WITH (FORMAT csv)", buf)
+                cur.execute(_REJECTED_SQL)
+                rejected = cur.fetchall()
+                cur.execute(_INSERT_SQL)
+                inserted = cur.rowcount
+                conn.commit()
+                result["inserted"] += inserted
+                result["errors"].extend(rejected)
+            except (Exception, psycopg2.Error) as error:
+                conn.rollback()
+                first, last = batch[0][0], batch[-1][0]
+                result["errors"].append((first, f"events {first}-{last} rolled back: {error}"))
+            finally:
+                cur.close()
+    backend.invalidate_tags("campaigns")
+    result["errors"].sort(key=lambda e: (e[0] is None, e[0] or 0))
+    return result
+
+def ingest_csv(source, batch_rows: int = INGEST_BATCH_ROWS):
+    """
+    ingest_events over a CSV path or open text file with a header row naming
+    FIELDS. Raises ValueError before loading anything if a column is missing.
+    """
+    def load(f):
+        reader = csv.DictReader(f)
+        missing = [c for c in FIELDS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"campaign events are missing columns: {', '.join(missing)}")
+        return ingest_events(reader, batch_rows)
+
+    if isinstance(source, str):
+        with open(source, "r", newline="", encoding="utf-8") as f:
+            return load(f)
+    return load(source)
@@ -0,0 +1,265 @@
+# cli.py
+
+"""
+Command-line entry point for batch jobs. It uses the headless backend and
+never imports Streamlit.
+
+    python cli.py migrate
+    python cli.py report history --employee-id 12 --out history.csv
+    python cli.py export goals --manager-id 3 --out goals.tsv
+    python cli.py import goals goals.csv
+    python cli.py tasks set-status Approved --task-ids 10 11 12 --manager-id 3
+    python cli.py tasks set-status Approved --all-pending --manager-id 3 --employee-id 12
+    python cli.py cache warm
+    python cli.py org rebuild
+    python cli.py snapshot refresh [--full]
+    python cli.py search "quarterly review" --manager-id 3
+    python cli.py campaign ingest events.csv
+    python cli.py campaign prune --before 2024-01
+    python cli.py segment define "Lapsed Mumbai" --regions mumbai --not-purchased-within 90
+    python cli.py segment refresh [--full]
+    python cli.py segment audience --include 1 2 --exclude 3
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import backend
+import bulk_io
+import campaign_ingest
+import segments
+
+def _out(args):
+    return args.out if args.out else sys.stdout
+
+def cmd_migrate(args):
+    return 0 if backend.run_migrations() else 1
+
+def cmd_report_history(args):
+    return 0 if bulk_io.export_performance_history(args.employee_id, _out(args), args.format) else 1
+
+def cmd_export(args):
+    return 0 if bulk_io.export_table(args.table, _out(args), args.format, manager_id=args.manager_id, employee_id=args.employee_id) else 1
+
+def cmd_import(args):
+    try:
+        result = bulk_io.import_rows(args.table, args.path, args.format, args.chunk_rows)
+    except (ValueError, OSError) as e:
+        print(f"Cannot import {args.path}: {e}", file=sys.stderr)
+        return 1
+    for line_no, message in result["errors"]:
+        print(f"line {line_no}: {message}", file=sys.stderr)
+    print(f"Imported {result['inserted']} {args.table} row(s) with {len(result['errors'])} error(s).")
+    return 0 if not result["errors"] else 2
+
+def cmd_set_task_status(args):
+    if args.all_pending:
+        if args.manager_id is None:
+            print("--all-pending requires --manager-id", file=sys.stderr)
+            return 1
+        task_ids = backend.get_pending_task_ids(args.manager_id, employee_id=args.employee_id, goal_id=args.goal_id)
+    else:
+        task_ids = args.task_ids or []
+    expected = 'Pending Approval' if args.only_pending or args.all_pending else None
+    results = backend.update_task_statuses(task_ids, args.status, manager_id=args.manager_id, expected_status=expected)
+    failed = [task_id for task_id, ok in results.items() if not ok]
+    print(f"Set {len(results) - len(failed)} task(s) to {args.status}.")
+    if failed:
+        print(f"Not updated: {' '.join(str(t) for t in failed)}", file=sys.stderr)
+        return 2
+    return 0
+
+def cmd_cache_warm(args):
+    started = time.perf_counter()
+    warmed = backend.warm_cache(args.manager_ids, args.employee_ids)
+    print(f"Warmed dashboard reads for {warmed} user(s) in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+def cmd_snapshot_refresh(args):
+    # pyarrow is only needed for snapshots, so it is imported here
+    import snapshots
+    started = time.perf_counter()
+    summary = snapshots.refresh(full=args.full, directory=args.dir)
+    if summary is None:
+        return 1
+    print(f"Refreshed {len(summary)} snapshot(s) in {args.dir} in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+def cmd_search(args):
+    after = None
+    for _ in range(args.pages):
+        rows, after = backend.search(args.text, manager_id=args.manager_id, employee_id=args.employee_id, after=after, page_size=args.page_size, as_records=True)
+        for hit in rows:
+            print(f"{hit.rank:.3f}\t{hit.kind}\t{hit.item_id}\tgoal {hit.goal_id}\t{hit.employee_name}\t{hit.snippet}")
+        if after is None:
+            break
+    return 0
+
+def cmd_org_rebuild(args):
+    return 0 if backend.rebuild_org_rollups() else 1
+
+def cmd_campaign_ingest(args):
+    started = time.perf_counter()
+    try:
+        result = campaign_ingest.ingest_csv(args.path, args.batch_rows)
+    except (ValueError, OSError) as e:
+        print(f"Cannot ingest {args.path}: {e}", file=sys.stderr)
+        return 1
+    for position, message in result["errors"]:
+        print(f"event {position}: {message}", file=sys.stderr)
+    print(f"Ingested {result['inserted']} event(s) with {len(result['errors'])} error(s) in {time.perf_counter() - started:.2f}s.")
+    return 0 if not result["errors"] else 2
+
+def cmd_campaign_prune(args):
+    dropped = campaign_ingest.drop_partitions_before(args.before)
+    if dropped is None:
+        return 1
+    print(f"Dropped {len(dropped)} partition(s): {' '.join(dropped) or '-'}")
+    return 0
+
+def cmd_segment_define(args):
+    segment_id = segments.define_segment(args.name, args.description, args.regions, args.active,
+                                         args.purchased_within, args.not_purchased_within)
+    if segment_id is None:
+        return 1
+    print(f"Segment {segment_id} defined; run `segment refresh` to compute its members.")
+    return 0
+
+def cmd_segment_refresh(args):
+    started = time.perf_counter()
+    summary = segments.refresh(full=args.full)
+    if summary is None:
+        return 1
+    print(f"Refreshed {summary['segments']} segment(s) ({summary['rebuilt']} in full, {summary['candidates']} customer(s) revisited): "
+          f"+{summary['added']} -{summary['removed']} members in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+def cmd_segment_sizes(args):
+    for segment in segments.get_segments(as_records=True):
+        print(f"{segment.segment_id}\t{segment.members}\t{segment.segment_name}")
+    return 0
+
+def cmd_segment_audience(args):
+    print(segments.audience_size(args.include, args.exclude or (), "any" if args.any else "all"))
+    return 0
+
+def _month(value):
+    try:
+        return date.fromisoformat(value + "-01")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pms", description="Performance Management System batch tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate.set_defaults(func=cmd_migrate)
+
+    report = commands.add_parser("report", help="generate reports")
+    reports = report.add_subparsers(dest="report", required=True)
+    history = reports.add_parser("history", help="performance history for one employee")
+    history.add_argument("--employee-id", type=int, required=True)
+    history.add_argument("--out", help="output path (default: stdout)")
+    history.add_argument("--format", choices=sorted(bulk_io.DELIMITERS))
+    history.set_defaults(func=cmd_report_history)
+
+    export = commands.add_parser("export", help="stream a table to CSV/TSV")
+    export.add_argument("table", choices=sorted(bulk_io.EXPORT_QUERIES))
+    export.add_argument("--manager-id", type=int)
+    export.add_argument("--employee-id", type=int)
+    export.add_argument("--out", help="output path (default: stdout)")
+    export.add_argument("--format", choices=sorted(bulk_io.DELIMITERS))
+    export.set_defaults(func=cmd_export)
+
+    load = commands.add_parser("import", help="bulk-load a CSV/TSV file")
+    load.add_argument("table", choices=sorted(bulk_io.IMPORT_SPECS))
+    load.add_argument("path")
+    load.add_argument("--format", choices=sorted(bulk_io.DELIMITERS))
+    load.add_argument("--chunk-rows", type=int, default=bulk_io.CHUNK_ROWS)
+    load.set_defaults(func=cmd_import)
+
+    tasks = commands.add_parser("tasks", help="bulk task operations")
+    task_commands = tasks.add_subparsers(dest="tasks_command", required=True)
+    set_status = task_commands.add_parser("set-status", help="set the status of many tasks in one transaction")
+    set_status.add_argument("status", choices=bulk_io.TASK_STATUSES)
+    target = set_status.add_mutually_exclusive_group(required=True)
+    target.add_argument("--task-ids", type=int, nargs="+")
+    target.add_argument("--all-pending", action="store_true", help="every pending task of --manager-id (optionally one employee or goal)")
+    set_status.add_argument("--manager-id", type=int)
+    set_status.add_argument("--employee-id", type=int)
+    set_status.add_argument("--goal-id", type=int)
+    set_status.add_argument("--only-pending", action="store_true", help="skip tasks that are no longer pending approval")
+    set_status.set_defaults(func=cmd_set_task_status)
+
+    cache = commands.add_parser("cache", help="read cache maintenance")
+    cache_commands = cache.add_subparsers(dest="cache_command", required=True)
+    warm = cache_commands.add_parser("warm", help="run the dashboard reads to prime the caches")
+    warm.add_argument("--manager-ids", type=int, nargs="+")
+    warm.add_argument("--employee-ids", type=int, nargs="+")
+    warm.set_defaults(func=cmd_cache_warm)
+
+    org = commands.add_parser("org", help="org hierarchy maintenance")
+    org_commands = org.add_subparsers(dest="org_command", required=True)
+    rebuild = org_commands.add_parser("rebuild", help="recompute the hierarchy closure table and manager rollups")
+    rebuild.set_defaults(func=cmd_org_rebuild)
+
+    snapshot = commands.add_parser("snapshot", help="columnar analytics snapshots")
+    snapshot_commands = snapshot.add_subparsers(dest="snapshot_command", required=True)
+    refresh = snapshot_commands.add_parser("refresh", help="bring the Arrow snapshots up to date (incremental by updated_at)")
+    refresh.add_argument("--full", action="store_true", help="rebuild from scratch instead of applying changes")
+    refresh.add_argument("--dir", default=os.environ.get("PMS_SNAPSHOT_DIR", "snapshots"))
+    refresh.set_defaults(func=cmd_snapshot_refresh)
+
+    search = commands.add_parser("search", help="full-text search over goals, tasks and feedback")
+    search.add_argument("text")
+    search.add_argument("--manager-id", type=int)
+    search.add_argument("--employee-id", type=int)
+    search.add_argument("--page-size", type=int, default=20)
+    search.add_argument("--pages", type=int, default=1)
+    search.set_defaults(func=cmd_search)
+
+    campaign = commands.add_parser("campaign", help="campaign performance events")
+    campaign_commands = campaign.add_subparsers(dest="campaign_command", required=True)
+    ingest = campaign_commands.add_parser("ingest", help="bulk-load performance events from CSV (updates the rollups)")
+    ingest.add_argument("path", help="CSV with columns " + ", ".join(campaign_ingest.FIELDS))
+    ingest.add_argument("--batch-rows", type=int, default=campaign_ingest.INGEST_BATCH_ROWS)
+    ingest.set_defaults(func=cmd_campaign_ingest)
+    prune = campaign_commands.add_parser("prune", help="drop raw event partitions of old months (rollups are kept)")
+    prune.add_argument("--before", type=_month, required=True, help="first month to keep, YYYY-MM")
+    prune.set_defaults(func=cmd_campaign_prune)
+
+    segment = commands.add_parser("segment", help="rule-based customer segments")
+    segment_commands = segment.add_subparsers(dest="segment_command", required=True)
+    define = segment_commands.add_parser("define", help="create or change a segment's rule (omitted conditions match everyone)")
+    define.add_argument("name")
+    define.add_argument("--description")
+    define.add_argument("--regions", nargs="+")
+    active = define.add_mutually_exclusive_group()
+    active.add_argument("--active", dest="active", action="store_true")
+    active.add_argument("--inactive", dest="active", action="store_false")
+    define.add_argument("--purchased-within", type=int, metavar="DAYS", help="last purchase within DAYS days")
+    define.add_argument("--not-purchased-within", type=int, metavar="DAYS", help="no purchase in the last DAYS days (or never)")
+    define.set_defaults(func=cmd_segment_define, active=None)
+    seg_refresh = segment_commands.add_parser("refresh", help="recompute membership (incremental unless --full)")
+    seg_refresh.add_argument("--full", action="store_true")
+    seg_refresh.set_defaults(func=cmd_segment_refresh)
+    sizes = segment_commands.add_parser("sizes", help="member count per segment")
+    sizes.set_defaults(func=cmd_segment_sizes)
+    audience = segment_commands.add_parser("audience", help="count customers in the given segments (requires numpy)")
+    audience.add_argument("--include", type=int, nargs="+", required=True)
+    audience.add_argument("--exclude", type=int, nargs="+")
+    audience.add_argument("--any", action="store_true", help="in any included segment instead of all of them")
+    audience.set_defaults(func=cmd_segment_audience)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
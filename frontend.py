@@ -2,15 +2,108 @@
 
 import streamlit as st
 import backend as db
-from datetime import date
-import pandas as pd
-import plotly.express as px
+import os
+import query_trace
+import time
+import write_behind
+import uuid
+from datetime import date, datetime, timezone
+from functools import partial
 
 st.set_page_config(page_title="Performance Management System", layout="wide")
 st.title("🤝 Performance Management System")
 
-# Ensure tables exist
-db.create_tables()
+# Apply pending schema migrations (runs once per process)
+db.run_migrations()
+if db.connection_error:
+    st.error(f"Error connecting to database: {db.connection_error}")
+else:
+    # Invalidates cached reads when any process writes (runs once per process)
+    db.start_change_listener()
+
+PAGE_SIZE = 25
+
+# Task logging, feedback and task reviews go through the group-committing write-behind
+# queue when PMS_WRITE_BEHIND=1 (worth it when many people write at once); same results either way.
+writes = write_behind if os.environ.get("PMS_WRITE_BEHIND") == "1" else db
+# Shown when a queued write was not acknowledged in time; retrying could save it twice
+UNCONFIRMED_MESSAGE = "Still saving. Refresh in a moment to check before trying again."
+
+# Hidden diagnostics: open the app with ?diagnostics=1 to trace this session's queries
+diagnostics = st.query_params.get("diagnostics") == "1"
+if diagnostics:
+    rerun_scope = uuid.uuid4().hex
+    query_trace.set_scope(rerun_scope)
+    rerun_started = time.perf_counter()
+
+def page_cursor(state_key):
+    """Returns the keyset cursor of the page currently shown for `state_key`."""
+    return st.session_state.setdefault(state_key, [None])[-1]
+
+def pager(state_key, next_cursor, total=None):
+    """Renders Previous/Next buttons that walk a stack of keyset cursors."""
+    cursors = st.session_state[state_key]
+    col_prev, col_page, col_next = st.columns(3)
+    with col_prev:
+        if len(cursors) > 1 and st.button("Previous page", key=f"{state_key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        pages = f" of {max(1, -(-total // PAGE_SIZE))}" if total is not None else ""
+        st.caption(f"Page {len(cursors)}{pages}")
+    with col_next:
+        if next_cursor is not None and st.button("Next page", key=f"{state_key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+REFRESH_SECONDS = 10
+
+def poll_changes(state_key, rerun_on_change):
+    """
+    Reads this user's change feed from their watermark. Rows already seen (the feed
+    overlaps between polls) are skipped; anything new is summarised in a toast and,
+    when rerun_on_change is set, the page is rerun to show it.
+    """
+    feed = st.session_state.setdefault(state_key, {'watermark': None, 'seen': {}})
+    scope = {'manager_id': st.session_state['user_id']} if st.session_state['selected_role'] == 'Manager' else {'employee_id': st.session_state['user_id']}
+    changes = db.get_changes_since(feed['watermark'], **scope)
+    if changes is None:
+        return
+    first_poll = feed['watermark'] is None
+    feed['watermark'] = changes['watermark']
+    new_rows = {}
+    for table, id_field in (('goals', 'goal_id'), ('tasks', 'task_id'), ('feedback', 'feedback_id')):
+        for row in changes[table]:
+            key = (table, getattr(row, id_field))
+            if feed['seen'].get(key) != row.updated_at:
+                feed['seen'][key] = row.updated_at
+                new_rows.setdefault(table, []).append(row)
+    # Forget rows the next poll can no longer return
+    feed['seen'] = {key: updated_at for key, updated_at in feed['seen'].items() if updated_at > changes['watermark']}
+    if first_poll or not (new_rows or not changes['complete']):
+        return
+    if not db.change_listener_running():
+        # Without push notifications the feed is what keeps the read cache fresh
+        if not changes['complete']:
+            db.clear_read_cache()
+        for rows in new_rows.values():
+            for row in rows:
+                db.invalidate(goal_id=row.goal_id, manager_id=row.manager_id, employee_id=row.employee_id)
+    if rerun_on_change:
+        st.session_state['change_toast'] = "Updated: " + ", ".join(f"{len(rows)} {table}" for table, rows in new_rows.items()) if new_rows else "Updated"
+        st.rerun()
+
+def watch_changes(state_key):
+    """Re-polls every REFRESH_SECONDS when Streamlit supports fragments, otherwise once per rerun."""
+    # The call made by the page run itself never reruns: that run is already showing fresh data
+    by_page = st.session_state.pop('changes_polled_by_page', False)
+    if by_page or db.change_generation() != st.session_state.get('seen_change_generation') or not db.change_listener_running():
+        st.session_state['seen_change_generation'] = db.change_generation()
+        poll_changes(state_key, rerun_on_change=not by_page)
+
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+if _fragment is not None:
+    watch_changes = _fragment(run_every=REFRESH_SECONDS)(watch_changes)
 
 # Simulate user authentication
 st.sidebar.header("User Selection")
@@ -18,17 +111,15 @@ roles = ['Manager', 'Employee']
 selected_role = st.sidebar.radio("Select your role:", roles)
 st.session_state['selected_role'] = selected_role
 
-if selected_role == 'Manager':
-    users_df = db.get_users_by_role('Manager')
-else:
-    users_df = db.get_users_by_role('Employee')
+# name -> user_id, built from lightweight records rather than a DataFrame
+user_ids = db.index_by(db.get_users_by_role(selected_role, as_records=True), 'name', 'user_id')
 
-if users_df.empty:
+if not user_ids:
     st.sidebar.warning("No users found. Please create some in your database.")
 else:
-    selected_user_name = st.sidebar.selectbox("Select your name:", users_df['name'])
+    selected_user_name = st.sidebar.selectbox("Select your name:", list(user_ids))
     if selected_user_name:
-        st.session_state['user_id'] = users_df[users_df['name'] == selected_user_name]['user_id'].iloc[0]
+        st.session_state['user_id'] = user_ids[selected_user_name]
         st.session_state['user_name'] = selected_user_name
 
 # Main app content based on role
@@ -36,50 +127,139 @@ if st.session_state.get('user_id'):
     st.sidebar.markdown("---")
     st.sidebar.info(f"Logged in as: **{st.session_state['user_name']}** ({st.session_state['selected_role']})")
 
-    # Use tabs for a cleaner UI
-    tab1, tab2 = st.tabs(["Dashboard", "Analytics"])
+    # --- Live Updates: rerun when someone else changes this user's goals, tasks or feedback ---
+    if st.session_state.get('change_toast'):
+        st.toast(st.session_state.pop('change_toast'))
+    st.session_state['changes_polled_by_page'] = True
+    watch_changes(f"changes_{st.session_state['selected_role']}_{st.session_state['user_id']}")
+
+    # --- Search (indexed full-text, limited to the goals this user can see) ---
+    search_text = st.sidebar.text_input("Search goals, tasks and feedback:", key="search_text").strip()
+    if search_text:
+        st.subheader(f"Search results for \"{search_text}\"")
+        search_key = f"search_cursors_{st.session_state['user_id']}_{search_text}"
+        search_scope = {'manager_id': st.session_state['user_id']} if st.session_state['selected_role'] == 'Manager' else {'employee_id': st.session_state['user_id']}
+        results, next_search_cursor = db.search(search_text, after=page_cursor(search_key), page_size=PAGE_SIZE, as_records=True, **search_scope)
+        if results:
+            for hit in results:
+                with st.container(border=True):
+                    st.caption(f"{hit.kind.capitalize()} #{hit.item_id} · {hit.employee_name} · Goal: {hit.goal_description}")
+                    st.markdown(hit.snippet)
+            pager(search_key, next_search_cursor)
+        else:
+            st.info("No matches.")
+        st.markdown("---")
+
+    # Only the selected view runs (st.tabs would execute and query both on every rerun)
+    views = ["Dashboard"] + (["Organization"] if st.session_state['selected_role'] == 'Manager' else []) + ["Analytics"] + (["Campaigns"] if st.session_state['selected_role'] == 'Manager' else []) + (["Diagnostics"] if diagnostics else [])
+    view = st.radio("View:", views, horizontal=True, label_visibility="collapsed", key="view")
 
-    with tab1:
+    if view == "Dashboard":
+        history_key = f"history_cursors_{st.session_state['user_id']}"
         if st.session_state['selected_role'] == 'Manager':
             st.header("Manager Dashboard")
             st.info("Set goals, review tasks, and provide feedback for your team.")
 
+            # Load every independent section of the dashboard in one concurrent round
+            pending_key = f"pending_cursors_{st.session_state['user_id']}"
+            goals_key = f"goal_cursors_{st.session_state['user_id']}"
+            dashboard = db.fetch_concurrently(
+                pending_count=(db.count_pending_tasks_for_manager, st.session_state['user_id']),
+                pending_page=partial(db.get_pending_tasks_for_manager_page, st.session_state['user_id'], page_cursor(pending_key), PAGE_SIZE, as_records=True),
+                employees=partial(db.get_users_by_role, 'Employee', as_records=True),
+                goals_total=(db.count_manager_goals, st.session_state['user_id']),
+                goals_page=partial(db.get_manager_goals_page, st.session_state['user_id'], page_cursor(goals_key), PAGE_SIZE, as_records=True),
+                history_page=(db.get_employee_performance_history_page, st.session_state['user_id'], page_cursor(history_key)),
+            )
+            history_df, next_history_cursor = dashboard['history_page']
+
             # --- Tasks Awaiting Review (NEW SECTION) ---
             st.subheader("Tasks Awaiting Your Approval")
-            pending_tasks_df = db.get_pending_tasks_for_manager(st.session_state['user_id'])
-            if not pending_tasks_df.empty:
-                st.warning(f"You have **{len(pending_tasks_df)}** tasks pending approval.")
-                for _, task_row in pending_tasks_df.iterrows():
+            pending_count = dashboard['pending_count']
+            if pending_count:
+                st.warning(f"You have **{pending_count}** tasks pending approval.")
+                pending_tasks, next_pending_cursor = dashboard['pending_page']
+
+                # --- Bulk Review: one UPDATE and one rerun for many tasks ---
+                with st.expander("Bulk review"):
+                    bulk_scope = st.radio("Apply to:", ["Selected tasks on this page", "All tasks for an employee", "All tasks for a goal"], horizontal=True, key="bulk_scope")
+                    bulk_task_ids, bulk_filter, bulk_count = None, {}, 0
+                    if bulk_scope == "Selected tasks on this page":
+                        task_labels = {f"#{row.task_id} {row.employee_name}: {row.task_description}": row.task_id for row in pending_tasks}
+                        bulk_task_ids = [task_labels[label] for label in st.multiselect("Tasks:", list(task_labels), key="bulk_tasks")]
+                        bulk_count = len(bulk_task_ids)
+                    else:
+                        # Grouped per goal, so this stays small however many tasks are pending
+                        pending_summary = db.get_pending_task_summary(st.session_state['user_id'], as_records=True)
+                        if bulk_scope == "All tasks for an employee":
+                            employee_counts = {}
+                            for row in pending_summary:
+                                employee_counts[(row.employee_id, row.employee_name)] = employee_counts.get((row.employee_id, row.employee_name), 0) + row.pending_count
+                            employee_labels = {f"{name} ({count})": (employee_id, count) for (employee_id, name), count in employee_counts.items()}
+                            employee_id, bulk_count = employee_labels[st.selectbox("Employee:", list(employee_labels), key="bulk_employee")]
+                            bulk_filter = {'employee_id': employee_id}
+                        else:
+                            goal_labels = {f"#{row.goal_id} {row.employee_name}: {row.goal_description} ({row.pending_count})": (row.goal_id, row.pending_count) for row in pending_summary}
+                            goal_id, bulk_count = goal_labels[st.selectbox("Goal:", list(goal_labels), key="bulk_goal")]
+                            bulk_filter = {'goal_id': goal_id}
+
+                    bulk_status = None
+                    col_bulk_approve, col_bulk_reject = st.columns(2)
+                    with col_bulk_approve:
+                        if st.button(f"Approve {bulk_count} task(s)", key="bulk_approve", disabled=not bulk_count):
+                            bulk_status = 'Approved'
+                    with col_bulk_reject:
+                        if st.button(f"Reject {bulk_count} task(s)", key="bulk_reject", disabled=not bulk_count):
+                            bulk_status = 'Rejected'
+                    if bulk_status:
+                        if bulk_task_ids is None:
+                            bulk_task_ids = db.get_pending_task_ids(st.session_state['user_id'], **bulk_filter)
+                        results = db.update_task_statuses(bulk_task_ids, bulk_status, manager_id=st.session_state['user_id'], expected_status='Pending Approval')
+                        failed = [task_id for task_id, ok in results.items() if not ok]
+                        if failed:
+                            st.error(f"{len(results) - len(failed)} task(s) updated; failed or already reviewed: {', '.join(f'#{t}' for t in failed)}")
+                        else:
+                            st.success(f"{len(results)} task(s) marked {bulk_status}!")
+                            st.rerun()
+
+                for task_row in pending_tasks:
                     with st.container(border=True):
-                        st.write(f"**Task:** {task_row['task_description']}")
-                        st.write(f"**Goal:** {task_row['goal_description']}")
-                        st.write(f"**Employee:** {task_row['employee_name']}")
+                        st.write(f"**Task:** {task_row.task_description}")
+                        st.write(f"**Goal:** {task_row.goal_description}")
+                        st.write(f"**Employee:** {task_row.employee_name}")
                         col_approve, col_reject = st.columns(2)
                         with col_approve:
-                            if st.button("Approve", key=f"approve_{task_row['task_id']}"):
-                                if db.update_task_status(task_row['task_id'], 'Approved'):
+                            if st.button("Approve", key=f"approve_{task_row.task_id}"):
+                                result = writes.update_task_status(task_row.task_id, 'Approved')
+                                if result is write_behind.UNCONFIRMED:
+                                    st.warning(UNCONFIRMED_MESSAGE)
+                                elif result:
                                     st.success("Task approved!")
                                     st.rerun()
                                 else:
                                     st.error("Failed to approve task.")
                         with col_reject:
-                            if st.button("Reject", key=f"reject_{task_row['task_id']}"):
-                                if db.update_task_status(task_row['task_id'], 'Rejected'):
+                            if st.button("Reject", key=f"reject_{task_row.task_id}"):
+                                result = writes.update_task_status(task_row.task_id, 'Rejected')
+                                if result is write_behind.UNCONFIRMED:
+                                    st.warning(UNCONFIRMED_MESSAGE)
+                                elif result:
                                     st.success("Task rejected!")
                                     st.rerun()
                                 else:
                                     st.error("Failed to reject task.")
+                pager(pending_key, next_pending_cursor, pending_count)
             else:
                 st.info("No tasks are currently pending your approval.")
 
             st.markdown("---")
             # --- Goal Setting (CREATE) ---
             st.subheader("Set a New Goal")
-            employees_df = db.get_users_by_role('Employee')
-            if not employees_df.empty:
+            employee_ids = db.index_by(dashboard['employees'], 'name', 'user_id')
+            if employee_ids:
                 with st.form("new_goal_form"):
-                    employee_name = st.selectbox("Select Employee:", employees_df['name'])
-                    employee_id = employees_df[employees_df['name'] == employee_name]['user_id'].iloc[0]
+                    employee_name = st.selectbox("Select Employee:", list(employee_ids))
+                    employee_id = employee_ids[employee_name]
                     description = st.text_area("Goal Description:")
                     due_date = st.date_input("Due Date:", min_value=date.today())
                     submitted = st.form_submit_button("Set Goal")
@@ -96,24 +276,32 @@ if st.session_state.get('user_id'):
             st.markdown("---")
             # --- Goal & Task Management (READ & UPDATE) ---
             st.subheader("Review Team Goals & Tasks")
-            goals_df = db.get_manager_goals(st.session_state['user_id'])
-            if not goals_df.empty:
-                for _, goal_row in goals_df.iterrows():
-                    with st.expander(f"Goal for {goal_row['employee_name']}: {goal_row['goal_description']} (Due: {goal_row['due_date']})"):
-                        st.write(f"**Status:** {goal_row['status']}")
+            goals_total = dashboard['goals_total']
+            goals, next_goals_cursor = dashboard['goals_page']
+            if goals:
+                # Only goals whose details toggle is on get their tasks loaded, in one bulk query
+                open_goal_ids = [goal.goal_id for goal in goals if st.session_state.get(f"show_details_{goal.goal_id}")]
+                goal_details = db.get_goal_details(goal_ids=open_goal_ids) if open_goal_ids else {}
+                for goal_row in goals:
+                    with st.expander(f"Goal for {goal_row.employee_name}: {goal_row.goal_description} (Due: {goal_row.due_date})"):
+                        st.write(f"**Status:** {goal_row.status}")
                         
                         st.markdown("#### Tasks Logged")
-                        tasks_df = db.get_tasks_for_goal(goal_row['goal_id'])
-                        if not tasks_df.empty:
-                            st.dataframe(tasks_df, use_container_width=True)
-                        else:
-                            st.info("No tasks have been logged for this goal yet.")
+                        if st.toggle("Show tasks", key=f"show_details_{goal_row.goal_id}"):
+                            tasks_df = goal_details[goal_row.goal_id]['tasks']
+                            if not tasks_df.empty:
+                                st.dataframe(tasks_df, use_container_width=True)
+                            else:
+                                st.info("No tasks have been logged for this goal yet.")
 
                         # --- Feedback (CREATE) ---
                         st.markdown("#### Provide Feedback")
-                        feedback_text = st.text_area("Your feedback:", key=f"feedback_{goal_row['goal_id']}")
-                        if st.button("Submit Feedback", key=f"submit_feedback_{goal_row['goal_id']}"):
-                            if db.create_feedback(goal_row['goal_id'], st.session_state['user_id'], feedback_text):
+                        feedback_text = st.text_area("Your feedback:", key=f"feedback_{goal_row.goal_id}")
+                        if st.button("Submit Feedback", key=f"submit_feedback_{goal_row.goal_id}"):
+                            result = writes.create_feedback(goal_row.goal_id, st.session_state['user_id'], feedback_text)
+                            if result is write_behind.UNCONFIRMED:
+                                st.warning(UNCONFIRMED_MESSAGE)
+                            elif result:
                                 st.success("Feedback submitted successfully!")
                                 st.rerun()
                             else:
@@ -121,13 +309,14 @@ if st.session_state.get('user_id'):
 
                         # --- Goal Status Update (UPDATE) ---
                         st.markdown("#### Update Goal Status")
-                        new_status = st.selectbox("Update status:", ['Draft', 'In Progress', 'Completed', 'Cancelled'], index=['Draft', 'In Progress', 'Completed', 'Cancelled'].index(goal_row['status']), key=f"status_{goal_row['goal_id']}")
-                        if st.button("Update Status", key=f"update_status_{goal_row['goal_id']}"):
-                            if db.update_goal_status(goal_row['goal_id'], new_status):
+                        new_status = st.selectbox("Update status:", ['Draft', 'In Progress', 'Completed', 'Cancelled'], index=['Draft', 'In Progress', 'Completed', 'Cancelled'].index(goal_row.status), key=f"status_{goal_row.goal_id}")
+                        if st.button("Update Status", key=f"update_status_{goal_row.goal_id}"):
+                            if db.update_goal_status(goal_row.goal_id, new_status):
                                 st.success(f"Goal status updated to '{new_status}'!")
                                 st.rerun()
                             else:
                                 st.error("Failed to update status.")
+                pager(goals_key, next_goals_cursor, goals_total)
             else:
                 st.info("You have not set any goals for your team yet.")
 
@@ -137,19 +326,29 @@ if st.session_state.get('user_id'):
 
             # --- View Goals & Log Tasks (READ & CREATE) ---
             st.subheader("My Current Goals")
-            goals_df = db.get_employee_goals(st.session_state['user_id'])
-            if not goals_df.empty:
-                for _, goal_row in goals_df.iterrows():
-                    with st.expander(f"Goal: {goal_row['description']} (Due: {goal_row['due_date']})"):
-                        st.write(f"**Status:** {goal_row['status']}")
-                        st.write(f"**Assigned By:** {goal_row['manager_name']}")
+            dashboard = db.fetch_concurrently(
+                goals=partial(db.get_employee_goals, st.session_state['user_id'], as_records=True),
+                goal_details=partial(db.get_goal_details, employee_id=st.session_state['user_id']),
+                history_page=(db.get_employee_performance_history_page, st.session_state['user_id'], page_cursor(history_key)),
+            )
+            history_df, next_history_cursor = dashboard['history_page']
+            goals = dashboard['goals']
+            if goals:
+                goal_details = dashboard['goal_details']
+                for goal_row in goals:
+                    with st.expander(f"Goal: {goal_row.description} (Due: {goal_row.due_date})"):
+                        st.write(f"**Status:** {goal_row.status}")
+                        st.write(f"**Assigned By:** {goal_row.manager_name}")
 
                         # --- Log Tasks (CREATE) ---
                         st.markdown("##### Log a New Task")
-                        task_description = st.text_input("Task you completed:", key=f"task_desc_{goal_row['goal_id']}")
-                        if st.button("Log Task", key=f"log_task_{goal_row['goal_id']}"):
+                        task_description = st.text_input("Task you completed:", key=f"task_desc_{goal_row.goal_id}")
+                        if st.button("Log Task", key=f"log_task_{goal_row.goal_id}"):
                             if task_description:
-                                if db.create_task(goal_row['goal_id'], task_description):
+                                result = writes.create_task(goal_row.goal_id, task_description)
+                                if result is write_behind.UNCONFIRMED:
+                                    st.warning(UNCONFIRMED_MESSAGE)
+                                elif result:
                                     st.success("Task logged successfully! Waiting for manager approval.")
                                     st.rerun()
                                 else:
@@ -159,7 +358,7 @@ if st.session_state.get('user_id'):
 
                         # --- View Tasks (READ) ---
                         st.markdown("##### My Tasks")
-                        tasks_df = db.get_tasks_for_goal(goal_row['goal_id'])
+                        tasks_df = goal_details[goal_row.goal_id]['tasks']
                         if not tasks_df.empty:
                             st.dataframe(tasks_df, use_container_width=True)
                         else:
@@ -167,11 +366,11 @@ if st.session_state.get('user_id'):
                         
                         # --- View Feedback (READ) ---
                         st.markdown("##### Manager Feedback")
-                        feedback_df = db.get_feedback_for_goal(goal_row['goal_id'])
+                        feedback_df = goal_details[goal_row.goal_id]['feedback']
                         if not feedback_df.empty:
-                            for _, feedback_row in feedback_df.iterrows():
-                                st.write(f"**{feedback_row['manager_name']}** on {feedback_row['created_at'].strftime('%Y-%m-%d')}:")
-                                st.info(feedback_row['feedback_text'])
+                            for feedback_row in feedback_df.itertuples(index=False):
+                                st.write(f"**{feedback_row.manager_name}** on {feedback_row.created_at.strftime('%Y-%m-%d')}:")
+                                st.info(feedback_row.feedback_text)
                         else:
                             st.info("No feedback has been provided for this goal yet.")
             else:
@@ -181,37 +380,92 @@ if st.session_state.get('user_id'):
         st.markdown("---")
         st.header("Performance History Report")
         st.info("View your comprehensive performance history including all goals, tasks, and feedback.")
-        history_df = db.get_employee_performance_history(st.session_state['user_id'])
         if not history_df.empty:
             st.dataframe(history_df, use_container_width=True)
+            pager(history_key, next_history_cursor)
         else:
             st.warning("No performance history found.")
 
+    # --- ORGANIZATION (skip-level view over the manager's whole subtree) ---
+    elif view == "Organization":
+        st.header("My Organization")
+        st.info("Goals, approvals and completion across everyone who reports to you, directly or indirectly.")
+
+        org_pending_key = f"org_pending_cursors_{st.session_state['user_id']}"
+        org_goals_key = f"org_goal_cursors_{st.session_state['user_id']}"
+        org = db.fetch_concurrently(
+            size=(db.get_subtree_size, st.session_state['user_id']),
+            rollup=partial(db.get_subtree_rollup, st.session_state['user_id'], as_records=True),
+            reports=partial(db.get_direct_report_rollups, st.session_state['user_id'], as_records=True),
+            pending_page=partial(db.get_subtree_pending_tasks_page, st.session_state['user_id'], page_cursor(org_pending_key), PAGE_SIZE, as_records=True),
+            goals_page=partial(db.get_subtree_goals_page, st.session_state['user_id'], page_cursor(org_goals_key), PAGE_SIZE, as_records=True),
+        )
+
+        # --- Subtree Summary Metrics ---
+        if org['rollup']:
+            rollup = org['rollup'][0]
+            col_1, col_2, col_3, col_4 = st.columns(4)
+            with col_1:
+                st.metric(label="People in Organization", value=org['size'])
+            with col_2:
+                st.metric(label="Goals", value=rollup.goals_total)
+            with col_3:
+                st.metric(label="Completion Rate", value=f"{rollup.completion_rate or 0}%")
+            with col_4:
+                st.metric(label="Tasks Pending Approval", value=rollup.tasks_pending)
+
+        # --- Per Direct Report ---
+        if org['reports']:
+            st.subheader("By Direct Report")
+            st.dataframe([row._asdict() for row in org['reports']], use_container_width=True)
+
+        # --- Pending Approvals Across the Organization ---
+        st.subheader("Tasks Awaiting Approval Across Your Organization")
+        org_pending, next_org_pending_cursor = org['pending_page']
+        if org_pending:
+            st.dataframe([row._asdict() for row in org_pending], use_container_width=True)
+            pager(org_pending_key, next_org_pending_cursor, org['rollup'][0].tasks_pending if org['rollup'] else None)
+        else:
+            st.info("No tasks are pending approval in your organization.")
+
+        # --- Goals Across the Organization ---
+        st.subheader("Goals Across Your Organization")
+        org_goals, next_org_goals_cursor = org['goals_page']
+        if org_goals:
+            st.dataframe([row._asdict() for row in org_goals], use_container_width=True)
+            pager(org_goals_key, next_org_goals_cursor, org['rollup'][0].goals_total if org['rollup'] else None)
+        else:
+            st.info("No goals have been set in your organization yet.")
+
     # --- NEW ANALYTICS TAB ---
-    with tab2:
+    elif view == "Analytics":
+        # plotly is only needed here, so it is not imported for dashboard-only sessions
+        import plotly.express as px
+
         st.header("Analytics Dashboard")
         st.info("Analyze goal and task data to gain insights into team performance.")
 
-        # Cache data for the analytics section
-        @st.cache_data(ttl=300)
-        def get_all_goals():
-            return db.get_all_goals()
-
-        @st.cache_data(ttl=300)
-        def get_all_tasks():
-            return db.get_all_tasks()
+        # Optional scoping: a manager can narrow the numbers to their own team and a date range
+        analytics_manager_id = None
+        if st.session_state['selected_role'] == 'Manager' and st.checkbox("Only show my team", key="analytics_my_team"):
+            analytics_manager_id = int(st.session_state['user_id'])
+        date_range = st.date_input("Created between (optional):", value=(), key="analytics_date_range")
+        start_date = date_range[0] if len(date_range) > 0 else None
+        end_date = date_range[1] if len(date_range) > 1 else None
 
-        goals_df = get_all_goals()
-        tasks_df = get_all_tasks()
+        # Served from the backend read cache, which every write invalidates
+        goal_status_counts = db.get_goal_status_counts(analytics_manager_id, start_date, end_date)
+        task_status_counts = db.get_task_status_counts(analytics_manager_id, start_date, end_date)
 
-        if goals_df.empty:
+        if goal_status_counts.empty:
             st.warning("No goals found. Please set some goals to view analytics.")
         else:
             # --- Goal Summary Metrics ---
             st.subheader("Goal Summary")
-            total_goals = len(goals_df)
-            completed_goals = len(goals_df[goals_df['status'] == 'Completed'])
-            in_progress_goals = len(goals_df[goals_df['status'] == 'In Progress'])
+            goal_counts_by_status = dict(zip(goal_status_counts['status'], goal_status_counts['count']))
+            total_goals = int(goal_status_counts['count'].sum())
+            completed_goals = int(goal_counts_by_status.get('Completed', 0))
+            in_progress_goals = int(goal_counts_by_status.get('In Progress', 0))
 
             col_1, col_2, col_3 = st.columns(3)
             with col_1:
@@ -223,36 +477,197 @@ if st.session_state.get('user_id'):
 
             # --- Goal Status Distribution Pie Chart ---
             st.subheader("Goal Status Distribution")
-            status_counts = goals_df['status'].value_counts().reset_index()
-            status_counts.columns = ['status', 'count']
-            fig_pie = px.pie(status_counts, values='count', names='status', title="Distribution of Goals by Status")
+            fig_pie = px.pie(goal_status_counts, values='count', names='status', title="Distribution of Goals by Status")
             st.plotly_chart(fig_pie, use_container_width=True)
 
             # --- Goal Completion Rate Over Time Line Chart ---
             st.subheader("Goal Completion Over Time")
-            goals_df['created_at'] = pd.to_datetime(goals_df['created_at'])
-            goals_df['due_date'] = pd.to_datetime(goals_df['due_date'])
-            goals_df['month_year'] = goals_df['created_at'].dt.to_period('M')
-
-            # Aggregate data by month for plotting
-            monthly_goals = goals_df.groupby('month_year')['goal_id'].count().reset_index()
-            monthly_goals.columns = ['month_year', 'total_goals']
-            monthly_completed = goals_df[goals_df['status'] == 'Completed'].groupby('month_year')['goal_id'].count().reset_index()
-            monthly_completed.columns = ['month_year', 'completed_goals']
-            
-            # Merge and fill missing months
-            merged_df = pd.merge(monthly_goals, monthly_completed, on='month_year', how='left').fillna(0)
-            merged_df['month_year'] = merged_df['month_year'].astype(str)
-            fig_line = px.line(merged_df, x='month_year', y=['total_goals', 'completed_goals'], markers=True, title='Goal Trends Over Time')
+            monthly_df = db.get_monthly_goal_trends(analytics_manager_id, start_date, end_date)
+            fig_line = px.line(monthly_df, x='month_year', y=['total_goals', 'completed_goals'], markers=True, title='Goal Trends Over Time')
             st.plotly_chart(fig_line, use_container_width=True)
 
-        if tasks_df.empty:
+        if task_status_counts.empty:
             st.warning("No tasks found. Log some tasks to view analytics.")
         else:
             st.markdown("---")
             # --- Task Status Distribution Pie Chart ---
             st.subheader("Task Status Distribution")
-            task_status_counts = tasks_df['status'].value_counts().reset_index()
-            task_status_counts.columns = ['status', 'count']
             fig_task_pie = px.pie(task_status_counts, values='count', names='status', title="Distribution of Tasks by Status")
             st.plotly_chart(fig_task_pie, use_container_width=True)
+
+        # --- Snapshot Analytics (columnar snapshots, no OLTP queries) ---
+        st.markdown("---")
+        st.subheader("Deeper Analytics")
+        try:
+            import analytics
+            import snapshots
+        except ImportError:
+            analytics = None
+            st.info("Install pyarrow to enable snapshot analytics.")
+        if analytics is not None and snapshots.load("goals") is None:
+            st.info("No analytics snapshot yet. Run `python cli.py snapshot refresh` (e.g. from cron).")
+        elif analytics is not None:
+            snapshot_time = snapshots.watermark(snapshots.load("goals"))
+            # Whole minutes, so reruns within a minute reuse the memoised metrics
+            now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+            st.caption(f"From the snapshot taken {snapshot_time:%Y-%m-%d %H:%M} UTC; not affected by the date range above. "
+                       f"Overdue days, pending-task ages and the current cohort are measured as of now ({now:%Y-%m-%d %H:%M} UTC).")
+
+            # --- Overdue Goals ---
+            overdue_df = analytics.overdue_goals(analytics_manager_id, now.date())
+            col_1, col_2 = st.columns(2)
+            with col_1:
+                st.metric(label="Open Goals", value=int(overdue_df['open_goals'].sum()))
+            with col_2:
+                st.metric(label="Overdue Goals", value=int(overdue_df['overdue_goals'].sum()))
+            if not overdue_df.empty:
+                fig_overdue = px.bar(overdue_df.head(20), x='manager_name', y='overdue_goals', hover_data=['open_goals', 'overdue_rate', 'median_days_overdue'], title="Overdue Goals by Manager (top 20)")
+                st.plotly_chart(fig_overdue, use_container_width=True)
+
+            # --- Completion Time Distribution ---
+            completion_df = analytics.completion_times(analytics_manager_id)
+            summary = completion_df.attrs["summary"]
+            if summary["count"]:
+                st.write(f"**{summary['count']}** completed goals · median **{summary['p50']:.0f}** days · p90 **{summary['p90']:.0f}** days")
+                fig_completion = px.histogram(completion_df, x='days', nbins=50, title="Days from Goal Creation to Completion")
+                st.plotly_chart(fig_completion, use_container_width=True)
+
+            # --- Approval Latency per Manager ---
+            st.markdown("#### Task Approval Latency by Manager")
+            st.dataframe(analytics.approval_latency(analytics_manager_id, now), use_container_width=True)
+
+            # --- Cohort Completion ---
+            cohort_df = analytics.cohort_completion(analytics_manager_id, today=now.date())
+            if not cohort_df.empty:
+                month_columns = [c for c in cohort_df.columns if c.startswith('m')]
+                fig_cohort = px.imshow(cohort_df.set_index('cohort')[month_columns].tail(24), aspect='auto', labels=dict(x="Months after creation", y="Created in", color="% completed"), title="Cumulative Goal Completion by Creation Cohort")
+                st.plotly_chart(fig_cohort, use_container_width=True)
+
+    # --- CAMPAIGNS (served from the hourly/daily rollups only, never the raw events) ---
+    elif view == "Campaigns":
+        import plotly.express as px
+
+        st.header("Campaign Performance")
+        campaigns = db.get_campaigns(as_records=True)
+        if not campaigns:
+            st.info("No campaigns yet. Load performance events with `python cli.py campaign ingest events.csv`.")
+        else:
+            campaign_range = st.date_input("Between (UTC, optional):", value=(), key="campaign_date_range")
+            campaign_start = campaign_range[0] if len(campaign_range) > 0 else None
+            campaign_end = campaign_range[1] if len(campaign_range) > 1 else None
+
+            # --- All Campaigns ---
+            summary_df = db.get_campaign_summary(campaign_start, campaign_end)
+            if summary_df.empty:
+                st.warning("No campaign events in this range.")
+            else:
+                col_1, col_2, col_3 = st.columns(3)
+                total_sent = int(summary_df['emails_sent'].sum())
+                with col_1:
+                    st.metric(label="Emails Sent", value=f"{total_sent:,}")
+                with col_2:
+                    st.metric(label="Open Rate", value=f"{100.0 * summary_df['emails_opened'].sum() / total_sent:.1f}%" if total_sent else "-")
+                with col_3:
+                    st.metric(label="Click Rate", value=f"{100.0 * summary_df['clicks'].sum() / total_sent:.1f}%" if total_sent else "-")
+                st.dataframe(summary_df, use_container_width=True)
+
+            # --- One Campaign by Channel ---
+            campaign_names = {f"{c.campaign_name} (#{c.campaign_id})": c.campaign_id for c in campaigns}
+            campaign_id = campaign_names[st.selectbox("Campaign:", list(campaign_names), key="campaign_id")]
+            channels_df = db.get_channel_performance(campaign_id, campaign_start, campaign_end)
+            if channels_df.empty:
+                st.info("No events for this campaign in this range.")
+            else:
+                st.subheader("By Channel")
+                st.dataframe(channels_df, use_container_width=True)
+                series_df = db.get_campaign_timeseries(campaign_id, campaign_start, campaign_end)
+                rate = st.radio("Rate:", ['open_rate', 'click_rate', 'click_to_open_rate'], horizontal=True, key="campaign_rate")
+                fig_rate = px.line(series_df, x='bucket', y=rate, color='channel_name', markers=True, title=f"{rate.replace('_', ' ').title()} by Channel (%)")
+                st.plotly_chart(fig_rate, use_container_width=True)
+
+        # --- Audience Builder (customer segments; counts come from cached member arrays) ---
+        import segments
+        st.markdown("---")
+        st.subheader("Audience Builder")
+        segment_rows = segments.get_segments(as_records=True)
+        if not segment_rows:
+            st.info("No customer segments yet. Define one with `python cli.py segment define` and run `segment refresh`.")
+        else:
+            segment_ids = {f"{row.segment_name} ({row.members:,})": row.segment_id for row in segment_rows}
+            col_include, col_exclude = st.columns(2)
+            with col_include:
+                included = st.multiselect("Customers in:", list(segment_ids), key="audience_include")
+                match = st.radio("Match:", ["all", "any"], horizontal=True, key="audience_match")
+            with col_exclude:
+                excluded = st.multiselect("But not in:", list(segment_ids), key="audience_exclude")
+            if included:
+                st.metric(label="Audience Size", value=f"{segments.audience_size([segment_ids[s] for s in included], [segment_ids[s] for s in excluded], match):,}")
+                chosen = included + [s for s in excluded if s not in included]
+                if len(chosen) > 1:
+                    overlap_df = segments.overlap_matrix([segment_ids[s] for s in chosen])
+                    overlap_df.index = overlap_df.columns = chosen
+                    fig_overlap = px.imshow(overlap_df, text_auto=True, labels=dict(color="Shared customers"), title="Segment Overlap")
+                    st.plotly_chart(fig_overlap, use_container_width=True)
+
+    # --- DIAGNOSTICS (hidden unless ?diagnostics=1) ---
+    elif view == "Diagnostics":
+        st.header("Query Diagnostics")
+        tracer = query_trace.tracer
+        slow_ms = st.number_input("Slow query threshold (ms):", min_value=1.0, value=float(tracer.slow_query_ms), step=50.0)
+        tracer.configure(slow_query_ms=slow_ms)
+
+        # --- Last Rerun ---
+        st.subheader("Last Rerun")
+        last_rerun = st.session_state.get('last_rerun_trace')
+        if last_rerun:
+            records = last_rerun['records']
+            col_1, col_2, col_3, col_4 = st.columns(4)
+            with col_1:
+                st.metric(label=f"Queries ({last_rerun['view']})", value=len(records))
+            with col_2:
+                st.metric(label="Time in SQL (ms)", value=round(sum(r.duration_ms for r in records), 1))
+            with col_3:
+                st.metric(label="Connection wait (ms)", value=round(sum(r.acquire_ms for r in records), 1))
+            with col_4:
+                st.metric(label="Rerun wall time (ms)", value=round(last_rerun['elapsed_ms'], 1))
+            st.dataframe(tracer.summary(records), use_container_width=True)
+        else:
+            st.info("Switch to another view and back to see the queries of a rerun. Cached reads issue no queries.")
+
+        # --- Slow Query Log ---
+        st.subheader("Slow Queries")
+        slow_queries = tracer.slow_queries()
+        if slow_queries:
+            for entry in reversed(slow_queries[-20:]):
+                with st.expander(f"{entry.duration_ms:.1f} ms, {entry.rows} rows: {entry.fingerprint[:120]}"):
+                    st.code(entry.fingerprint, language="sql")
+                    st.caption(f"Parameters: {entry.params_shape} · thread {entry.thread} · #{entry.seq}")
+                    if entry.plan:
+                        st.code(entry.plan)
+                    elif st.button("EXPLAIN (ANALYZE, BUFFERS)", key=f"explain_{entry.seq}"):
+                        plan = db.explain_query(entry.sql, entry.params)
+                        if plan:
+                            tracer.attach_plan(entry.seq, plan)
+                            st.code(plan)
+                        else:
+                            st.error("Failed to explain query.")
+        else:
+            st.info(f"No queries slower than {tracer.slow_query_ms:.0f} ms yet.")
+
+        # --- Recent Queries ---
+        st.subheader("Recent Queries (all sessions)")
+        recent = tracer.records()[-200:]
+        st.caption(f"{tracer.total} statements since start; showing the last {len(recent)}.")
+        st.dataframe(
+            [{"seq": r.seq, "ms": r.duration_ms, "rows": r.rows, "acquire ms": r.acquire_ms, "params": r.params_shape, "thread": r.thread, "query": r.fingerprint} for r in reversed(recent)],
+            use_container_width=True,
+        )
+
+    if diagnostics and view != "Diagnostics":
+        # Kept for the Diagnostics view; includes queries run by fetch_concurrently's workers
+        st.session_state['last_rerun_trace'] = {
+            'view': view,
+            'elapsed_ms': (time.perf_counter() - rerun_started) * 1000,
+            'records': query_trace.tracer.records(scope=rerun_scope),
+        }
+        st.sidebar.caption(f"Diagnostics: {len(st.session_state['last_rerun_trace']['records'])} queries this rerun")
@@ -0,0 +1,586 @@
+# migrations.py
+
+"""
+Versioned schema migrations.
+
+Each entry in MIGRATIONS is applied once, in order, inside its own transaction
+and recorded in the schema_migrations table. Never edit a migration that has
+shipped; append a new one instead.
+"""
+
+# Arbitrary key for pg_advisory_lock so only one process migrates at a time.
+MIGRATION_LOCK_KEY = 724_311_001
+
+MIGRATIONS = [
+    (1, "create core tables", """
+        CREATE TABLE IF NOT EXISTS users (user_id SERIAL PRIMARY KEY, name VARCHAR(255) NOT NULL, role VARCHAR(50) NOT NULL, manager_id INTEGER REFERENCES users(user_id));
+        CREATE TABLE IF NOT EXISTS goals (goal_id SERIAL PRIMARY KEY, employee_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, manager_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, description TEXT NOT NULL, due_date DATE NOT NULL, status VARCHAR(50) NOT NULL DEFAULT 'Draft', created_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE TABLE IF NOT EXISTS tasks (task_id SERIAL PRIMARY KEY, goal_id INTEGER REFERENCES goals(goal_id) ON DELETE CASCADE, description TEXT NOT NULL, status VARCHAR(50) NOT NULL DEFAULT 'Pending Approval', created_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE TABLE IF NOT EXISTS feedback (feedback_id SERIAL PRIMARY KEY, goal_id INTEGER REFERENCES goals(goal_id) ON DELETE CASCADE, manager_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE, feedback_text TEXT NOT NULL, created_at TIMESTAMPTZ DEFAULT NOW());
+    """),
+    (2, "index dashboard filters", """
+        CREATE INDEX IF NOT EXISTS users_role_name_idx ON users (role, name);
+        CREATE INDEX IF NOT EXISTS goals_employee_due_idx ON goals (employee_id, due_date, goal_id);
+        CREATE INDEX IF NOT EXISTS goals_manager_due_idx ON goals (manager_id, due_date, goal_id);
+        CREATE INDEX IF NOT EXISTS tasks_goal_status_idx ON tasks (goal_id, status);
+        CREATE INDEX IF NOT EXISTS tasks_pending_approval_idx ON tasks (goal_id) WHERE status = 'Pending Approval';
+        CREATE INDEX IF NOT EXISTS feedback_goal_created_idx ON feedback (goal_id, created_at);
+    """),
+    (3, "index user names for bulk import lookups", """
+        CREATE INDEX IF NOT EXISTS users_name_idx ON users (name);
+    """),
+    (4, "track modifications and notify on writes", """
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+        ALTER TABLE feedback ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+        UPDATE goals SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+        UPDATE tasks SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+        UPDATE feedback SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+        ALTER TABLE goals ALTER COLUMN updated_at SET DEFAULT NOW(), ALTER COLUMN updated_at SET NOT NULL;
+        ALTER TABLE tasks ALTER COLUMN updated_at SET DEFAULT NOW(), ALTER COLUMN updated_at SET NOT NULL;
+        ALTER TABLE feedback ALTER COLUMN updated_at SET DEFAULT NOW(), ALTER COLUMN updated_at SET NOT NULL;
+        CREATE INDEX IF NOT EXISTS goals_updated_idx ON goals (updated_at);
+        CREATE INDEX IF NOT EXISTS tasks_updated_idx ON tasks (updated_at);
+        CREATE INDEX IF NOT EXISTS feedback_updated_idx ON feedback (updated_at);
+
+        CREATE OR REPLACE FUNCTION pms_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Statement-level, so a bulk write sends one notification per affected goal
+        -- (or a single 'bulk' one) instead of one per row.
+        CREATE OR REPLACE FUNCTION pms_notify_users() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- An UPDATE also names each goal's previous manager and employee, so a
+        -- reassigned goal leaves their cached reads as well as reaching the new owners'.
+        CREATE OR REPLACE FUNCTION pms_notify_goals() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                IF (SELECT count(*) FROM (SELECT goal_id, manager_id, employee_id FROM changed
+                                          UNION SELECT goal_id, manager_id, employee_id FROM previous) c) > 500 THEN
+                    PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'bulk', true)::text);
+                ELSE
+                    PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'goal_id', c.goal_id, 'manager_id', c.manager_id, 'employee_id', c.employee_id)::text)
+                    FROM (SELECT goal_id, manager_id, employee_id FROM changed
+                          UNION SELECT goal_id, manager_id, employee_id FROM previous) c;
+                END IF;
+            ELSIF (SELECT count(*) FROM changed) > 500 THEN
+                PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'bulk', true)::text);
+            ELSE
+                PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'goal_id', c.goal_id, 'manager_id', c.manager_id, 'employee_id', c.employee_id)::text)
+                FROM changed c;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION pms_notify_goal_children() RETURNS trigger AS $$
+        BEGIN
+            IF (SELECT count(DISTINCT goal_id) FROM changed) > 500 THEN
+                PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'bulk', true)::text);
+            ELSE
+                PERFORM pg_notify('pms_changes', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'goal_id', c.goal_id, 'manager_id', g.manager_id, 'employee_id', g.employee_id)::text)
+                FROM (SELECT DISTINCT goal_id FROM changed) c
+                LEFT JOIN goals g ON g.goal_id = c.goal_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """ + "".join(f"""
+        DROP TRIGGER IF EXISTS {table}_touch_updated_at ON {table};
+        CREATE TRIGGER {table}_touch_updated_at BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION pms_touch_updated_at();"""
+        for table in ("goals", "tasks", "feedback")
+    ) + "".join(f"""
+        DROP TRIGGER IF EXISTS {table}_notify_{op.lower()} ON {table};
+        CREATE TRIGGER {table}_notify_{op.lower()} AFTER {op} ON {table} REFERENCING {transitions} FOR EACH STATEMENT EXECUTE FUNCTION {function}();"""
+        for table, function, update in (
+            ("users", "pms_notify_users", "NEW TABLE AS changed"),
+            ("goals", "pms_notify_goals", "OLD TABLE AS previous NEW TABLE AS changed"),
+            ("tasks", "pms_notify_goal_children", "NEW TABLE AS changed"),
+            ("feedback", "pms_notify_goal_children", "NEW TABLE AS changed"),
+        )
+        for op, transitions in (("INSERT", "NEW TABLE AS changed"), ("UPDATE", update), ("DELETE", "OLD TABLE AS changed"))
+    )),
+    # Stored generated columns rewrite each table once; searches then never re-parse text.
+    (5, "full-text search vectors", """
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', description)) STORED;
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', description)) STORED;
+        ALTER TABLE feedback ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', feedback_text)) STORED;
+        CREATE INDEX IF NOT EXISTS goals_search_idx ON goals USING GIN (search_vector);
+        CREATE INDEX IF NOT EXISTS tasks_search_idx ON tasks USING GIN (search_vector);
+        CREATE INDEX IF NOT EXISTS feedback_search_idx ON feedback USING GIN (search_vector);
+    """),
+    # user_hierarchy holds one row per (ancestor, descendant) pair, including each
+    # user with themself at depth 0, so "everyone under X" is a single index range.
+    # manager_rollups holds goal and task counters per goals.manager_id; a subtree's
+    # totals are the sum over its managers. Both are kept current by triggers and
+    # can be rebuilt from scratch with pms_rebuild_user_hierarchy() and
+    # pms_rebuild_manager_rollups().
+    (6, "org hierarchy closure table and manager rollups", """
+        CREATE INDEX IF NOT EXISTS users_manager_idx ON users (manager_id);
+        CREATE TABLE IF NOT EXISTS user_hierarchy (
+            ancestor_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            descendant_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        );
+        CREATE INDEX IF NOT EXISTS user_hierarchy_descendant_idx ON user_hierarchy (descendant_id, depth);
+        -- No foreign key: rows for deleted managers are harmless and must not block the cascade.
+        CREATE TABLE IF NOT EXISTS manager_rollups (
+            manager_id INTEGER PRIMARY KEY,
+            goals_total BIGINT NOT NULL DEFAULT 0,
+            goals_completed BIGINT NOT NULL DEFAULT 0,
+            goals_in_progress BIGINT NOT NULL DEFAULT 0,
+            tasks_total BIGINT NOT NULL DEFAULT 0,
+            tasks_pending BIGINT NOT NULL DEFAULT 0,
+            tasks_approved BIGINT NOT NULL DEFAULT 0
+        );
+
+        -- Closure rows for `user_ids`, found by walking up users.manager_id (cycles stop at depth 100).
+        CREATE OR REPLACE FUNCTION pms_insert_ancestry(user_ids INTEGER[]) RETURNS void AS $$
+            INSERT INTO user_hierarchy (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE up AS (
+                SELECT u.user_id AS descendant_id, u.user_id AS ancestor_id, u.manager_id, 0 AS depth
+                FROM users u WHERE u.user_id = ANY(user_ids)
+                UNION ALL
+                SELECT up.descendant_id, m.user_id, m.manager_id, up.depth + 1
+                FROM up JOIN users m ON m.user_id = up.manager_id
+                WHERE up.depth < 100
+            )
+            SELECT ancestor_id, descendant_id, min(depth) FROM up GROUP BY ancestor_id, descendant_id
+            ON CONFLICT DO NOTHING;
+        $$ LANGUAGE sql;
+
+        CREATE OR REPLACE FUNCTION pms_rebuild_user_hierarchy() RETURNS void AS $$
+            DELETE FROM user_hierarchy;
+            SELECT pms_insert_ancestry(array_agg(user_id)) FROM users;
+        $$ LANGUAGE sql;
+
+        CREATE OR REPLACE FUNCTION pms_hierarchy_users() RETURNS trigger AS $$
+        DECLARE
+            moved INTEGER[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM pms_insert_ancestry(array_agg(user_id)) FROM changed;
+            ELSE
+                -- Everyone under a user whose manager changed gets their ancestry rebuilt
+                SELECT array_agg(DISTINCT h.descendant_id) INTO moved
+                FROM changed n
+                JOIN previous o ON o.user_id = n.user_id
+                JOIN user_hierarchy h ON h.ancestor_id = n.user_id
+                WHERE n.manager_id IS DISTINCT FROM o.manager_id;
+                IF moved IS NOT NULL THEN
+                    DELETE FROM user_hierarchy WHERE descendant_id = ANY(moved);
+                    PERFORM pms_insert_ancestry(moved);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS users_hierarchy_insert ON users;
+        CREATE TRIGGER users_hierarchy_insert AFTER INSERT ON users REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION pms_hierarchy_users();
+        DROP TRIGGER IF EXISTS users_hierarchy_update ON users;
+        CREATE TRIGGER users_hierarchy_update AFTER UPDATE ON users REFERENCING OLD TABLE AS previous NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION pms_hierarchy_users();
+
+        CREATE OR REPLACE FUNCTION pms_rebuild_manager_rollups() RETURNS void AS $$
+            DELETE FROM manager_rollups;
+            INSERT INTO manager_rollups (manager_id, goals_total, goals_completed, goals_in_progress, tasks_total, tasks_pending, tasks_approved)
+            SELECT g.manager_id,
+                   count(*),
+                   count(*) FILTER (WHERE g.status = 'Completed'),
+                   count(*) FILTER (WHERE g.status = 'In Progress'),
+                   COALESCE(sum(t.total), 0),
+                   COALESCE(sum(t.pending), 0),
+                   COALESCE(sum(t.approved), 0)
+            FROM goals g
+            LEFT JOIN (
+                SELECT goal_id,
+                       count(*) AS total,
+                       count(*) FILTER (WHERE status = 'Pending Approval') AS pending,
+                       count(*) FILTER (WHERE status = 'Approved') AS approved
+                FROM tasks GROUP BY goal_id
+            ) t ON t.goal_id = g.goal_id
+            WHERE g.manager_id IS NOT NULL
+            GROUP BY g.manager_id;
+        $$ LANGUAGE sql;
+
+        -- Adds signed per-manager deltas: rows of (manager_id, goals, completed, in_progress, tasks, pending, approved).
+        CREATE OR REPLACE FUNCTION pms_apply_rollup_delta(delta JSONB) RETURNS void AS $$
+            INSERT INTO manager_rollups AS r (manager_id, goals_total, goals_completed, goals_in_progress, tasks_total, tasks_pending, tasks_approved)
+            SELECT d.manager_id, sum(d.goals), sum(d.completed), sum(d.in_progress), sum(d.tasks), sum(d.pending), sum(d.approved)
+            FROM jsonb_to_recordset(delta) AS d(manager_id INTEGER, goals BIGINT, completed BIGINT, in_progress BIGINT, tasks BIGINT, pending BIGINT, approved BIGINT)
+            WHERE d.manager_id IS NOT NULL
+            GROUP BY d.manager_id
+            HAVING sum(d.goals) <> 0 OR sum(d.completed) <> 0 OR sum(d.in_progress) <> 0 OR sum(d.tasks) <> 0 OR sum(d.pending) <> 0 OR sum(d.approved) <> 0
+            ON CONFLICT (manager_id) DO UPDATE SET
+                goals_total = r.goals_total + EXCLUDED.goals_total,
+                goals_completed = r.goals_completed + EXCLUDED.goals_completed,
+                goals_in_progress = r.goals_in_progress + EXCLUDED.goals_in_progress,
+                tasks_total = r.tasks_total + EXCLUDED.tasks_total,
+                tasks_pending = r.tasks_pending + EXCLUDED.tasks_pending,
+                tasks_approved = r.tasks_approved + EXCLUDED.tasks_approved;
+        $$ LANGUAGE sql;
+
+        CREATE OR REPLACE FUNCTION pms_rollup_goals() RETURNS trigger AS $$
+        DECLARE
+            delta JSONB := '[]';
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                delta := delta || COALESCE((
+                    SELECT jsonb_agg(jsonb_build_object('manager_id', manager_id, 'goals', n, 'completed', completed, 'in_progress', in_progress, 'tasks', 0, 'pending', 0, 'approved', 0))
+                    FROM (SELECT manager_id, count(*) AS n, count(*) FILTER (WHERE status = 'Completed') AS completed, count(*) FILTER (WHERE status = 'In Progress') AS in_progress
+                          FROM changed GROUP BY manager_id) c), '[]');
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                delta := delta || COALESCE((
+                    SELECT jsonb_agg(jsonb_build_object('manager_id', manager_id, 'goals', -n, 'completed', -completed, 'in_progress', -in_progress, 'tasks', 0, 'pending', 0, 'approved', 0))
+                    FROM (SELECT manager_id, count(*) AS n, count(*) FILTER (WHERE status = 'Completed') AS completed, count(*) FILTER (WHERE status = 'In Progress') AS in_progress
+                          FROM previous GROUP BY manager_id) c), '[]');
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                -- Tasks follow their goal to its new manager
+                delta := delta || COALESCE((
+                    SELECT jsonb_agg(x) FROM (
+                        SELECT jsonb_build_object('manager_id', m.manager_id, 'goals', 0, 'completed', 0, 'in_progress', 0,
+                                                  'tasks', m.sign * count(*),
+                                                  'pending', m.sign * count(*) FILTER (WHERE t.status = 'Pending Approval'),
+                                                  'approved', m.sign * count(*) FILTER (WHERE t.status = 'Approved')) AS x
+                        FROM (
+                            SELECT n.goal_id, n.manager_id, 1 AS sign FROM changed n JOIN previous o ON o.goal_id = n.goal_id WHERE n.manager_id IS DISTINCT FROM o.manager_id
+                            UNION ALL
+                            SELECT o.goal_id, o.manager_id, -1 FROM changed n JOIN previous o ON o.goal_id = n.goal_id WHERE n.manager_id IS DISTINCT FROM o.manager_id
+                        ) m
+                        JOIN tasks t ON t.goal_id = m.goal_id
+                        GROUP BY m.manager_id, m.sign
+                    ) moved), '[]');
+            END IF;
+            PERFORM pms_apply_rollup_delta(delta);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- A deleted goal takes its tasks with it (ON DELETE CASCADE). By the time the
+        -- tasks' own trigger runs the goal is gone, so their counts are removed here.
+        CREATE OR REPLACE FUNCTION pms_rollup_goal_delete_tasks() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pms_apply_rollup_delta(jsonb_build_array(jsonb_build_object(
+                'manager_id', OLD.manager_id, 'goals', 0, 'completed', 0, 'in_progress', 0,
+                'tasks', -count(*),
+                'pending', -count(*) FILTER (WHERE status = 'Pending Approval'),
+                'approved', -count(*) FILTER (WHERE status = 'Approved'))))
+            FROM tasks WHERE goal_id = OLD.goal_id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION pms_rollup_tasks() RETURNS trigger AS $$
+        DECLARE
+            delta JSONB := '[]';
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                delta := delta || COALESCE((
+                    SELECT jsonb_agg(jsonb_build_object('manager_id', g.manager_id, 'goals', 0, 'completed', 0, 'in_progress', 0,
+                                                        'tasks', c.n, 'pending', c.pending, 'approved', c.approved))
+                    FROM (SELECT goal_id, count(*) AS n, count(*) FILTER (WHERE status = 'Pending Approval') AS pending, count(*) FILTER (WHERE status = 'Approved') AS approved
+                          FROM changed GROUP BY goal_id) c
+                    JOIN goals g ON g.goal_id = c.goal_id), '[]');
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                delta := delta || COALESCE((
+                    SELECT jsonb_agg(jsonb_build_object('manager_id', g.manager_id, 'goals', 0, 'completed', 0, 'in_progress', 0,
+                                                        'tasks', -c.n, 'pending', -c.pending, 'approved', -c.approved))
+                    FROM (SELECT goal_id, count(*) AS n, count(*) FILTER (WHERE status = 'Pending Approval') AS pending, count(*) FILTER (WHERE status = 'Approved') AS approved
+                          FROM previous GROUP BY goal_id) c
+                    JOIN goals g ON g.goal_id = c.goal_id), '[]');
+            END IF;
+            PERFORM pms_apply_rollup_delta(delta);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS goals_rollup_delete_tasks ON goals;
+        CREATE TRIGGER goals_rollup_delete_tasks BEFORE DELETE ON goals FOR EACH ROW EXECUTE FUNCTION pms_rollup_goal_delete_tasks();
+    """ + "".join(f"""
+        DROP TRIGGER IF EXISTS {table}_rollup_{op.lower()} ON {table};
+        CREATE TRIGGER {table}_rollup_{op.lower()} AFTER {op} ON {table} REFERENCING {transitions} FOR EACH STATEMENT EXECUTE FUNCTION {function}();"""
+        for table, function in (("goals", "pms_rollup_goals"), ("tasks", "pms_rollup_tasks"))
+        for op, transitions in (("INSERT", "NEW TABLE AS changed"), ("UPDATE", "OLD TABLE AS previous NEW TABLE AS changed"), ("DELETE", "OLD TABLE AS previous"))
+    ) + """
+        SELECT pms_rebuild_user_hierarchy();
+        SELECT pms_rebuild_manager_rollups();
+    """),
+    # Lifecycle timestamps for analytics. Existing rows are backfilled from
+    # updated_at (the best available approximation) with triggers disabled, so the
+    # backfill does not bump updated_at or flood the change feed.
+    (7, "goal completion and task review timestamps", """
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS completed_at TIMESTAMPTZ;
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS reviewed_at TIMESTAMPTZ;
+        ALTER TABLE goals DISABLE TRIGGER USER;
+        UPDATE goals SET completed_at = updated_at WHERE status = 'Completed' AND completed_at IS NULL;
+        ALTER TABLE goals ENABLE TRIGGER USER;
+        ALTER TABLE tasks DISABLE TRIGGER USER;
+        UPDATE tasks SET reviewed_at = updated_at WHERE status <> 'Pending Approval' AND reviewed_at IS NULL;
+        ALTER TABLE tasks ENABLE TRIGGER USER;
+
+        CREATE OR REPLACE FUNCTION pms_track_goal_completion() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.status <> 'Completed' THEN
+                NEW.completed_at := NULL;
+            ELSIF TG_OP = 'INSERT' OR OLD.status <> 'Completed' THEN
+                NEW.completed_at := COALESCE(NEW.completed_at, NOW());
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION pms_track_task_review() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.status = 'Pending Approval' THEN
+                NEW.reviewed_at := NULL;
+            ELSIF TG_OP = 'INSERT' OR OLD.status = 'Pending Approval' THEN
+                NEW.reviewed_at := COALESCE(NEW.reviewed_at, NOW());
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS goals_track_completion ON goals;
+        CREATE TRIGGER goals_track_completion BEFORE INSERT OR UPDATE OF status ON goals FOR EACH ROW EXECUTE FUNCTION pms_track_goal_completion();
+        DROP TRIGGER IF EXISTS tasks_track_review ON tasks;
+        CREATE TRIGGER tasks_track_review BEFORE INSERT OR UPDATE OF status ON tasks FOR EACH ROW EXECUTE FUNCTION pms_track_task_review();
+    """),
+    # Campaign performance events are range-partitioned by month on "timestamp" so
+    # old months can be dropped whole, and every insert statement adds its rows to
+    # hourly and daily per-(campaign, channel) rollups, which are all the
+    # dashboards read. The raw table deliberately has no secondary indexes. A
+    # campaign_performance created from the old `db` script is renamed to
+    # campaign_performance_legacy and its rows copied across; rows with no
+    # campaign or channel stay behind there, so drop it only after checking them.
+    (8, "partitioned campaign performance with hourly and daily rollups", """
+        CREATE TABLE IF NOT EXISTS campaigns (campaign_id SERIAL PRIMARY KEY, campaign_name VARCHAR(255) NOT NULL, budget DECIMAL(10, 2), start_date DATE, end_date DATE, description TEXT);
+        CREATE TABLE IF NOT EXISTS channels (channel_id SERIAL PRIMARY KEY, campaign_id INTEGER REFERENCES campaigns(campaign_id) ON DELETE CASCADE, channel_name VARCHAR(255) NOT NULL, UNIQUE (campaign_id, channel_name));
+
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('campaign_performance') AND relkind = 'r') THEN
+                ALTER TABLE campaign_performance RENAME TO campaign_performance_legacy;
+                ALTER TABLE campaign_performance_legacy RENAME CONSTRAINT campaign_performance_pkey TO campaign_performance_legacy_pkey;
+                ALTER SEQUENCE IF EXISTS campaign_performance_performance_id_seq RENAME TO campaign_performance_legacy_performance_id_seq;
+            END IF;
+        END;
+        $$;
+
+        CREATE TABLE IF NOT EXISTS campaign_performance (
+            performance_id BIGSERIAL,
+            campaign_id INTEGER NOT NULL REFERENCES campaigns(campaign_id) ON DELETE CASCADE,
+            channel_id INTEGER NOT NULL REFERENCES channels(channel_id) ON DELETE CASCADE,
+            emails_sent INTEGER NOT NULL DEFAULT 0,
+            emails_opened INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            "timestamp" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (performance_id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp");
+        -- Catches events for months nobody created a partition for; pms_ensure_campaign_partition moves them out
+        CREATE TABLE IF NOT EXISTS campaign_performance_default PARTITION OF campaign_performance DEFAULT;
+
+        CREATE TABLE IF NOT EXISTS campaign_performance_hourly (
+            campaign_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            events BIGINT NOT NULL DEFAULT 0,
+            emails_sent BIGINT NOT NULL DEFAULT 0,
+            emails_opened BIGINT NOT NULL DEFAULT 0,
+            clicks BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (campaign_id, channel_id, bucket)
+        );
+        CREATE TABLE IF NOT EXISTS campaign_performance_daily (
+            campaign_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            bucket DATE NOT NULL,
+            events BIGINT NOT NULL DEFAULT 0,
+            emails_sent BIGINT NOT NULL DEFAULT 0,
+            emails_opened BIGINT NOT NULL DEFAULT 0,
+            clicks BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (campaign_id, channel_id, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS campaign_performance_daily_bucket_idx ON campaign_performance_daily (bucket);
+
+        -- Creates the monthly (UTC) partition holding `month`. Rows already routed to
+        -- the default partition for that month are moved into the new one first.
+        CREATE OR REPLACE FUNCTION pms_ensure_campaign_partition(month DATE) RETURNS TEXT AS $$
+        DECLARE
+            first_day DATE := date_trunc('month', month)::date;
+            lower_bound TIMESTAMPTZ := first_day::timestamp AT TIME ZONE 'UTC';
+            upper_bound TIMESTAMPTZ := (first_day + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+            partition_name TEXT := 'campaign_performance_' || to_char(first_day, 'YYYY_MM');
+        BEGIN
+            IF to_regclass(partition_name) IS NOT NULL THEN
+                RETURN partition_name;
+            END IF;
+            -- Concurrent ingesters may race for the same month
+            PERFORM pg_advisory_xact_lock(hashtext('pms_campaign_partitions'));
+            IF to_regclass(partition_name) IS NOT NULL THEN
+                RETURN partition_name;
+            END IF;
+            IF EXISTS (SELECT 1 FROM campaign_performance_default WHERE "timestamp" >= lower_bound AND "timestamp" < upper_bound) THEN
+                EXECUTE format('CREATE TABLE %I (LIKE campaign_performance INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+                EXECUTE format('WITH moved AS (DELETE FROM campaign_performance_default WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                               lower_bound, upper_bound, partition_name);
+                EXECUTE format('ALTER TABLE campaign_performance ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', partition_name, lower_bound, upper_bound);
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF campaign_performance FOR VALUES FROM (%L) TO (%L)', partition_name, lower_bound, upper_bound);
+            END IF;
+            RETURN partition_name;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Statement-level: one upsert per (campaign, channel, bucket) per insert
+        -- statement, in key order so concurrent ingesters lock rollup rows consistently.
+        CREATE OR REPLACE FUNCTION pms_rollup_campaign_performance() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO campaign_performance_hourly AS r (campaign_id, channel_id, bucket, events, emails_sent, emails_opened, clicks)
+            SELECT campaign_id, channel_id, date_trunc('hour', "timestamp" AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                   count(*), sum(emails_sent), sum(emails_opened), sum(clicks)
+            FROM changed
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            ON CONFLICT (campaign_id, channel_id, bucket) DO UPDATE SET
+                events = r.events + EXCLUDED.events,
+                emails_sent = r.emails_sent + EXCLUDED.emails_sent,
+                emails_opened = r.emails_opened + EXCLUDED.emails_opened,
+                clicks = r.clicks + EXCLUDED.clicks;
+            INSERT INTO campaign_performance_daily AS r (campaign_id, channel_id, bucket, events, emails_sent, emails_opened, clicks)
+            SELECT campaign_id, channel_id, ("timestamp" AT TIME ZONE 'UTC')::date,
+                   count(*), sum(emails_sent), sum(emails_opened), sum(clicks)
+            FROM changed
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            ON CONFLICT (campaign_id, channel_id, bucket) DO UPDATE SET
+                events = r.events + EXCLUDED.events,
+                emails_sent = r.emails_sent + EXCLUDED.emails_sent,
+                emails_opened = r.emails_opened + EXCLUDED.emails_opened,
+                clicks = r.clicks + EXCLUDED.clicks;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS campaign_performance_rollup ON campaign_performance;
+        CREATE TRIGGER campaign_performance_rollup AFTER INSERT ON campaign_performance REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION pms_rollup_campaign_performance();
+    """ + "".join(f"""
+        DROP TRIGGER IF EXISTS {table}_notify ON {table};
+        CREATE TRIGGER {table}_notify AFTER {ops} ON {table} FOR EACH STATEMENT EXECUTE FUNCTION pms_notify_users();"""
+        for table, ops in (("campaigns", "INSERT OR UPDATE OR DELETE"), ("channels", "INSERT OR UPDATE OR DELETE"), ("campaign_performance", "INSERT"))
+    ) + """
+        SELECT pms_ensure_campaign_partition((date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => m))::date)
+        FROM generate_series(0, 2) m;
+
+        DO $$
+        BEGIN
+            IF to_regclass('campaign_performance_legacy') IS NOT NULL THEN
+                PERFORM pms_ensure_campaign_partition(month)
+                FROM (SELECT DISTINCT date_trunc('month', "timestamp" AT TIME ZONE 'UTC')::date AS month
+                      FROM campaign_performance_legacy WHERE "timestamp" IS NOT NULL) months;
+                INSERT INTO campaign_performance (performance_id, campaign_id, channel_id, emails_sent, emails_opened, clicks, "timestamp")
+                SELECT performance_id, campaign_id, channel_id, COALESCE(emails_sent, 0), COALESCE(emails_opened, 0), COALESCE(clicks, 0), COALESCE("timestamp", NOW())
+                FROM campaign_performance_legacy
+                WHERE campaign_id IS NOT NULL AND channel_id IS NOT NULL;
+                PERFORM setval(pg_get_serial_sequence('campaign_performance', 'performance_id'),
+                               GREATEST((SELECT max(performance_id) FROM campaign_performance), 1));
+            END IF;
+        END;
+        $$;
+    """),
+    # A segment with a row in segment_rules has its customer_segments membership
+    # computed by segments.refresh(); segments without one are maintained by hand.
+    # A NULL rule column matches everyone. Changing a rule clears evaluated_at,
+    # which makes the next refresh recompute that segment in full; otherwise
+    # refreshes only revisit customers updated since evaluated_at or whose
+    # last_purchase_date crossed a recency boundary since evaluated_on.
+    (9, "customer segments with rule-based membership", """
+        CREATE TABLE IF NOT EXISTS customers (customer_id SERIAL PRIMARY KEY, name VARCHAR(255) NOT NULL, email VARCHAR(255) UNIQUE NOT NULL, region VARCHAR(255), is_active BOOLEAN DEFAULT TRUE, last_purchase_date DATE);
+        CREATE TABLE IF NOT EXISTS segments (segment_id SERIAL PRIMARY KEY, segment_name VARCHAR(255) NOT NULL UNIQUE, description TEXT);
+        CREATE TABLE IF NOT EXISTS customer_segments (customer_id INTEGER REFERENCES customers(customer_id) ON DELETE CASCADE, segment_id INTEGER REFERENCES segments(segment_id) ON DELETE CASCADE, PRIMARY KEY (customer_id, segment_id));
+
+        ALTER TABLE customers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+        CREATE INDEX IF NOT EXISTS customers_updated_idx ON customers (updated_at);
+        CREATE INDEX IF NOT EXISTS customers_last_purchase_idx ON customers (last_purchase_date);
+        -- The primary key leads with customer_id; sizes and member lists need segment_id first
+        CREATE INDEX IF NOT EXISTS customer_segments_segment_idx ON customer_segments (segment_id, customer_id);
+        DROP TRIGGER IF EXISTS customers_touch_updated_at ON customers;
+        CREATE TRIGGER customers_touch_updated_at BEFORE UPDATE ON customers FOR EACH ROW EXECUTE FUNCTION pms_touch_updated_at();
+
+        CREATE TABLE IF NOT EXISTS segment_rules (
+            segment_id INTEGER PRIMARY KEY REFERENCES segments(segment_id) ON DELETE CASCADE,
+            regions TEXT[],
+            is_active BOOLEAN,
+            purchased_within_days INTEGER CHECK (purchased_within_days > 0),
+            not_purchased_within_days INTEGER CHECK (not_purchased_within_days > 0),
+            evaluated_at TIMESTAMPTZ,
+            evaluated_on DATE
+        );
+
+        CREATE OR REPLACE FUNCTION pms_segment_rule_changed() RETURNS trigger AS $$
+        BEGIN
+            IF (NEW.regions, NEW.is_active, NEW.purchased_within_days, NEW.not_purchased_within_days)
+               IS DISTINCT FROM (OLD.regions, OLD.is_active, OLD.purchased_within_days, OLD.not_purchased_within_days) THEN
+                NEW.evaluated_at := NULL;
+                NEW.evaluated_on := NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS segment_rules_changed ON segment_rules;
+        CREATE TRIGGER segment_rules_changed BEFORE UPDATE ON segment_rules FOR EACH ROW EXECUTE FUNCTION pms_segment_rule_changed();
+    """ + "".join(f"""
+        DROP TRIGGER IF EXISTS {table}_notify ON {table};
+        CREATE TRIGGER {table}_notify AFTER INSERT OR UPDATE OR DELETE ON {table} FOR EACH STATEMENT EXECUTE FUNCTION pms_notify_users();"""
+        for table in ("segments", "segment_rules", "customer_segments")
+    )),
+]
+
+def apply_migrations(conn):
+    """
+    Applies every migration newer than the database's current version.
+    Returns the list of versions applied by this call.
+    """
+    applied = []
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+        """)
+        cur.execute("SELECT version FROM schema_migrations;")
+        done = {row[0] for row in cur.fetchall()}
+        conn.commit()
+        for version, name, sql in MIGRATIONS:
+            if version in done:
+                continue
+            try:
+                cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (version, name))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        cur.close()
+    return applied
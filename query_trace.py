@@ -0,0 +1,203 @@
+# query_trace.py
+
+"""
+Query instrumentation for pooled connections.
+
+Every statement run through a TracedCursor is recorded in an in-memory ring
+buffer with its SQL fingerprint, the shape (not the values) of its
+parameters, latency, rows returned and, for the first statement after a pool
+checkout, how long acquiring the connection took. Statements slower than
+SLOW_QUERY_MS are printed to the slow-query log and keep their parameters so
+their plan can be captured on demand with explain(), which rolls back. Plans
+are never captured automatically: re-running a statement inside the caller's
+transaction would repeat its side effects.
+
+Records carry the current trace scope (see scope()), which lets the UI pick
+out the queries issued by a single rerun, including those run on worker
+threads by backend.fetch_concurrently.
+"""
+
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+TRACE_BUFFER_SIZE = 2000
+SLOW_QUERY_MS = float(os.environ.get("PMS_SLOW_QUERY_MS", "200"))
+
+QueryRecord = namedtuple("QueryRecord", [
+    "seq", "at", "scope", "thread", "fingerprint", "sql", "params_shape",
+    "params", "duration_ms", "rows", "acquire_ms", "slow", "plan",
+])
+
+_current_scope = contextvars.ContextVar("pms_trace_scope", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+
+def fingerprint(sql) -> str:
+    """Normalizes a statement so calls that differ only in values group together."""
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    sql = _STRING.sub("?", str(sql))
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip().rstrip(";")
+
+def params_shape(params) -> str:
+    """Describes parameter types and list lengths without exposing the values."""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {params_shape(v)}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)) and not isinstance(params, str):
+        if isinstance(params, list):
+            return f"list[{len(params)}]"
+        return "(" + ", ".join(params_shape(p) if isinstance(p, (list, tuple, dict)) else type(p).__name__ for p in params) + ")"
+    return type(params).__name__
+
+class QueryTracer:
+    """Thread-safe ring buffer of recent statements plus running totals."""
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._records = deque(maxlen=buffer_size)
+        self._slow = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def configure(self, slow_query_ms: float = None, buffer_size: int = None):
+        with self._lock:
+            if slow_query_ms is not None:
+                self.slow_query_ms = slow_query_ms
+            if buffer_size is not None:
+                self._records = deque(self._records, maxlen=buffer_size)
+
+    @property
+    def total(self):
+        """Statements recorded since the process started (not limited by the buffer size)."""
+        return self._seq
+
+    def record(self, sql, params, duration_ms: float, rows: int, acquire_ms: float):
+        slow = duration_ms >= self.slow_query_ms
+        with self._lock:
+            self._seq += 1
+            entry = QueryRecord(
+                seq=self._seq,
+                at=time.time(),
+                scope=_current_scope.get(),
+                thread=threading.current_thread().name,
+                fingerprint=fingerprint(sql),
+                sql=sql if slow else None,
+                params_shape=params_shape(params),
+                params=params if slow else None,
+                duration_ms=round(duration_ms, 3),
+                rows=rows,
+                acquire_ms=round(acquire_ms, 3),
+                slow=slow,
+                plan=None,
+            )
+            self._records.append(entry)
+            if slow:
+                self._slow.append(entry)
+        if slow:
+            print(f"Slow query ({duration_ms:.1f} ms, {rows} rows): {entry.fingerprint[:300]}")
+        return entry
+
+    def records(self, scope=None, since_seq: int = 0):
+        """Buffered records, optionally only those of one scope or newer than a sequence number."""
+        with self._lock:
+            snapshot = list(self._records)
+        return [r for r in snapshot if r.seq > since_seq and (scope is None or r.scope == scope)]
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    def attach_plan(self, seq: int, plan: str):
+        """Stores a captured plan on the slow-query entry with this sequence number."""
+        with self._lock:
+            for buffer in (self._slow, self._records):
+                for i, entry in enumerate(buffer):
+                    if entry.seq == seq:
+                        buffer[i] = entry._replace(plan=plan)
+
+    def summary(self, records):
+        """Per-fingerprint call counts and timings, slowest total first."""
+        groups = {}
+        for r in records:
+            g = groups.setdefault(r.fingerprint, {"fingerprint": r.fingerprint, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0})
+            g["calls"] += 1
+            g["total_ms"] += r.duration_ms
+            g["max_ms"] = max(g["max_ms"], r.duration_ms)
+            g["rows"] += max(r.rows, 0)
+        return sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+
+tracer = QueryTracer()
+
+def set_scope(name):
+    """Tags statements recorded from now on (on this context) with `name`; returns a reset token."""
+    return _current_scope.set(name)
+
+@contextmanager
+def scope(name):
+    """Tags every statement recorded inside the block (on this context) with `name`."""
+    token = _current_scope.set(name)
+    try:
+        yield name
+    finally:
+        _current_scope.reset(token)
+
+def explain(conn, sql, params=None) -> str:
+    """Runs EXPLAIN (ANALYZE, BUFFERS) on an untraced cursor and rolls back (sequence and session-lock side effects are not undone)."""
+    sql = sql.decode() if isinstance(sql, bytes) else sql
+    with psycopg2.extensions.cursor(conn) as cur:
+        try:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql.strip().rstrip(";"), params)
+            return "\n".join(row[0] for row in cur.fetchall())
+        finally:
+            conn.rollback()
+
+class TracedConnection(psycopg2.extensions.connection):
+    """Pooled connection that remembers how long its current checkout took to acquire."""
+    acquire_ms = 0.0
+
+    def take_acquire_ms(self):
+        acquire_ms, self.acquire_ms = self.acquire_ms, 0.0
+        return acquire_ms
+
+class TracedCursor(psycopg2.extensions.cursor):
+    """Default cursor for pooled connections; records every statement with the tracer."""
+
+    def _trace(self, sql, params, started):
+        duration_ms = (time.perf_counter() - started) * 1000
+        acquire_ms = self.connection.take_acquire_ms() if isinstance(self.connection, TracedConnection) else 0.0
+        tracer.record(sql, params, duration_ms, self.rowcount, acquire_ms)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._trace(query, vars, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._trace(query, vars_list, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._trace(sql, None, started)
@@ -0,0 +1,254 @@
+# segments.py
+
+"""
+Rule-based customer segmentation.
+
+Segments with a rule (migration 9) get their customer_segments membership
+computed by refresh() with a handful of set-based statements, never per
+customer. A full refresh evaluates a segment's rule against every customer; an
+incremental one (the default, e.g. from cron) only revisits customers updated
+since the last run plus those whose last_purchase_date crossed a recency
+boundary since then, and writes only the rows that actually change.
+
+    segments.define_segment("Lapsed EU", regions=["Berlin", "Paris"], not_purchased_within_days=90)
+    segments.refresh()
+    segments.audience_size(include=[1, 2], exclude=[5])
+
+Sizes come from SQL. Overlaps and audiences (intersections, unions and
+exclusions) work on each segment's members as a sorted numpy array, cached
+until membership changes, so interactive targeting does not touch the
+database after the first read. numpy (and pandas, for overlap_matrix) is
+imported only by those functions.
+"""
+
+import functools
+import io
+
+import psycopg2
+
+import backend
+
+# Matches customer c against rule r for the day %(today)s. A NULL rule column matches everyone.
+_MATCHES = """
+    (r.regions IS NULL OR c.region = ANY(r.regions))
+    AND (r.is_active IS NULL OR c.is_active = r.is_active)
+    AND (r.purchased_within_days IS NULL OR c.last_purchase_date > %(today)s::date - r.purchased_within_days)
+    AND (r.not_purchased_within_days IS NULL OR c.last_purchase_date IS NULL
+         OR c.last_purchase_date <= %(today)s::date - r.not_purchased_within_days)
+"""
+
+# {candidates} limits a statement to the customers in segment_candidates (incremental refresh)
+_REMOVE_SQL = """
+    DELETE FROM customer_segments cs
+    USING segment_rules r {candidates_from}
+    WHERE cs.segment_id = r.segment_id AND r.segment_id = ANY(%(segments)s) {candidates_where}
+      AND NOT EXISTS (SELECT 1 FROM customers c WHERE c.customer_id = cs.customer_id AND {matches});
+"""
+_ADD_SQL = """
+    INSERT INTO customer_segments (customer_id, segment_id)
+    SELECT c.customer_id, r.segment_id
+    FROM segment_rules r
+    JOIN customers c ON {matches} {candidates_join}
+    WHERE r.segment_id = ANY(%(segments)s)
+      AND NOT EXISTS (SELECT 1 FROM customer_segments cs WHERE cs.customer_id = c.customer_id AND cs.segment_id = r.segment_id)
+    ON CONFLICT DO NOTHING;
+"""
+# Recency rules change membership without any write to the customer: as the day
+# moves from evaluated_on to today, last purchases in (evaluated_on - N, today - N]
+# cross the N-day boundary.
+_CANDIDATES_SQL = """
+    CREATE TEMP TABLE segment_candidates ON COMMIT DROP AS
+    SELECT customer_id FROM customers WHERE updated_at > %(since)s
+    UNION
+    SELECT c.customer_id
+    FROM segment_rules r
+    JOIN customers c ON c.last_purchase_date > r.evaluated_on - r.purchased_within_days
+                    AND c.last_purchase_date <= %(today)s::date - r.purchased_within_days
+    WHERE r.segment_id = ANY(%(segments)s) AND r.evaluated_on < %(today)s::date
+    UNION
+    SELECT c.customer_id
+    FROM segment_rules r
+    JOIN customers c ON c.last_purchase_date > r.evaluated_on - r.not_purchased_within_days
+                    AND c.last_purchase_date <= %(today)s::date - r.not_purchased_within_days
+    WHERE r.segment_id = ANY(%(segments)s) AND r.evaluated_on < %(today)s::date;
+"""
+
+def _statement(template, incremental):
+    if incremental:
+        return template.format(
+            matches=_MATCHES,
+            candidates_from=", segment_candidates k",
+            candidates_where="AND k.customer_id = cs.customer_id",
+            candidates_join="JOIN segment_candidates k ON k.customer_id = c.customer_id",
+        )
+    return template.format(matches=_MATCHES, candidates_from="", candidates_where="", candidates_join="")
+
+# --- Rules ---
+def define_segment(segment_name: str, description: str = None, regions=None, is_active: bool = None,
+                   purchased_within_days: int = None, not_purchased_within_days: int = None):
+    """
+    Creates or updates a rule-based segment and returns its id (None on error).
+    Membership is computed by the next refresh().
+    """
+    with backend.db_connection() as conn:
+        if not conn: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO segments (segment_name, description) VALUES (%s, %s)
+                    ON CONFLICT (segment_name) DO UPDATE SET description = COALESCE(EXCLUDED.description, segments.description)
+                    RETURNING segment_id;
+                """, (segment_name, description))
+                segment_id = cur.fetchone()[0]
+                cur.execute("""
+                    INSERT INTO segment_rules (segment_id, regions, is_active, purchased_within_days, not_purchased_within_days)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (segment_id) DO UPDATE SET
+                        regions = EXCLUDED.regions,
+                        is_active = EXCLUDED.is_active,
+                        purchased_within_days = EXCLUDED.purchased_within_days,
+                        not_purchased_within_days = EXCLUDED.not_purchased_within_days;
+                """, (segment_id, list(regions) if regions else None, is_active, purchased_within_days, not_purchased_within_days))
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Error defining segment: {e}")
+            return None
+    backend.invalidate_tags("segments")
+    return segment_id
+
+# --- Refresh ---
+def refresh(full: bool = False):
+    """
+    Brings the membership of every rule-based segment up to date in one
+    transaction. Returns {"segments", "rebuilt", "candidates", "added",
+    "removed"} counts, or None on error.
+    """
+    summary = {"segments": 0, "rebuilt": 0, "candidates": 0, "added": 0, "removed": 0}
+    with backend.db_connection() as conn:
+        if not conn: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('pms_segment_refresh'));")
+                # Same overlap as the change feed: updated_at is a transaction start time
+                cur.execute("SELECT NOW() - make_interval(secs => %s), CURRENT_DATE;", (backend.CHANGE_FEED_LAG_SECONDS,))
+                watermark, today = cur.fetchone()
+                cur.execute("SELECT segment_id, evaluated_at FROM segment_rules;")
+                rules = cur.fetchall()
+                rebuild = [segment_id for segment_id, evaluated_at in rules if full or evaluated_at is None]
+                incremental = [segment_id for segment_id, evaluated_at in rules if segment_id not in rebuild]
+                if rebuild:
+                    params = {"segments": rebuild, "today": today}
+                    cur.execute(_statement(_REMOVE_SQL, False), params)
+                    summary["removed"] += cur.rowcount
+                    cur.execute(_statement(_ADD_SQL, False), params)
+                    summary["added"] += cur.rowcount
+                if incremental:
+                    since = min(evaluated_at for segment_id, evaluated_at in rules if segment_id in incremental)
+                    params = {"segments": incremental, "today": today, "since": since}
+                    cur.execute(_CANDIDATES_SQL, params)
+                    summary["candidates"] = cur.rowcount
+                    if cur.rowcount:
+                        cur.execute(_statement(_REMOVE_SQL, True), params)
+                        summary["removed"] += cur.rowcount
+                        cur.execute(_statement(_ADD_SQL, True), params)
+                        summary["added"] += cur.rowcount
+                cur.execute("UPDATE segment_rules SET evaluated_at = %s, evaluated_on = %s WHERE segment_id = ANY(%s);",
+                            (watermark, today, rebuild + incremental))
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Error refreshing segments: {e}")
+            return None
+    summary["segments"], summary["rebuilt"] = len(rules), len(rebuild)
+    backend.invalidate_tags("segments")
+    return summary
+
+# --- Queries ---
+@backend.cached_read(lambda args: ["segments"])
+def get_segments(as_records: bool = False):
+    """Every segment with its rule (NULLs for hand-maintained segments) and member count."""
+    query = """
+    SELECT
+        s.segment_id,
+        s.segment_name,
+        s.description,
+        r.regions,
+        r.is_active,
+        r.purchased_within_days,
+        r.not_purchased_within_days,
+        r.evaluated_at,
+        (SELECT count(*) FROM customer_segments cs WHERE cs.segment_id = s.segment_id) AS members
+    FROM segments s
+    LEFT JOIN segment_rules r ON r.segment_id = s.segment_id
+    ORDER BY s.segment_name;
+    """
+    with backend.db_connection() as conn:
+        if not conn: return backend._empty(as_records)
+        return backend._read_query(query, conn, None, as_records)
+
+@backend.cached_read(lambda args: ["segments"])
+def segment_members(segment_id: int):
+    """The segment's customer ids as a sorted, read-only numpy int32 array."""
+    import numpy as np
+    buf = io.StringIO()
+    with backend.db_connection() as conn:
+        if not conn: return np.empty(0, dtype=np.int32)
+        with conn.cursor() as cur:
+            query = cur.mogrify("SELECT customer_id FROM customer_segments WHERE segment_id = %s ORDER BY customer_id", (int(segment_id),)).decode()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT", buf)
+    members = np.array(buf.getvalue().split(), dtype=np.int32)
+    members.setflags(write=False)
+    return members
+
+def _contains(haystack, needles):
+    """Mask of which `needles` occur in the sorted array `haystack`."""
+    import numpy as np
+    if haystack.size == 0:
+        return np.zeros(needles.size, dtype=bool)
+    position = np.minimum(np.searchsorted(haystack, needles), haystack.size - 1)
+    return haystack[position] == needles
+
+def _intersect(a, b):
+    # Probe the larger sorted array with the smaller one
+    if a.size > b.size:
+        a, b = b, a
+    return a[_contains(b, a)]
+
+def audience(include, exclude=(), match: str = "all"):
+    """
+    Sorted customer ids in every (match="all") or any (match="any") segment of
+    `include` and in none of `exclude`.
+    """
+    import numpy as np
+    members = sorted((segment_members(s) for s in include), key=len)
+    if not members:
+        result = np.empty(0, dtype=np.int32)
+    elif match == "all":
+        result = functools.reduce(_intersect, members)
+    elif match == "any":
+        result = np.unique(np.concatenate(members))
+    else:
+        raise ValueError(f"match must be 'all' or 'any', got {match!r}")
+    for segment_id in exclude:
+        result = result[~_contains(segment_members(segment_id), result)]
+    return result
+
+def audience_size(include, exclude=(), match: str = "all"):
+    return int(audience(include, exclude, match).size)
+
+def overlap_matrix(segment_ids):
+    """
+    DataFrame indexed and labelled by segment id with the number of customers
+    each pair of segments shares; the diagonal holds the segment sizes.
+    """
+    import numpy as np
+    import pandas as pd
+    segment_ids = list(segment_ids)
+    members = [segment_members(s) for s in segment_ids]
+    counts = np.zeros((len(segment_ids), len(segment_ids)), dtype=np.int64)
+    for i, a in enumerate(members):
+        counts[i, i] = a.size
+        for j in range(i + 1, len(members)):
+            counts[i, j] = counts[j, i] = _intersect(a, members[j]).size
+    return pd.DataFrame(counts, index=segment_ids, columns=segment_ids)
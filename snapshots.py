@@ -0,0 +1,159 @@
+# snapshots.py
+
+"""
+Columnar snapshots of the tables the analytics read, kept on disk as Arrow IPC
+files so analytics never scan the OLTP database or re-parse rows per session.
+
+    python cli.py snapshot refresh          # incremental
+    python cli.py snapshot refresh --full   # rebuild (also picks up deleted rows)
+
+Each refresh streams only rows whose updated_at is past the previous
+snapshot's watermark (kept in the file's schema metadata), upserts them by id
+into the previous snapshot and writes a new numbered file. Readers
+memory-map the newest file, so loading is zero-copy and shared by every
+session in the process. Older files are removed once no longer the newest;
+on platforms that refuse to delete a mapped file they are retried next time.
+
+Requires pyarrow.
+"""
+
+import glob
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import backend
+
+SNAPSHOT_DIR = os.environ.get("PMS_SNAPSHOT_DIR", "snapshots")
+FETCH_ROWS = 100_000
+
+_TS = pa.timestamp("us", tz="UTC")
+
+# name -> (key column, Arrow schema, SELECT with a {since} filter placeholder).
+# Tables without updated_at (users) are re-read in full on every refresh.
+SNAPSHOTS = {
+    "users": ("user_id", pa.schema([
+        ("user_id", pa.int64()), ("name", pa.string()), ("role", pa.string()), ("manager_id", pa.int64()),
+    ]), "SELECT user_id, name, role, manager_id FROM users"),
+    "goals": ("goal_id", pa.schema([
+        ("goal_id", pa.int64()), ("employee_id", pa.int64()), ("manager_id", pa.int64()), ("status", pa.string()),
+        ("due_date", pa.date32()), ("created_at", _TS), ("updated_at", _TS), ("completed_at", _TS),
+    ]), "SELECT goal_id, employee_id, manager_id, status, due_date, created_at, updated_at, completed_at FROM goals {since}"),
+    "tasks": ("task_id", pa.schema([
+        ("task_id", pa.int64()), ("goal_id", pa.int64()), ("status", pa.string()),
+        ("created_at", _TS), ("updated_at", _TS), ("reviewed_at", _TS),
+    ]), "SELECT task_id, goal_id, status, created_at, updated_at, reviewed_at FROM tasks {since}"),
+}
+
+_WATERMARK_KEY = b"pms.watermark"
+_FILE_PATTERN = re.compile(r"\.(\d+)\.arrow$")
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def _files(name: str, directory: str):
+    """Snapshot files for `name`, oldest first."""
+    paths = glob.glob(os.path.join(directory, f"{name}.*.arrow"))
+    return sorted((p for p in paths if _FILE_PATTERN.search(p)), key=lambda p: int(_FILE_PATTERN.search(p).group(1)))
+
+def load(name: str, directory: str = SNAPSHOT_DIR):
+    """The newest snapshot of a table as a memory-mapped pyarrow.Table, or None if there is none."""
+    files = _files(name, directory)
+    if not files:
+        return None
+    path = files[-1]
+    with _loaded_lock:
+        cached = _loaded.get((name, directory))
+        if cached and cached[0] == path:
+            return cached[1]
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        _loaded[(name, directory)] = (path, table)
+        return table
+
+def watermark(table):
+    """updated_at up to which a snapshot is complete, or None for full-refresh tables."""
+    metadata = table.schema.metadata or {}
+    value = metadata.get(_WATERMARK_KEY)
+    return datetime.fromisoformat(value.decode()) if value else None
+
+def version(directory: str = SNAPSHOT_DIR):
+    """Token that changes whenever any snapshot is refreshed (for caching derived results)."""
+    return tuple((_files(name, directory) or [None])[-1] for name in SNAPSHOTS)
+
+def _fetch(conn, name: str, since):
+    """Streams the rows changed after `since` through a server-side cursor into an Arrow table."""
+    _, schema, query = SNAPSHOTS[name]
+    params = ()
+    if "{since}" in query:
+        # Overlap by the change feed's lag: updated_at is a transaction start time
+        query = query.format(since="WHERE updated_at > %s - make_interval(secs => %s)" if since else "")
+        params = (since, backend.CHANGE_FEED_LAG_SECONDS) if since else ()
+    batches = []
+    with conn.cursor(name=f"pms_snapshot_{name}") as cur:
+        cur.itersize = FETCH_ROWS
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            batches.append(pa.record_batch([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+    return pa.Table.from_batches(batches, schema=schema)
+
+def _upsert(previous, changed, key: str):
+    """Rows of `previous` not superseded by `changed`, followed by `changed`."""
+    if previous is None or previous.num_rows == 0:
+        return changed
+    if changed.num_rows == 0:
+        return previous
+    keep = pc.invert(pc.is_in(previous[key], value_set=changed[key]))
+    return pa.concat_tables([previous.filter(keep).cast(changed.schema), changed])
+
+def _write(name: str, table, directory: str):
+    files = _files(name, directory)
+    number = int(_FILE_PATTERN.search(files[-1]).group(1)) + 1 if files else 1
+    path = os.path.join(directory, f"{name}.{number:06d}.arrow")
+    partial_path = path + ".partial"
+    with pa.OSFile(partial_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=FETCH_ROWS)
+    os.replace(partial_path, path)
+    for old in files:
+        try:
+            os.remove(old)
+        except OSError:
+            pass  # still mapped on Windows; removed on a later refresh
+    return path
+
+def refresh(full: bool = False, directory: str = SNAPSHOT_DIR, progress=print):
+    """
+    Brings every snapshot up to date. Returns {name: (changed_rows, total_rows)},
+    or None if the database is unreachable.
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary = {}
+    with backend.db_connection() as conn:
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT NOW();")
+                started = cur.fetchone()[0]
+            for name, (key, schema, query) in SNAPSHOTS.items():
+                previous = None if full else load(name, directory)
+                since = watermark(previous) if previous is not None and "{since}" in query else None
+                changed = _fetch(conn, name, since)
+                table = _upsert(previous if since else None, changed, key)
+                metadata = {_WATERMARK_KEY: started.astimezone(timezone.utc).isoformat().encode()} if "{since}" in query else {}
+                table = table.replace_schema_metadata(metadata)
+                _write(name, table, directory)
+                summary[name] = (changed.num_rows, table.num_rows)
+                progress(f"  {name}: {changed.num_rows:,} changed, {table.num_rows:,} rows")
+        finally:
+            conn.rollback()
+    return summary
@@ -0,0 +1,130 @@
+# test_read_cache.py
+
+import pytest
+
+import backend
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    backend.clear_read_cache()
+    yield
+    backend.clear_read_cache()
+
+# --- ReadCache ---
+def test_put_after_invalidation_is_not_cached():
+    cache = backend.ReadCache(8)
+    generation = cache.generation()
+    cache.invalidate("goal:1")  # a write lands while the read is in flight
+    cache.put("key", "stale", frozenset(["goal:1"]), generation)
+    assert cache.get("key") == (False, None)
+
+def test_put_with_current_generation_is_cached():
+    cache = backend.ReadCache(8)
+    cache.put("key", "fresh", frozenset(["goal:1"]), cache.generation())
+    assert cache.get("key") == (True, "fresh")
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = backend.ReadCache(8)
+    cache.put("a", 1, frozenset(["goal:1", "analytics"]), cache.generation())
+    cache.put("b", 2, frozenset(["goal:2"]), cache.generation())
+    cache.invalidate("goal:1")
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    # "a" is gone from every tag index, not just the one invalidated
+    assert "a" not in cache._keys_by_tag.get("analytics", set())
+
+def test_evicts_least_recently_used():
+    cache = backend.ReadCache(2)
+    cache.put("a", 1, frozenset(["t:a"]), cache.generation())
+    cache.put("b", 2, frozenset(["t:b"]), cache.generation())
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", 3, frozenset(["t:c"]), cache.generation())
+    assert len(cache) == 2
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert "t:b" not in cache._keys_by_tag
+
+def test_clear_prevents_in_flight_puts():
+    cache = backend.ReadCache(8)
+    generation = cache.generation()
+    cache.clear()
+    cache.put("key", "stale", frozenset(), generation)
+    assert len(cache) == 0
+
+# --- cached_read ---
+def test_cached_read_reuses_result_per_arguments():
+    calls = []
+
+    @backend.cached_read(lambda args: [f"goal:{args['goal_id']}"])
+    def read(goal_id, page_size=10):
+        calls.append((goal_id, page_size))
+        return [goal_id]
+
+    assert read(1) == [1]
+    assert read(1, page_size=10) == [1]  # defaults are part of the key
+    assert read(2) == [2]
+    assert calls == [(1, 10), (2, 10)]
+
+def test_cached_read_racing_an_invalidation_is_not_cached():
+    calls = []
+
+    @backend.cached_read(lambda args: ["goal:1"])
+    def read():
+        calls.append(1)
+        if len(calls) == 1:
+            backend.invalidate(goal_id=1)  # a concurrent write commits mid-read
+        return len(calls)
+
+    assert read() == 1
+    assert read() == 2
+    assert read() == 2
+    assert len(calls) == 2
+
+def test_write_invalidation_reaches_cached_read():
+    calls = []
+
+    @backend.cached_read(lambda args: [f"manager:{args['manager_id']}"])
+    def read(manager_id):
+        calls.append(manager_id)
+        return manager_id
+
+    read(7)
+    read(8)
+    backend.invalidate(manager_id=7)
+    read(7)
+    read(8)
+    assert calls == [7, 8, 7]
+
+# --- _copy_result ---
+def test_list_results_are_copied():
+    @backend.cached_read(lambda args: ["users"])
+    def read():
+        return [1, 2, 3]
+
+    first = read()
+    first.append(4)
+    assert read() == [1, 2, 3]
+
+def test_tuple_of_lists_is_copied_but_records_are_returned_as_is():
+    Record = backend._record_type(("goal_id",))
+    record = Record(1)
+    rows = [record]
+    copied = backend._copy_result((rows, (1, "cursor")))
+    copied[0].append(Record(2))
+    assert rows == [record]
+    assert backend._copy_result(record) is record
+
+def test_dataframe_columns_added_by_caller_do_not_leak():
+    pytest.importorskip("pandas")
+
+    @backend.cached_read(lambda args: ["analytics"])
+    def read():
+        return backend.pd.DataFrame({"status": ["Draft"], "count": [1]})
+
+    first = read()
+    first["extra"] = 1
+    first["count"] = 99
+    second = read()
+    assert list(second.columns) == ["status", "count"]
+    assert second["count"].tolist() == [1]
@@ -0,0 +1,184 @@
+# test_write_behind.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import backend
+import write_behind
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql.strip())
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class FakeWriters:
+    """Stands in for _BATCH_WRITERS: records each group and fails any group containing a "bad" write."""
+
+    def __init__(self, delay=0.0):
+        self.groups = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, cur, group, results, owners):
+        time.sleep(self.delay)
+        with self.lock:
+            self.groups.append([w.args for w in group])
+        if any("bad" in w.args for w in group):
+            raise psycopg2.Error("boom")
+        for write in group:
+            results[id(write)] = write.args[-1]
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    conn = FakeConnection()
+    writers = FakeWriters()
+
+    @contextmanager
+    def db_connection():
+        yield conn
+
+    monkeypatch.setattr(backend, "db_connection", db_connection)
+    monkeypatch.setattr(backend, "invalidate", lambda **kwargs: None)
+    monkeypatch.setattr(write_behind, "_BATCH_WRITERS", {"task": writers, "feedback": writers, "status": writers})
+    return conn, writers
+
+def test_writes_within_the_delay_share_one_commit(fake_db):
+    conn, writers = fake_db
+    queue = write_behind.WriteBehindQueue(batch_max=100, batch_delay_ms=200)
+    try:
+        futures = [queue.submit_task(1, f"task {i}") for i in range(5)]
+        assert [f.result(5) for f in futures] == [f"task {i}" for i in range(5)]
+    finally:
+        queue.close()
+    assert conn.commits == 1
+    assert len(writers.groups) == 1
+
+def test_batches_are_capped_at_batch_max(fake_db):
+    conn, writers = fake_db
+    queue = write_behind.WriteBehindQueue(batch_max=2, batch_delay_ms=200)
+    try:
+        futures = [queue.submit_task(1, f"task {i}") for i in range(5)]
+        for f in futures:
+            f.result(5)
+    finally:
+        queue.close()
+    assert all(len(group) <= 2 for group in writers.groups)
+    assert sum(len(group) for group in writers.groups) == 5
+
+def test_failed_batch_is_replayed_item_by_item(fake_db):
+    conn, writers = fake_db
+    queue = write_behind.WriteBehindQueue(batch_max=100, batch_delay_ms=200)
+    try:
+        good = queue.submit_task(1, "good")
+        bad = queue.submit_task(2, "bad")
+        also_good = queue.submit_feedback(3, 4, "fine")
+        assert good.result(5) == "good"
+        assert also_good.result(5) == "fine"
+        with pytest.raises(write_behind.WriteError):
+            bad.result(5)
+    finally:
+        queue.close()
+    assert conn.rollbacks >= 1
+    assert conn.statements.count("SAVEPOINT write_behind_item;") == 3
+    assert conn.statements.count("ROLLBACK TO SAVEPOINT write_behind_item;") == 1
+    assert conn.statements.count("RELEASE SAVEPOINT write_behind_item;") == 2
+
+def test_close_drains_queued_writes(fake_db):
+    conn, writers = fake_db
+    writers.delay = 0.02
+    queue = write_behind.WriteBehindQueue(batch_max=1, batch_delay_ms=0)
+    futures = [queue.submit_task(1, f"task {i}") for i in range(10)]
+    queue.close()
+    assert all(f.done() for f in futures)
+    assert [f.result() for f in futures] == [f"task {i}" for i in range(10)]
+    with pytest.raises(RuntimeError):
+        queue.submit_task(1, "too late")
+    queue.close()  # safe to call twice
+
+def test_flush_waits_for_earlier_writes(fake_db):
+    conn, writers = fake_db
+    writers.delay = 0.05
+    queue = write_behind.WriteBehindQueue(batch_max=100, batch_delay_ms=0)
+    try:
+        future = queue.submit_task(1, "task")
+        queue.flush(5)
+        assert future.done()
+    finally:
+        queue.close()
+
+def test_unavailable_database_fails_every_write(monkeypatch):
+    @contextmanager
+    def db_connection():
+        yield None
+
+    monkeypatch.setattr(backend, "db_connection", db_connection)
+    queue = write_behind.WriteBehindQueue(batch_max=100, batch_delay_ms=0)
+    try:
+        future = queue.submit_task(1, "task")
+        with pytest.raises(write_behind.WriteError):
+            future.result(5)
+    finally:
+        queue.close()
+
+# --- Batch statements ---
+def test_last_status_per_task_wins(monkeypatch):
+    sent = {}
+
+    def execute_values(cur, sql, argslist, page_size=None, fetch=False):
+        sent["rows"] = list(argslist)
+        return [(task_id, 10, 3, 7) for task_id, _ in argslist if task_id != 99]
+
+    monkeypatch.setattr(write_behind.psycopg2.extras, "execute_values", execute_values)
+    group = [
+        write_behind._Write("status", (5, "Approved")),
+        write_behind._Write("status", (6, "Rejected")),
+        write_behind._Write("status", (5, "Rejected")),
+        write_behind._Write("status", (99, "Approved")),
+    ]
+    results, owners = {}, set()
+    write_behind._write_statuses(None, group, results, owners)
+    assert sent["rows"] == [(5, "Rejected"), (6, "Rejected"), (99, "Approved")]
+    assert [results[id(w)] for w in group[:3]] == [True, True, True]
+    assert isinstance(results[id(group[3])], write_behind.WriteError)
+    assert owners == {(10, 3, 7)}
+
+# --- Drop-in wrappers ---
+def test_timeout_is_unconfirmed_not_failed(monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_ACK_TIMEOUT", 0.01)
+    pending = write_behind.Future()
+    monkeypatch.setattr(write_behind, "submit_task", lambda goal_id, description: pending)
+    assert write_behind.create_task(1, "task") is write_behind.UNCONFIRMED
+
+def test_closed_queue_is_reported_as_failure(monkeypatch):
+    def closed(*args):
+        raise RuntimeError("write-behind queue is closed")
+
+    monkeypatch.setattr(write_behind, "submit_feedback", closed)
+    assert write_behind.create_feedback(1, 2, "text") is False
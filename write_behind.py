@@ -0,0 +1,327 @@
+# write_behind.py
+
+"""
+Optional write-behind pipeline for bursty writes (task logging, feedback and
+task status changes during review-cycle deadlines).
+
+Callers submit writes and get a concurrent.futures.Future back. A single
+background thread drains the queue into batches of up to WRITE_BATCH_MAX items
+(or whatever arrived within WRITE_BATCH_DELAY_MS of the first one), writes each
+kind with one multi-row statement and commits the whole batch at once. A
+future resolves only after its batch has committed, so a result is a durable
+acknowledgement:
+
+    task_id = write_behind.submit_task(goal_id, "Wrote the design doc").result()
+
+Futures resolve to what the synchronous backend functions return on success
+(task id, True) and raise WriteError for items that could not be written. If a
+batch statement fails, the batch is replayed item by item under savepoints so
+one bad item does not fail its neighbours. Pending writes are flushed at
+interpreter exit.
+
+create_task, create_feedback and update_task_status below are drop-in,
+blocking replacements for the backend functions of the same name, so a caller
+can switch pipelines with `writes = write_behind if enabled else backend`.
+If the commit is not acknowledged within WRITE_ACK_TIMEOUT they return
+UNCONFIRMED rather than a failure, since the write is still queued and may
+yet commit; retrying it could write it twice.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import psycopg2
+import psycopg2.extras
+
+import backend
+
+WRITE_BATCH_MAX = 500
+WRITE_BATCH_DELAY_MS = 20
+# submit() blocks once this many writes are waiting, pushing back on callers
+WRITE_QUEUE_MAX = 20_000
+# How long the drop-in wrappers wait for their batch to commit
+WRITE_ACK_TIMEOUT = 30
+
+class WriteError(Exception):
+    """A queued write that was not applied; the message says why."""
+
+class _Write:
+    __slots__ = ("kind", "args", "future")
+
+    def __init__(self, kind, args):
+        self.kind = kind
+        self.args = args
+        self.future = Future()
+
+_STOP = object()
+
+class WriteBehindQueue:
+    """Batches queued writes on a background thread and group-commits them."""
+
+    def __init__(self, batch_max: int = WRITE_BATCH_MAX, batch_delay_ms: float = WRITE_BATCH_DELAY_MS, queue_max: int = WRITE_QUEUE_MAX):
+        self.batch_max = batch_max
+        self.batch_delay = batch_delay_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="pms-write-behind", daemon=True)
+        self._thread.start()
+
+    # --- Submitting ---
+    def _submit(self, kind, *args):
+        write = _Write(kind, args)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._queue.put(write)
+        return write.future
+
+    def submit_task(self, goal_id: int, description: str) -> Future:
+        """Queues create_task; resolves to the new task_id."""
+        return self._submit("task", int(goal_id), description)
+
+    def submit_feedback(self, goal_id: int, manager_id: int, feedback_text: str) -> Future:
+        """Queues create_feedback; resolves to True."""
+        return self._submit("feedback", int(goal_id), int(manager_id), feedback_text)
+
+    def submit_task_status(self, task_id: int, status: str) -> Future:
+        """Queues update_task_status; resolves to True. Within a batch the last status for a task wins."""
+        return self._submit("status", int(task_id), status)
+
+    def flush(self, timeout: float = None):
+        """Blocks until everything submitted before this call has been committed (or failed)."""
+        self._submit("flush").result(timeout)
+
+    def close(self, timeout: float = 30):
+        """Stops accepting writes, commits what is queued and stops the worker. Safe to call twice."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # --- Worker ---
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            batch = []
+            if first is _STOP:
+                stopping = True
+            else:
+                batch.append(first)
+                deadline = time.monotonic() + self.batch_delay
+                while len(batch) < self.batch_max:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            if stopping:
+                # Drain whatever was queued before close()
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            for start in range(0, len(batch), self.batch_max):
+                self._commit(batch[start:start + self.batch_max])
+
+    def _commit(self, batch):
+        writes = [w for w in batch if w.kind != "flush"]
+        if writes:
+            try:
+                self._write_batch(writes)
+            except Exception as error:
+                # Never leave a caller waiting forever
+                for write in writes:
+                    if not write.future.done():
+                        write.future.set_exception(WriteError(f"write failed: {error}"))
+        for write in batch:
+            if write.kind == "flush":
+                write.future.set_result(None)
+
+    def _write_batch(self, writes):
+        results = {}
+        owners = set()
+        with backend.db_connection() as conn:
+            if not conn:
+                raise WriteError("database unavailable")
+            try:
+                with conn.cursor() as cur:
+                    for kind in ("task", "feedback", "status"):
+                        group = [w for w in writes if w.kind == kind]
+                        if group:
+                            _BATCH_WRITERS[kind](cur, group, results, owners)
+                conn.commit()
+            except psycopg2.Error as error:
+                conn.rollback()
+                print(f"Write-behind batch of {len(writes)} failed, retrying item by item: {error}")
+                results, owners = self._write_one_by_one(conn, writes)
+        for goal_id, manager_id, employee_id in owners:
+            backend.invalidate(goal_id=goal_id, manager_id=manager_id, employee_id=employee_id)
+        for write in writes:
+            outcome = results.get(id(write), WriteError("not written"))
+            if isinstance(outcome, Exception):
+                write.future.set_exception(outcome)
+            else:
+                write.future.set_result(outcome)
+
+    def _write_one_by_one(self, conn, writes):
+        results, owners = {}, set()
+        with conn.cursor() as cur:
+            for write in writes:
+                cur.execute("SAVEPOINT write_behind_item;")
+                item_owners = set()
+                try:
+                    _BATCH_WRITERS[write.kind](cur, [write], results, item_owners)
+                    cur.execute("RELEASE SAVEPOINT write_behind_item;")
+                    owners |= item_owners
+                except psycopg2.Error as error:
+                    cur.execute("ROLLBACK TO SAVEPOINT write_behind_item;")
+                    results[id(write)] = WriteError(str(error).strip())
+        conn.commit()
+        return results, owners
+
+# --- Batch statements ---
+# Each writer applies a group of same-kind writes with one statement, records a
+# result (or WriteError) per write in `results` and the affected (goal, manager,
+# employee) owners in `owners` for cache invalidation after the commit.
+
+def _reserve_ids(cur, table, column, count):
+    """Takes `count` ids from the table's sequence so inserted rows map back to their writes."""
+    cur.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s);", (table, column, count))
+    return [row[0] for row in cur.fetchall()]
+
+def _write_tasks(cur, group, results, owners):
+    ids = _reserve_ids(cur, "tasks", "task_id", len(group))
+    rows = psycopg2.extras.execute_values(cur, """
+        WITH v (task_id, goal_id, description) AS (VALUES %s),
+        t AS (
+            INSERT INTO tasks (task_id, goal_id, description)
+            SELECT v.task_id, v.goal_id, v.description FROM v JOIN goals g ON g.goal_id = v.goal_id
+            RETURNING task_id, goal_id
+        )
+        SELECT t.task_id, g.goal_id, g.manager_id, g.employee_id FROM t JOIN goals g ON g.goal_id = t.goal_id;
+    """, [(task_id, w.args[0], w.args[1]) for task_id, w in zip(ids, group)], page_size=len(group), fetch=True)
+    inserted = {row[0]: row[1:] for row in rows}
+    for task_id, write in zip(ids, group):
+        if task_id in inserted:
+            results[id(write)] = task_id
+            owners.add(tuple(inserted[task_id]))
+        else:
+            results[id(write)] = WriteError(f"goal {write.args[0]} does not exist")
+
+def _write_feedback(cur, group, results, owners):
+    ids = _reserve_ids(cur, "feedback", "feedback_id", len(group))
+    rows = psycopg2.extras.execute_values(cur, """
+        WITH v (feedback_id, goal_id, manager_id, feedback_text) AS (VALUES %s),
+        f AS (
+            INSERT INTO feedback (feedback_id, goal_id, manager_id, feedback_text)
+            SELECT v.feedback_id, v.goal_id, v.manager_id, v.feedback_text FROM v JOIN goals g ON g.goal_id = v.goal_id
+            RETURNING feedback_id, goal_id
+        )
+        SELECT f.feedback_id, g.goal_id, g.manager_id, g.employee_id FROM f JOIN goals g ON g.goal_id = f.goal_id;
+    """, [(feedback_id, *w.args) for feedback_id, w in zip(ids, group)], page_size=len(group), fetch=True)
+    inserted = {row[0]: row[1:] for row in rows}
+    for feedback_id, write in zip(ids, group):
+        if feedback_id in inserted:
+            results[id(write)] = True
+            owners.add(tuple(inserted[feedback_id]))
+        else:
+            results[id(write)] = WriteError(f"goal {write.args[0]} does not exist")
+
+def _write_statuses(cur, group, results, owners):
+    latest = {}
+    for write in group:
+        latest[write.args[0]] = write.args[1]
+    rows = psycopg2.extras.execute_values(cur, """
+        UPDATE tasks t SET status = v.status
+        FROM (VALUES %s) AS v (task_id, status), goals g
+        WHERE t.task_id = v.task_id AND g.goal_id = t.goal_id
+        RETURNING t.task_id, g.goal_id, g.manager_id, g.employee_id;
+    """, list(latest.items()), page_size=len(latest), fetch=True)
+    updated = {row[0]: row[1:] for row in rows}
+    for write in group:
+        if write.args[0] in updated:
+            results[id(write)] = True
+            owners.add(tuple(updated[write.args[0]]))
+        else:
+            results[id(write)] = WriteError(f"task {write.args[0]} does not exist")
+
+_BATCH_WRITERS = {"task": _write_tasks, "feedback": _write_feedback, "status": _write_statuses}
+
+# --- Process-wide queue ---
+_default = None
+_default_lock = threading.Lock()
+
+def get_queue():
+    """Returns the process-wide queue, starting its worker on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = WriteBehindQueue()
+        return _default
+
+def submit_task(goal_id: int, description: str) -> Future:
+    return get_queue().submit_task(goal_id, description)
+
+def submit_feedback(goal_id: int, manager_id: int, feedback_text: str) -> Future:
+    return get_queue().submit_feedback(goal_id, manager_id, feedback_text)
+
+def submit_task_status(task_id: int, status: str) -> Future:
+    return get_queue().submit_task_status(task_id, status)
+
+def shutdown():
+    """Commits everything still queued and stops the worker."""
+    global _default
+    with _default_lock:
+        if _default is not None:
+            _default.close()
+        _default = None
+
+atexit.register(shutdown)
+
+# --- Drop-in replacements for the backend writes ---
+class _Unconfirmed:
+    """Outcome of a write that was queued but not acknowledged in time."""
+
+    def __repr__(self):
+        return "UNCONFIRMED"
+
+# Truthy, so callers that only test for failure do not retry (and duplicate) the write
+UNCONFIRMED = _Unconfirmed()
+
+def _wait(submit, failed, action):
+    try:
+        future = submit()
+    except RuntimeError as error:
+        print(f"Error {action}: {error}")
+        return failed
+    try:
+        return future.result(WRITE_ACK_TIMEOUT)
+    except WriteError as error:
+        print(f"Error {action}: {error}")
+        return failed
+    except FutureTimeout:
+        print(f"Still {action} after {WRITE_ACK_TIMEOUT}s: the write is queued and may yet commit")
+        return UNCONFIRMED
+
+def create_task(goal_id: int, description: str):
+    return _wait(lambda: submit_task(goal_id, description), None, "creating task")
+
+def create_feedback(goal_id: int, manager_id: int, feedback_text: str):
+    return _wait(lambda: submit_feedback(goal_id, manager_id, feedback_text), False, "creating feedback")
+
+def update_task_status(task_id: int, status: str):
+    return _wait(lambda: submit_task_status(task_id, status), False, "updating task status")